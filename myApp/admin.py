@@ -1,33 +1,32 @@
 # myApp/admin.py
 from __future__ import annotations
 
-import requests
-from requests import RequestException
+import csv
 
+from django import forms
 from django.contrib import admin, messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.tokens import default_token_generator
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from django.conf import settings
-from django.urls import reverse
+from django.db import transaction
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html
 
-from .models import Profile, Vision
+from . import mailer, profiles
+from .mailer import strip_quotes
+from .models import MailJob, Profile, Vision
+from .utils.accounts import IMPORT_FIELDS, import_attendees, read_rows
 
 User = get_user_model()
 
 
-def _strip_quotes(val: str | None) -> str | None:
-    """Handle Windows-style env vars like: RESEND_FROM="PSI <psi@psi.org>"."""
-    if not val:
-        return val
-    v = val.strip()
-    if (v.startswith('"') and v.endswith('"')) or (v.startswith("'") and v.endswith("'")):
-        return v[1:-1].strip()
-    return v
-
-
 def _abs_url(request, path: str) -> str:
     """
     Build absolute URL that works behind Railway's proxy.
@@ -40,6 +39,53 @@ def _abs_url(request, path: str) -> str:
     return f"{scheme}://{domain}{path}"
 
 
+PASSWORD_SET_SUBJECT = "Your PSI Vision account — set your password"
+
+
+def _password_set_payload(request, user, from_addr, reply_to):
+    """Resend /emails body for one user's set-your-password link."""
+    # Build password reset link
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    token = default_token_generator.make_token(user)
+    link = _abs_url(request, reverse("password_reset_confirm", args=[uid, token]))
+
+    name = user.get_full_name() or user.username
+    html = f"""
+      <div style="font-family:Inter,system-ui,-apple-system,Segoe UI,Roboto,Arial,sans-serif;line-height:1.6">
+        <h2 style="color:#1A237E;margin:0 0 12px">Welcome, {name} ✨</h2>
+        <p>Your PSI Vision account is ready.</p>
+        <p>
+          <a href="{link}" style="background:#1A237E;color:#fff;text-decoration:none;padding:10px 16px;border-radius:10px;display:inline-block">
+            Set your password
+          </a>
+        </p>
+        <p>If the button doesn’t work, paste this URL into your browser:</p>
+        <p style="word-break:break-all"><a href="{link}">{link}</a></p>
+        <hr style="border:none;border-top:1px solid #eee;margin:16px 0"/>
+        <p style="color:#777;font-size:12px">If you didn’t expect this email, you can ignore it.</p>
+      </div>
+    """.strip()
+    text = f"""Hi {name},
+
+Your PSI Vision account is ready.
+
+Set your password: {link}
+
+If you didn’t expect this email, you can ignore it.
+"""
+
+    payload = {
+        "from": from_addr,
+        "to": [user.email],
+        "subject": PASSWORD_SET_SUBJECT,
+        "html": html,
+        "text": text,
+    }
+    if reply_to:
+        payload["reply_to"] = reply_to
+    return payload
+
+
 class ProfileInline(admin.StackedInline):
     model = Profile
     can_delete = False
@@ -47,10 +93,51 @@ class ProfileInline(admin.StackedInline):
     extra = 0
 
 
+class AttendeeImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV with a header row, or JSONL. Columns: " + ", ".join(IMPORT_FIELDS) + ".")
+
+
 class UserAdmin(BaseUserAdmin):
     inlines = [ProfileInline]
     list_display = BaseUserAdmin.list_display + ("onboarded_flag",)
+    list_select_related = ("profile",)  # onboarded_flag without a query per row
     actions = ["send_password_set_email_resend", "require_onboarding_again"]
+    change_list_template = "admin/auth/user/change_list_import.html"
+
+    def get_urls(self):
+        urls = [
+            path("import-attendees/", self.admin_site.admin_view(self.import_attendees_view),
+                 name="auth_user_import_attendees"),
+        ]
+        return urls + super().get_urls()
+
+    def import_attendees_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = AttendeeImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            upload = form.cleaned_data["file"]
+            try:
+                # hash_workers=1: no process pool forked from a threaded web worker
+                stats = import_attendees(read_rows(upload.file, name=upload.name), hash_workers=1)
+            except (ValueError, UnicodeDecodeError, csv.Error) as e:
+                self.message_user(request, f"Could not read {upload.name}: {e}", level=messages.ERROR)
+            else:
+                self.message_user(
+                    request,
+                    f"Imported {stats['created']} of {stats['rows']} rows ({stats['skipped']} duplicates, "
+                    f"{stats['invalid']} invalid) in {stats['seconds']}s — {stats['rows_per_sec']} rows/s. "
+                    "Accounts without a password can now be sent the password-set email.",
+                    level=messages.SUCCESS,
+                )
+                return redirect("admin:auth_user_changelist")
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Import attendees",
+            "form": form,
+        }
+        return TemplateResponse(request, "admin/auth/user/import_attendees.html", context)
 
     @admin.display(boolean=True, description="Onboarded")
     def onboarded_flag(self, obj):
@@ -59,11 +146,9 @@ class UserAdmin(BaseUserAdmin):
 
     @admin.action(description="Send password-set email (Resend)")
     def send_password_set_email_resend(self, request, queryset):
-        conf = (getattr(settings, "RESEND", {}) or {}).copy()
-        api_key   = _strip_quotes(conf.get("API_KEY"))
-        from_addr = _strip_quotes(conf.get("FROM") or settings.DEFAULT_FROM_EMAIL)
-        reply_to  = _strip_quotes(conf.get("REPLY_TO"))
-        base_url  = _strip_quotes(conf.get("BASE_URL") or "https://api.resend.com")
+        api_key   = mailer.conf("API_KEY")
+        from_addr = mailer.conf("FROM") or strip_quotes(settings.DEFAULT_FROM_EMAIL)
+        reply_to  = mailer.conf("REPLY_TO")
 
         # Config sanity
         if not api_key:
@@ -73,95 +158,65 @@ class UserAdmin(BaseUserAdmin):
             self.message_user(request, "Missing RESEND_FROM or DEFAULT_FROM_EMAIL.", level=messages.ERROR)
             return
 
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-        sent = failed = skipped = 0
-
+        payloads = []
+        skipped = 0
         for user in queryset:
             if not getattr(user, "email", None):
                 skipped += 1
                 continue
+            payloads.append(_password_set_payload(request, user, from_addr, reply_to))
 
-            # Build password reset link
-            uid = urlsafe_base64_encode(force_bytes(user.pk))
-            token = default_token_generator.make_token(user)
-            link = _abs_url(request, reverse("password_reset_confirm", args=[uid, token]))
-
-            subject = "Your PSI Vision account — set your password"
-            name = user.get_full_name() or user.username
-            html = f"""
-              <div style="font-family:Inter,system-ui,-apple-system,Segoe UI,Roboto,Arial,sans-serif;line-height:1.6">
-                <h2 style="color:#1A237E;margin:0 0 12px">Welcome, {name} ✨</h2>
-                <p>Your PSI Vision account is ready.</p>
-                <p>
-                  <a href="{link}" style="background:#1A237E;color:#fff;text-decoration:none;padding:10px 16px;border-radius:10px;display:inline-block">
-                    Set your password
-                  </a>
-                </p>
-                <p>If the button doesn’t work, paste this URL into your browser:</p>
-                <p style="word-break:break-all"><a href="{link}">{link}</a></p>
-                <hr style="border:none;border-top:1px solid #eee;margin:16px 0"/>
-                <p style="color:#777;font-size:12px">If you didn’t expect this email, you can ignore it.</p>
-              </div>
-            """.strip()
-            text = f"""Hi {name},
-
-Your PSI Vision account is ready.
-
-Set your password: {link}
-
-If you didn’t expect this email, you can ignore it.
-"""
-
-            payload = {
-                "from": from_addr,
-                "to": [user.email],
-                "subject": subject,
-                "html": html,
-                "text": text,
-            }
-            if reply_to:
-                payload["reply_to"] = reply_to
-
-            try:
-                r = requests.post(f"{base_url}/emails", headers=headers, json=payload, timeout=20)
-                if r.status_code in (200, 201):
-                    sent += 1
-                else:
-                    failed += 1
-                    # Friendlier errors for common cases
-                    if r.status_code == 422:
-                        msg = "422 Unprocessable Entity (is your From domain/sender verified in Resend?)."
-                    elif r.status_code == 429:
-                        msg = "429 Too Many Requests (rate limited by Resend). Try again shortly."
-                    else:
-                        msg = f"{r.status_code} – {r.text[:300]}"
-                    self.message_user(request, f"{user.email}: Resend error {msg}", level=messages.ERROR)
-            except RequestException as e:
-                failed += 1
-                self.message_user(request, f"{user.email}: Network error – {e}", level=messages.ERROR)
-            except Exception as e:
-                failed += 1
-                self.message_user(request, f"{user.email}: {e}", level=messages.ERROR)
-
-        # Summary
-        if sent:
-            self.message_user(request, f"Sent {sent} password-set email(s).", level=messages.SUCCESS)
         if skipped:
             self.message_user(request, f"Skipped {skipped} user(s) without an email.", level=messages.WARNING)
-        if failed and not sent:
-            self.message_user(request, "Failed to send password-set emails.", level=messages.ERROR)
+        if not payloads:
+            return
+
+        # Sending happens on a background thread (myApp/mailer.py); the job row shows progress
+        job = MailJob.objects.create(
+            subject=PASSWORD_SET_SUBJECT, created_by=request.user, total=len(payloads), skipped=skipped
+        )
+        transaction.on_commit(lambda: mailer.start(job, payloads))
+        link = reverse("admin:myApp_mailjob_change", args=[job.pk])
+        self.message_user(
+            request,
+            format_html('Sending {} password-set email(s) in the background. <a href="{}">Track progress</a>.',
+                        len(payloads), link),
+            level=messages.SUCCESS,
+        )
 
     @admin.action(description="Require onboarding modal again")
     def require_onboarding_again(self, request, queryset):
-        updated = 0
-        for user in queryset:
-            profile, _ = Profile.objects.get_or_create(user=user)
-            profile.onboarded = False
-            profile.save(update_fields=["onboarded"])
-            updated += 1
+        # constant queries however many users are selected: backfill, UPDATE, done
+        user_ids = list(queryset.values_list("pk", flat=True))
+        missing = queryset.filter(profile__isnull=True).values_list("pk", flat=True)
+        Profile.objects.bulk_create([Profile(user_id=pk, onboarded=False) for pk in missing], batch_size=1000)
+        updated = Profile.objects.filter(user__in=queryset).update(onboarded=False, updated_at=timezone.now())
+        profiles.invalidate_many(user_ids)  # .update() skips the post_save write-through
         self.message_user(request, f"Marked {updated} user(s) to re-onboard.", level=messages.SUCCESS)
 
 
+@admin.register(MailJob)
+class MailJobAdmin(admin.ModelAdmin):
+    list_display = ("subject", "status", "progress", "sent", "failed", "skipped", "created_by", "created_at", "finished_at")
+    list_filter = ("status",)
+    readonly_fields = [f.name for f in MailJob._meta.fields]
+
+    def changelist_view(self, request, extra_context=None):
+        mailer.fail_stale()  # jobs whose sender thread died with its worker
+        return super().changelist_view(request, extra_context)
+
+    @admin.display(description="Progress")
+    def progress(self, obj):
+        done = obj.sent + obj.failed
+        return f"{done}/{obj.total}" + ("" if obj.status != MailJob.RUNNING else " …")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # replace default User admin
 try:
     admin.site.unregister(User)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myApp'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import checks, signals  # noqa: F401  (registers the checks, connects the receivers)
+        from .metrics import install_db_wrapper
+
+        connection_created.connect(install_db_wrapper, dispatch_uid="psi-metrics-db")
@@ -0,0 +1,63 @@
+# myApp/backends.py
+"""
+Auth backend that caches the signed-in User.
+
+AuthenticationMiddleware loads request.user with a SELECT on auth_user on
+every request, and cached_db sessions (settings.SESSION_ENGINE) already
+skip the session SELECT. This backend keeps the User in the default cache
+under user:<id> as well, so a signed-in page view does no auth queries at all.
+
+The entry is rewritten whenever a User is saved (login's last_login, a
+password change, deactivation) and dropped when one is deleted (signals.py),
+so the request right after login is already a hit. Queryset .update() on
+users skips signals, so call invalidate() after one. Logging in still checks
+the password against the database.
+
+Only with a cache every worker shares (CACHE_BACKEND file/redis): on
+per-process locmem the other workers would keep a stale user, so settings
+use plain ModelBackend there and myApp/checks.py refuses this backend.
+"""
+import copy
+
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+USER_TTL = 60 * 60  # the signals keep it fresh; the TTL only bounds memory
+
+
+def cache_key(user_id):
+    return f"user:{user_id}"
+
+
+def _snapshot(user):
+    # no related objects, no permission caches (group changes don't save the
+    # User), and never the raw password set_password() keeps until save() ends
+    snap = copy.copy(user)
+    snap._state = copy.copy(user._state)
+    snap._state.fields_cache = {}
+    snap._password = None
+    for attr in ("_perm_cache", "_user_perm_cache", "_group_perm_cache"):
+        snap.__dict__.pop(attr, None)
+    return snap
+
+
+def store(user):
+    if user.get_deferred_fields():  # a partial instance; let the next request load it
+        invalidate(user.pk)
+    else:
+        cache.set(cache_key(user.pk), _snapshot(user), USER_TTL)
+
+
+def invalidate(user_id):
+    cache.delete(cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        user = cache.get(cache_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                store(user)
+        # the hash check in auth.get_user() still compares against the cached password
+        return user if user is not None and self.user_can_authenticate(user) else None
@@ -0,0 +1,40 @@
+# myApp/checks.py
+"""
+System checks for settings that only work with a cache all workers share.
+
+The cached auth backend (myApp/backends.py) and cached_db sessions keep a
+copy of the user and the session in the cache. On LocMemCache every worker
+has its own copy: a logout, password change or deactivation updates the
+worker that handled it, and the others keep accepting the old session for
+up to USER_TTL / the session age.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+CACHED_BACKEND = "myApp.backends.CachedModelBackend"
+CACHED_SESSIONS = "django.contrib.sessions.backends.cached_db"
+HINT = "Set CACHE_BACKEND=redis (or file on a single host), or use ModelBackend and db sessions."
+
+
+def is_shared(alias):
+    return not isinstance(caches[alias], LocMemCache)
+
+
+@register(Tags.caches, Tags.security)
+def check_shared_cache(app_configs, **kwargs):
+    errors = []
+    if CACHED_BACKEND in settings.AUTHENTICATION_BACKENDS and not is_shared("default"):
+        errors.append(Error(
+            f"{CACHED_BACKEND} needs a shared default cache, not LocMemCache.",
+            hint=HINT,
+            id="myApp.E001",
+        ))
+    if settings.SESSION_ENGINE == CACHED_SESSIONS and not is_shared(settings.SESSION_CACHE_ALIAS):
+        errors.append(Error(
+            f"SESSION_ENGINE {CACHED_SESSIONS} needs a shared cache, not LocMemCache.",
+            hint=HINT,
+            id="myApp.E002",
+        ))
+    return errors
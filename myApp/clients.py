@@ -0,0 +1,372 @@
+# myApp/clients.py
+"""
+One place for the upstream HTTP clients: OpenAI (sync for job threads, async
+for the ASGI views), Cloudinary and Resend.
+
+Each is built once per process with:
+- keep-alive pools sized to how it's used: the sync OpenAI client and the
+  Cloudinary pool to VISION_JOBS CONCURRENCY (one connection per job thread),
+  the async OpenAI client to UPSTREAM ASYNC_MAX_CONNECTIONS (one event loop,
+  many calls in flight), Resend to RESEND CONCURRENCY
+- HTTP/2 for OpenAI when the `h2` package is installed (httpx[http2]);
+  otherwise HTTP/1.1 keep-alive
+- explicit connect/read timeouts
+
+Cloudinary's SDK ships a module-level pool that keeps a single connection
+per host, so concurrent uploads used to throw connections away and pay a
+fresh TLS handshake each time; configure_cloudinary() swaps in ours.
+
+Every client counts requests and new connections (each one a TCP + TLS
+handshake on https). They show up in /metrics as
+psi_upstream_requests_total / psi_upstream_connections_total, and
+stats() returns them as a dict. Connections far below requests = reuse works.
+
+The async OpenAI client is the exception to "once per process": an httpx
+pool belongs to the event loop that opened its connections, so there is one
+client per running loop (PerLoop). Under ASGI that is still one per worker.
+Under WSGI each request runs on its own async_to_sync loop, which closes
+when the request ends; sharing one client there made every second call fail
+on a dead connection ("Event loop is closed"). Those requests get a fresh
+client each, dropped with their loop.
+
+warm_up() (called from asgi.py / wsgi.py) opens the pools in the background
+when a worker starts, so the first real request doesn't pay the handshake.
+After a fork the registry starts empty: workers never share sockets.
+
+openai/httpx/requests are imported inside the builders, not at module
+level: importing them cost ~0.6 s of every django.setup() (admin -> mailer
+-> here), including management commands that never call OpenAI.
+"""
+import asyncio
+import logging
+import os
+import threading
+import weakref
+
+import cloudinary
+from django.conf import settings
+
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "HTTP2": True,                  # only takes effect with `h2` installed
+    "CONNECT_TIMEOUT": 5.0,
+    "OPENAI_TIMEOUT": 120.0,        # image generations can take a minute or more
+    "CLOUDINARY_TIMEOUT": 60.0,
+    "ASYNC_MAX_CONNECTIONS": 100,
+    "ASYNC_MAX_KEEPALIVE": 20,
+    "KEEPALIVE_EXPIRY": 60.0,       # seconds an idle connection stays in the pool
+    "WARM_UP": True,
+}
+
+
+def conf(key):
+    return getattr(settings, "UPSTREAM", {}).get(key, DEFAULTS[key])
+
+
+REQUESTS = metrics.Counter("psi_upstream_requests_total", "HTTP requests sent per upstream client.", ["client"])
+CONNECTIONS = metrics.Counter(
+    "psi_upstream_connections_total", "New upstream connections (TCP + TLS handshake on https) per client.", ["client"],
+)
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def _http2():
+    if not conf("HTTP2"):
+        return False
+    try:
+        import h2  # noqa: F401  (httpx needs it for http2=True)
+    except ImportError:
+        return False
+    return True
+
+
+def _jobs_concurrency():
+    return getattr(settings, "VISION_JOBS", {}).get("CONCURRENCY", 4)
+
+
+def _get(name, build):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = build()
+    return client
+
+
+class PerLoop:
+    """A registry slot holding one client per running event loop, built on first use in each."""
+
+    def __init__(self, build):
+        self.build = build
+        self._by_loop = weakref.WeakKeyDictionary()  # a closed, collected loop takes its client along
+        self._lock = threading.Lock()  # WSGI threads each run their own loop
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._by_loop.get(loop)
+            if client is None:
+                client = self._by_loop[loop] = self.build()
+        return client
+
+
+def reset():
+    """Forget every client (after fork, in tests). Doesn't close them: a parent may still be using them."""
+    with _lock:
+        _clients.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset)
+
+
+# ---------- OpenAI (httpx) ----------
+
+def _openai_timeout():
+    import httpx
+
+    return httpx.Timeout(conf("OPENAI_TIMEOUT"), connect=conf("CONNECT_TIMEOUT"))
+
+
+def _count_request(name):
+    # httpcore reports connection setup through the "trace" extension
+    def on_request(request):
+        REQUESTS.inc(name)
+        request.extensions["trace"] = on_trace
+
+    def on_trace(event, info):
+        if event == "connection.connect_tcp.complete":
+            CONNECTIONS.inc(name)
+
+    return on_request
+
+
+def _acount_request(name):
+    async def on_request(request):
+        REQUESTS.inc(name)
+        request.extensions["trace"] = on_trace
+
+    async def on_trace(event, info):
+        if event == "connection.connect_tcp.complete":
+            CONNECTIONS.inc(name)
+
+    return on_request
+
+
+def build_openai(name="openai", base_url=None, api_key=None, **kwargs):
+    """Sync OpenAI client with a counted pool. Stubs/benchmarks pass base_url and api_key."""
+    import httpx
+    from openai import DefaultHttpxClient, OpenAI
+
+    kwargs.setdefault("max_retries", 0)  # retries are myApp/resilience.py's job
+    pool = _jobs_concurrency()
+    http = DefaultHttpxClient(
+        http2=_http2(),
+        timeout=_openai_timeout(),
+        limits=httpx.Limits(max_connections=pool, max_keepalive_connections=pool,
+                            keepalive_expiry=conf("KEEPALIVE_EXPIRY")),
+        event_hooks={"request": [_count_request(name)]},
+    )
+    return OpenAI(
+        api_key=api_key or os.getenv("OPENAI_API_KEY"),
+        organization=os.getenv("OPENAI_ORG_ID"),
+        project=os.getenv("OPENAI_PROJECT_ID"),
+        base_url=base_url,
+        timeout=_openai_timeout(),
+        http_client=http,
+        **kwargs,
+    )
+
+
+def build_aopenai(name="openai_async", base_url=None, api_key=None, **kwargs):
+    """Async OpenAI client with a counted pool (bound to the event loop that first uses it)."""
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    kwargs.setdefault("max_retries", 0)  # retries are myApp/resilience.py's job
+    http = DefaultAsyncHttpxClient(
+        http2=_http2(),
+        timeout=_openai_timeout(),
+        limits=httpx.Limits(max_connections=conf("ASYNC_MAX_CONNECTIONS"),
+                            max_keepalive_connections=conf("ASYNC_MAX_KEEPALIVE"),
+                            keepalive_expiry=conf("KEEPALIVE_EXPIRY")),
+        event_hooks={"request": [_acount_request(name)]},
+    )
+    return AsyncOpenAI(
+        api_key=api_key or os.getenv("OPENAI_API_KEY"),
+        organization=os.getenv("OPENAI_ORG_ID"),
+        project=os.getenv("OPENAI_PROJECT_ID"),
+        base_url=base_url,
+        timeout=_openai_timeout(),
+        http_client=http,
+        **kwargs,
+    )
+
+
+def openai():
+    """The job threads' client (myApp/jobs.py)."""
+    return _get("openai", build_openai)
+
+
+def aopenai():
+    """The async views' client (myApp/views.py), for the running event loop."""
+    slot = _get("openai_async", lambda: PerLoop(build_aopenai))
+    return slot.get() if isinstance(slot, PerLoop) else slot  # tests/benchmarks may park a fake here
+
+
+# ---------- urllib3 (Cloudinary, Resend) ----------
+
+def _counted(base, name):
+    """A urllib3 pool class that counts requests and new connections under `name`."""
+    def _new_conn(self):
+        CONNECTIONS.inc(name)
+        return base._new_conn(self)
+
+    def _make_request(self, *args, **kwargs):
+        REQUESTS.inc(name)
+        return base._make_request(self, *args, **kwargs)
+
+    return type(f"Counted{base.__name__}", (base,), {"_new_conn": _new_conn, "_make_request": _make_request})
+
+
+def _build_cloudinary_pool():
+    from cloudinary.api_client.tcp_keep_alive_manager import (
+        TCPKeepAliveHTTPConnectionPool, TCPKeepAliveHTTPSConnectionPool, TCPKeepAlivePoolManager,
+    )
+    from urllib3 import Timeout
+
+    size = _jobs_concurrency()
+    pool = TCPKeepAlivePoolManager(
+        num_pools=4,
+        maxsize=size,
+        block=False,
+        timeout=Timeout(connect=conf("CONNECT_TIMEOUT"), read=conf("CLOUDINARY_TIMEOUT")),
+        **cloudinary.CERT_KWARGS,
+    )
+    pool.pool_classes_by_scheme = {
+        "http": _counted(TCPKeepAliveHTTPConnectionPool, "cloudinary"),
+        "https": _counted(TCPKeepAliveHTTPSConnectionPool, "cloudinary"),
+    }
+    return pool
+
+
+def configure_cloudinary():
+    """
+    Configure the SDK from CLOUDINARY_URL or the separate vars (once) and
+    point its uploader at our pool. Returns the pool.
+    """
+    from cloudinary import uploader
+
+    cfg = cloudinary.config()
+    if not cfg.cloud_name:
+        url = os.getenv("CLOUDINARY_URL")
+        if url:
+            cloudinary.config(cloudinary_url=url, secure=True)
+        else:
+            # separate env vars path (your case)
+            cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME")
+            api_key = os.getenv("CLOUDINARY_API_KEY")
+            api_secret = os.getenv("CLOUDINARY_API_SECRET")
+            if not all([cloud_name, api_key, api_secret]):
+                raise RuntimeError(
+                    "Cloudinary env missing. Provide CLOUDINARY_URL or "
+                    "CLOUDINARY_CLOUD_NAME / CLOUDINARY_API_KEY / CLOUDINARY_API_SECRET."
+                )
+            cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+
+    pool = cloudinary_http()
+    uploader._http = pool  # the SDK's own manager keeps one connection per host
+    return pool
+
+
+def cloudinary_http():
+    """The Cloudinary pool on its own, e.g. to download delivered images (myApp/exports.py)."""
+    return _get("cloudinary", _build_cloudinary_pool)
+
+
+def _build_resend():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+
+    from .mailer import conf as resend_conf
+
+    class _CountedAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                "http": _counted(HTTPConnectionPool, "resend"),
+                "https": _counted(HTTPSConnectionPool, "resend"),
+            }
+
+    session = requests.Session()
+    adapter = _CountedAdapter(pool_connections=1, pool_maxsize=resend_conf("CONCURRENCY"))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+def resend():
+    """Shared requests.Session for Resend; callers send their own Authorization header."""
+    return _get("resend", _build_resend)
+
+
+# ---------- warm-up and stats ----------
+
+def _warm_sync():
+    from .mailer import conf as resend_conf
+
+    targets = [
+        ("openai", lambda: openai()._client.head(str(openai().base_url))),
+        ("cloudinary", lambda: configure_cloudinary().request(
+            "HEAD", cloudinary.config().upload_prefix or "https://api.cloudinary.com", retries=False)),
+        ("resend", lambda: resend().head(resend_conf("BASE_URL"), timeout=conf("CONNECT_TIMEOUT"))),
+    ]
+    for name, call in targets:
+        try:
+            call()  # any response will do: the point is the pooled connection
+        except Exception as e:
+            log.info("Warm-up of %s skipped: %s", name, e)
+
+
+async def awarm_up():
+    client = aopenai()
+    try:
+        await client._client.head(str(client.base_url))
+    except Exception as e:
+        log.info("Warm-up of openai_async skipped: %s", e)
+
+
+def warm_up():
+    """
+    Open each pool in the background. The async client can only be warmed on
+    the loop that will serve requests, so that part runs only if one is
+    already running (e.g. `uvicorn myProject.asgi:application`).
+    """
+    if not conf("WARM_UP"):
+        return
+    threading.Thread(target=_warm_sync, name="upstream-warm-up", daemon=True).start()
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    loop.create_task(awarm_up())
+
+
+def stats():
+    """{client: {"requests", "connections", "reuse"}} since process start."""
+    with metrics._lock:
+        reqs = {labels[0]: v for labels, v in REQUESTS._values.items()}
+        conns = {labels[0]: v for labels, v in CONNECTIONS._values.items()}
+    out = {}
+    for name in sorted(set(reqs) | set(conns)):
+        r, c = int(reqs.get(name, 0)), int(conns.get(name, 0))
+        out[name] = {"requests": r, "connections": c, "reuse": round(1 - c / r, 3) if r else 0.0}
+    return out
@@ -0,0 +1,118 @@
+# myApp/conditional.py
+"""
+Conditional GET for the JSON read endpoints.
+
+Each endpoint has a cheap async "version" function that returns
+(etag, last_modified) from the cache alone. The decorator compares it with
+If-None-Match / If-Modified-Since and answers 304 before the view runs, so an
+unchanged resource is never queried or serialized. Responses are marked
+private, no-cache: the browser keeps its copy but revalidates each time,
+which fetch() does on its own once it has seen an ETag.
+
+  profile   -> Profile.updated_at from the cached profile (myApp/profiles.py)
+  visions   -> a per-user token in the cache, bumped on every Vision save/delete
+
+Both assume every process sees the same cache. With per-process locmem a job
+finished by `run_vision_workers` (or a save handled by another web worker)
+never reaches this worker's copy, so there the validators come from the
+database instead: profile from its updated_at column, visions from one
+indexed aggregate (count, newest created_at / finished_at). A 304 then costs
+a query, but it's never stale.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import profiles
+from .checks import is_shared
+from .models import Profile, Vision
+
+
+VERSION_TTL = 60 * 60 * 24
+
+
+def conditional(aversion):
+    """Decorate an async GET view; aversion(request) -> (etag, last_modified datetime) or None."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            version = await aversion(request) if request.method in ("GET", "HEAD") else None
+            if version is None:
+                return await view(request, *args, **kwargs)
+            etag, last_modified = version
+            etag = quote_etag(etag)
+            ts = int(last_modified.timestamp()) if last_modified else None
+            response = get_conditional_response(request, etag=etag, last_modified=ts)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.headers.setdefault("ETag", etag)
+                if ts is not None and "Last-Modified" not in response:
+                    response.headers["Last-Modified"] = http_date(ts)
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+# ---------- versions ----------
+
+async def profile_version(request):
+    profile = await request.aprofile()
+    if profile is None:
+        return None
+    updated = profile.updated_at
+    if not is_shared("default"):
+        # another worker may have saved it since we cached it: the row decides
+        current = await Profile.objects.filter(user_id=profile.user_id).values_list("updated_at", flat=True).afirst()
+        if current is not None and current != updated:
+            profiles.invalidate(profile.user_id)
+            del request._cached_profile  # so the view reads the fresh one too
+            profile = await request.aprofile()
+            updated = profile.updated_at
+    return f"profile-{profile.user_id}-{updated.timestamp():.6f}", updated
+
+
+def _visions_key(user_id):
+    return f"visions:ver:{user_id}"
+
+
+def bump_visions(user_id):
+    """Called on Vision save/delete; invalidates every cached history page for the user."""
+    cache.set(_visions_key(user_id), time.time(), VERSION_TTL)
+
+
+async def visions_version(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return None
+    # the page parameters are part of the representation
+    query = hashlib.md5(request.META.get("QUERY_STRING", "").encode()).hexdigest()[:12]
+    if not is_shared("default"):
+        return await _visions_version_from_db(user, query)
+    key = _visions_key(user.pk)
+    stamp = await cache.aget(key)
+    if stamp is None:
+        # unknown (cold cache): start a fresh version, which misses at most once
+        stamp = time.time()
+        await cache.aset(key, stamp, VERSION_TTL)
+    return (
+        f"visions-{user.pk}-{stamp:.6f}-{query}",
+        datetime.fromtimestamp(stamp, tz=dt_timezone.utc),
+    )
+
+
+async def _visions_version_from_db(user, query):
+    """What vision_list shows changes only if one of these does (new, finished or deleted visions)."""
+    agg = await Vision.objects.filter(user=user, status=Vision.DONE).aaggregate(
+        n=Count("pk"), created=Max("created_at"), finished=Max("finished_at"),
+    )
+    stamps = [d for d in (agg["created"], agg["finished"]) if d]
+    marks = "-".join(f"{d.timestamp():.6f}" if d else "0" for d in (agg["created"], agg["finished"]))
+    return f"visions-{user.pk}-{agg['n']}-{marks}-{query}", max(stamps) if stamps else None
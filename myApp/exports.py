@@ -0,0 +1,250 @@
+# myApp/exports.py
+"""
+Streaming exports of attendees' onboarding answers (Profile) and visions.
+
+Facilitators used to get these through admin clicks or scripts that loaded
+every row at once. Here every export is a generator of byte chunks of about
+CHUNK_SIZE, so memory depends on the chunk sizes, never on the row count:
+
+- rows come from .values_list(...).iterator(chunk_size=DB_CHUNK), which is a
+  server-side cursor on Postgres and fetchmany() on SQLite; no model instances
+- csv / jsonl are encoded and handed on a chunk at a time
+- zip holds profiles.csv, visions.csv and images/<vision id>.png. ZipFile
+  writes into an unseekable pipe (sizes go in data descriptors), and each
+  image is copied from Cloudinary IMAGE_CHUNK bytes at a time through the
+  shared pool (myApp/clients.py). Images that can't be fetched are listed
+  in missing_images.txt instead of failing the whole export.
+
+since / until (dates, inclusive) pick the event: the visions created in that
+window, and the profiles of the users who onboarded or generated in it.
+
+Under ASGI, Django collects a sync iterator into a list before sending it
+(StreamingHttpResponse.__aiter__). astream() drives the generator one
+chunk per thread hop instead.
+"""
+import csv
+import io
+import json
+import logging
+import posixpath
+import zipfile
+from datetime import datetime, time as dtime, timedelta
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from . import clients
+from .models import Profile, Vision
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "CHUNK_SIZE": 64 * 1024,     # bytes per chunk handed to the response
+    "DB_CHUNK": 2000,            # rows per fetch from the database
+    "IMAGE_CHUNK": 256 * 1024,   # bytes per read from Cloudinary
+}
+
+
+def conf(key):
+    return getattr(settings, "EXPORTS", {}).get(key, DEFAULTS[key])
+
+
+# (column, values_list lookup)
+PROFILE_COLUMNS = [
+    ("user_id", "user_id"),
+    ("username", "user__username"),
+    ("email", "user__email"),
+    ("first_name", "user__first_name"),
+    ("last_name", "user__last_name"),
+    ("age_group", "age_group"),
+    ("gender", "gender"),
+    ("region", "region"),
+    ("style_keywords", "style_keywords"),
+    ("consent_use_demographics", "consent_use_demographics"),
+    ("onboarded", "onboarded"),
+    ("updated_at", "updated_at"),
+]
+VISION_COLUMNS = [
+    ("id", "id"),
+    ("user_id", "user_id"),
+    ("username", "user__username"),
+    ("email", "user__email"),
+    ("status", "status"),
+    ("prompt", "prompt"),
+    ("image_url", "meta__image_url"),
+    ("public_id", "image"),
+    ("size", "meta__size"),
+    ("created_at", "created_at"),
+    ("finished_at", "finished_at"),
+    ("error", "error"),
+]
+KINDS = {"profiles": PROFILE_COLUMNS, "visions": VISION_COLUMNS}
+FORMATS = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson", "zip": "application/zip"}
+
+
+# ---------- querysets ----------
+
+def _window(since, until):
+    """since/until dates -> Q-able (start, end) datetimes; either may be None."""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(since, dtime.min), tz) if since else None
+    end = timezone.make_aware(datetime.combine(until + timedelta(days=1), dtime.min), tz) if until else None
+    return start, end
+
+
+def _in_window(field, start, end):
+    q = Q()
+    if start:
+        q &= Q(**{f"{field}__gte": start})
+    if end:
+        q &= Q(**{f"{field}__lt": end})
+    return q
+
+
+def visions(since=None, until=None):
+    return Vision.objects.filter(_in_window("created_at", *_window(since, until))).order_by("pk")
+
+
+def profiles(since=None, until=None):
+    start, end = _window(since, until)
+    qs = Profile.objects.order_by("pk")
+    if start or end:
+        generated = Vision.objects.filter(_in_window("created_at", start, end), user_id=OuterRef("user_id"))
+        qs = qs.filter(_in_window("updated_at", start, end) | Q(Exists(generated)))
+    return qs
+
+
+def _plain(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)  # e.g. the CloudinaryResource behind Vision.image -> its public_id
+
+
+def rows(kind, qs):
+    """Plain values in KINDS[kind] column order, fetched DB_CHUNK at a time."""
+    lookups = [lookup for _, lookup in KINDS[kind]]
+    for row in qs.values_list(*lookups).iterator(chunk_size=conf("DB_CHUNK")):
+        yield [_plain(v) for v in row]
+
+
+# ---------- encoders ----------
+
+def csv_chunks(kind, qs):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([name for name, _ in KINDS[kind]])
+    for row in rows(kind, qs):
+        writer.writerow(["" if v is None else v for v in row])
+        if buf.tell() >= conf("CHUNK_SIZE"):
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode()
+
+
+def jsonl_chunks(kind, qs):
+    names = [name for name, _ in KINDS[kind]]
+    parts, size = [], 0
+    for row in rows(kind, qs):
+        line = json.dumps(dict(zip(names, row)), ensure_ascii=False) + "\n"
+        parts.append(line)
+        size += len(line)
+        if size >= conf("CHUNK_SIZE"):
+            yield "".join(parts).encode()
+            parts, size = [], 0
+    if parts:
+        yield "".join(parts).encode()
+
+
+class _Pipe(io.RawIOBase):
+    """Write-only, unseekable sink that ZipFile writes into; drain() hands the bytes on."""
+
+    def __init__(self):
+        self._parts = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def drain(self):
+        out = b"".join(self._parts)
+        self._parts, self.size = [], 0
+        return out
+
+
+def zip_chunks(since=None, until=None, images=True):
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for kind, qs in (("profiles", profiles(since, until)), ("visions", visions(since, until))):
+            with zf.open(f"{kind}.csv", "w", force_zip64=True) as out:
+                for chunk in csv_chunks(kind, qs):
+                    out.write(chunk)
+                    if pipe.size >= conf("CHUNK_SIZE"):
+                        yield pipe.drain()
+
+        if images:
+            http = clients.cloudinary_http()
+            missing = []
+            stamp = timezone.localtime().timetuple()[:6]
+            done = visions(since, until).filter(status=Vision.DONE)
+            for pk, url in done.values_list("pk", "meta__image_url").iterator(chunk_size=conf("DB_CHUNK")):
+                if not url:
+                    continue
+                ext = posixpath.splitext(urlsplit(url).path)[1].lower() or ".png"
+                info = zipfile.ZipInfo(f"images/{pk}{ext}", date_time=stamp)
+                info.compress_type = zipfile.ZIP_STORED  # already compressed
+                resp = None
+                try:
+                    resp = http.request("GET", url, preload_content=False, retries=False)
+                    if resp.status != 200:
+                        raise OSError(f"HTTP {resp.status}")
+                    with zf.open(info, "w", force_zip64=True) as out:
+                        for piece in resp.stream(conf("IMAGE_CHUNK")):
+                            out.write(piece)
+                            if pipe.size >= conf("CHUNK_SIZE"):
+                                yield pipe.drain()
+                except Exception as e:  # a half-copied image stays in the archive, listed as missing
+                    log.warning("Export: image of vision %s not included: %s", pk, e)
+                    missing.append(f"{pk}\t{url}\t{e}")
+                finally:
+                    if resp is not None:
+                        resp.release_conn()
+            if missing:
+                zf.writestr("missing_images.txt", "\n".join(missing) + "\n")
+    yield pipe.drain()
+
+
+# ---------- entry points ----------
+
+def stream(kind, fmt, since=None, until=None, images=True):
+    """(content_type, filename, chunk generator). kind is "profiles" / "visions"; ignored for zip (both)."""
+    label = "-".join(d.isoformat() for d in (since, until) if d) or timezone.localdate().isoformat()
+    if fmt == "zip":
+        return FORMATS["zip"], f"psi-export-{label}.zip", zip_chunks(since, until, images=images)
+    qs = visions(since, until) if kind == "visions" else profiles(since, until)
+    chunks = csv_chunks(kind, qs) if fmt == "csv" else jsonl_chunks(kind, qs)
+    return FORMATS[fmt], f"psi-{kind}-{label}.{fmt}", chunks
+
+
+async def astream(chunks):
+    """Async iterator over a chunk generator, without collecting it first (see the module docstring)."""
+    step = sync_to_async(next, thread_sensitive=True)  # one thread per request: the DB cursor stays put
+    try:
+        while True:
+            chunk = await step(chunks, None)
+            if chunk is None:
+                return
+            if chunk:
+                yield chunk
+    finally:
+        await sync_to_async(chunks.close, thread_sensitive=True)()
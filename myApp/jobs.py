@@ -0,0 +1,485 @@
+# myApp/jobs.py
+"""
+DB-backed job queue for image generation.
+
+A Vision row is the job: generate_vision inserts it as "queued" and returns
+right away; a worker claims it, calls gpt-image-1, uploads to Cloudinary and
+marks it "done" (or "failed"). Workers run either in-process (a small thread
+pool kicked after each enqueue) or standalone via
+`python manage.py run_vision_workers`. Claims are a conditional UPDATE, so
+any number of processes can share the table without double-processing.
+
+Jobs left "running" by a worker that died (a restart, a killed process) go
+back to the queue after STALE_AFTER seconds: run_vision_workers checks on
+every poll; in-process, each drain checks at most every SWEEP_INTERVAL, and a
+status poll on an abandoned-looking job kicks a drain (nudge()).
+"""
+import base64
+import json
+import logging
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from cloudinary.uploader import upload as cloudinary_upload
+from cloudinary.uploader import upload_large as cloudinary_upload_large
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import clients, metrics, resilience, variants, vision_cache
+from .models import Vision
+from .singleflight import SingleFlight
+
+log = logging.getLogger(__name__)
+
+IMAGE_MODEL = "gpt-image-1"
+
+DEFAULTS = {
+    "CONCURRENCY": 4,        # jobs in flight per process
+    "MAX_RUNNING": 0,        # jobs in flight across all processes (0 = no global cap)
+    "IN_PROCESS": True,      # run jobs in the web process after enqueue
+    "POLL_INTERVAL": 1.0,    # seconds between queue polls in run_vision_workers
+    "STALE_AFTER": 300,      # seconds before a "running" job is presumed dead
+    "MAX_ATTEMPTS": 2,
+}
+
+
+def conf(key):
+    return getattr(settings, "VISION_JOBS", {}).get(key, DEFAULTS[key])
+
+
+
+
+# --- streaming image path ---
+# The images API answers with one JSON document holding the PNG as a base64
+# string. Parsing that normally keeps the whole string (4/3 of the image)
+# alive and b64decode() then makes a second, full-size copy. Instead the raw
+# response is read in IMAGE_CHUNK pieces and the payload is decoded as it
+# arrives into a spooled temp file (disk past SPOOL_MAX_SIZE), which is then
+# uploaded in UPLOAD_CHUNK parts. `url` responses are fetched by Cloudinary
+# itself, so those bytes never touch this process.
+
+IMAGE_CHUNK = 64 * 1024
+SPOOL_MAX_SIZE = 1024 * 1024
+UPLOAD_CHUNK = 6 * 1024 * 1024  # Cloudinary's chunked upload needs parts of at least 5 MB
+_B64_KEY = re.compile(rb'"b64_json"\s*:\s*"')
+_KEY_WINDOW = 64  # bytes kept back while looking for a key split across chunks
+
+
+def _extract_b64(chunks):
+    """
+    Split a streamed images response into (doc, image_file).
+    doc is the parsed JSON with b64_json emptied; image_file is a rewound
+    SpooledTemporaryFile with the decoded bytes, or None if there was no b64_json.
+    """
+    head = bytearray()  # the JSON around the payload: small
+    image = None
+    carry = b""         # base64 characters not yet a multiple of 4
+    inside = done = False
+    window = b""
+    decode_s = 0.0
+    for chunk in chunks:
+        data = window + chunk
+        window = b""
+        while data:
+            if done:
+                head += data
+                break
+            if not inside:
+                m = _B64_KEY.search(data)
+                if m is None:
+                    head += data[:-_KEY_WINDOW]
+                    window = data[-_KEY_WINDOW:]
+                    break
+                head += data[:m.end()]
+                data = data[m.end():]
+                inside = True
+                image = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+                continue
+            q = data.find(b'"')
+            part, data = (data, b"") if q < 0 else (data[:q], data[q:])
+            part = carry + part.replace(b"\\", b"")  # a JSON "\/" is just "/"
+            n = len(part) // 4 * 4
+            t0 = time.perf_counter()
+            image.write(base64.b64decode(part[:n]))
+            decode_s += time.perf_counter() - t0
+            carry = part[n:]
+            if q >= 0:
+                inside, done = False, True
+    head += window
+    if inside or carry:
+        raise RuntimeError("Image response ended mid-payload.")
+    if image is not None:
+        image.seek(0)
+        metrics.UPSTREAM_SECONDS.observe(decode_s, "b64_decode")
+    return json.loads(bytes(head)), image
+
+
+def _generate_image(gen_kwargs, timeout=None):
+    # the sync client (jobs run in worker threads), built on first use; pooled in myApp/clients.py
+    with clients.openai().images.with_streaming_response.generate(**gen_kwargs, timeout=timeout) as raw:
+        return _extract_b64(raw.iter_bytes(IMAGE_CHUNK))
+
+
+def _upload_generated_image(image, url, public_id):
+    clients.configure_cloudinary()
+    options = dict(
+        folder="psi-vision",        # your folder
+        public_id=public_id,        # final path: psi-vision/public_id
+        resource_type="image",
+        overwrite=True,
+        invalidate=True,
+        format="png",               # force PNG (keeps transparency)
+        eager=variants.EAGER,       # AVIF/WebP sizes for srcset (myApp/variants.py)
+        eager_async=True,           # built in the background; the upload doesn't wait
+    )
+    with metrics.timer("cloudinary_upload"):
+        if image is not None:
+            # reads UPLOAD_CHUNK at a time from the spool; closes it when done
+            return cloudinary_upload_large(image, chunk_size=UPLOAD_CHUNK, filename=f"{public_id}.png", **options)
+        return cloudinary_upload(url, **options)  # remote fetch by Cloudinary
+
+
+def render_vision(prompt, size, background):
+    """
+    Generate one image and upload it.
+    Returns (cloudinary upload result, stats) where stats has token usage and
+    per-phase timings in ms.
+    """
+    gen_kwargs = {"model": IMAGE_MODEL, "prompt": prompt, "size": size, "n": 1}
+    if background:
+        gen_kwargs["background"] = background  # "transparent"|"white"
+    t0 = time.perf_counter()
+    with metrics.timer("openai_image"):
+        # deadline, retries and circuit breaker: myApp/resilience.py
+        doc, image = resilience.call(
+            resilience.OPENAI_IMAGE,
+            lambda timeout: _generate_image(gen_kwargs, timeout),
+            budget=resilience.conf("IMAGE_BUDGET"),
+            attempt_timeout=resilience.conf("IMAGE_ATTEMPT_TIMEOUT"),
+        )
+    t1 = time.perf_counter()
+
+    item = (doc.get("data") or [{}])[0]
+    url = item.get("url")
+    if image is None and not url:
+        raise RuntimeError("No image content returned from model.")
+
+    public_id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    try:
+        upload_result = _upload_generated_image(image, url, public_id)
+    finally:
+        if image is not None:
+            image.close()
+    if not upload_result.get("secure_url"):
+        raise RuntimeError("Cloudinary upload failed.")
+    t2 = time.perf_counter()
+    stats = {
+        "usage": doc.get("usage") or {},
+        "openai_ms": round((t1 - t0) * 1000),
+        "upload_ms": round((t2 - t1) * 1000),
+    }
+    return upload_result, stats
+
+
+# ---------- queue ----------
+
+def enqueue(user, prompt, size, background, regenerate=False):
+    """Queue a job; returns (vision, created), created=False for a still-pending identical one."""
+    key = vision_cache.prompt_key(prompt, size, background)
+    meta = {"size": size, "background": background}
+    if regenerate:
+        meta["regenerate"] = True
+    else:
+        # double-click / resubmit while the first one is still cooking: same job
+        pending = (
+            Vision.objects.filter(user=user, prompt_key=key, status__in=[Vision.QUEUED, Vision.RUNNING])
+            .order_by("-created_at")
+            .first()
+        )
+        if pending is not None:
+            return pending, False
+    vision = Vision.objects.create(
+        user=user,
+        prompt=prompt,
+        prompt_key=key,
+        status=Vision.QUEUED,
+        meta=meta,
+    )
+    if conf("IN_PROCESS"):
+        transaction.on_commit(kick)
+    return vision, True
+
+
+def from_cache(user, prompt, size, background):
+    """
+    Record a finished Vision for the user straight from the result cache.
+    Returns None on a miss (caller enqueues a real job).
+    """
+    key = vision_cache.prompt_key(prompt, size, background)
+    hit = vision_cache.lookup(key)
+    if hit is None:
+        return None
+    now = timezone.now()
+    return Vision.objects.create(
+        user=user,
+        prompt=prompt,
+        prompt_key=key,
+        image=hit["public_id"],
+        status=Vision.DONE,
+        finished_at=now,
+        meta=_cached_meta({"size": size, "background": background}, hit),
+    )
+
+
+def _cached_meta(meta, hit):
+    return {
+        **meta,
+        "image_url": hit["image_url"],
+        "width": hit.get("width"),
+        "height": hit.get("height"),
+        "bytes": hit.get("bytes"),
+        "variants": hit.get("variants") or variants.build(hit["image_url"]),
+        "cached": True,
+    }
+
+
+def requeue_stale():
+    """Put back jobs whose worker died mid-run; give up after MAX_ATTEMPTS."""
+    cutoff = timezone.now() - timedelta(seconds=conf("STALE_AFTER"))
+    stale = Vision.objects.filter(status=Vision.RUNNING, started_at__lt=cutoff)
+    stale.filter(attempts__gte=conf("MAX_ATTEMPTS")).update(
+        status=Vision.FAILED, error="Worker timed out.", finished_at=timezone.now()
+    )
+    return stale.update(status=Vision.QUEUED)
+
+
+def claim_next():
+    """Atomically move the oldest queued job to running; None if nothing to do."""
+    max_running = conf("MAX_RUNNING")
+    if max_running:
+        return _claim_capped(max_running)
+    candidates = (
+        Vision.objects.filter(status=Vision.QUEUED)
+        .order_by("created_at")
+        .values_list("pk", flat=True)[:10]
+    )
+    for pk in candidates:
+        claimed = Vision.objects.filter(pk=pk, status=Vision.QUEUED).update(
+            status=Vision.RUNNING, started_at=timezone.now(), attempts=F("attempts") + 1
+        )
+        if claimed:
+            return Vision.objects.get(pk=pk)
+    return None
+
+
+def _claim_capped(max_running):
+    # Count and claim in one transaction. Every claimer locks the head of the
+    # queue first, so they take turns (on SQLite, BEGIN IMMEDIATE already
+    # serializes them) and none can act on a count that misses another's claim.
+    # A claimer that waited may find the head gone and get None; the drain
+    # that took it keeps claiming once its job finishes.
+    with transaction.atomic():
+        pk = (
+            Vision.objects.select_for_update()
+            .filter(status=Vision.QUEUED)
+            .order_by("created_at", "pk")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if pk is None or Vision.objects.filter(status=Vision.RUNNING).count() >= max_running:
+            return None
+        Vision.objects.filter(pk=pk).update(
+            status=Vision.RUNNING, started_at=timezone.now(), attempts=F("attempts") + 1
+        )
+    return Vision.objects.get(pk=pk)
+
+
+# Identical jobs running at the same moment (a room full of people pasting the
+# sample prompt) share one upstream call; see myApp/singleflight.py.
+_flight = SingleFlight("vision")
+
+
+def process(vision):
+    meta = vision.meta or {}
+    key = vision.prompt_key
+    if meta.get("regenerate") or not key:
+        return _generate(vision)
+
+    # an identical job may have finished while this one sat in the queue
+    hit = vision_cache.lookup(key)
+    if hit is None:
+        value, shared = _flight.do(key, lambda: _generate(vision), recheck=lambda: vision_cache.lookup(key))
+        if not shared:
+            return value  # this job led the flight and is already saved
+        if isinstance(value, Vision):
+            if value.status != Vision.DONE:
+                vision.status = Vision.FAILED
+                vision.error = value.error
+                vision.finished_at = timezone.now()
+                vision.save(update_fields=["status", "error", "finished_at"])
+                return vision
+            value = vision_cache.entry(value)
+        hit = value
+
+    vision.status = Vision.DONE
+    vision.image = hit["public_id"]
+    vision.meta = _cached_meta(meta, hit)
+    vision.finished_at = timezone.now()
+    vision.save(update_fields=["status", "image", "meta", "finished_at"])
+    return vision
+
+
+def _generate(vision):
+    """Call OpenAI + Cloudinary for this job and record the outcome on the row."""
+    meta = vision.meta or {}
+    try:
+        result, stats = render_vision(vision.prompt, meta.get("size", "1024x1024"), meta.get("background"))
+    except Exception as e:
+        log.exception("Vision job %s failed", vision.pk)
+        vision.status = Vision.FAILED
+        handled = resilience.friendly(e)
+        vision.error = handled[1] if handled else str(e)
+    else:
+        vision.status = Vision.DONE
+        vision.image = result.get("public_id")
+        vision.meta = {
+            **meta,
+            "image_url": result.get("secure_url"),
+            "width": result.get("width"),
+            "height": result.get("height"),
+            "bytes": result.get("bytes"),
+            "variants": variants.build(result.get("secure_url")),
+            "model": IMAGE_MODEL,
+            "usage": stats["usage"],
+        }
+    vision.finished_at = timezone.now()
+    # queue = waiting for a worker, total = enqueue to finished (what the user saw)
+    latency = {
+        "queue_ms": _ms(vision.started_at - vision.created_at) if vision.started_at else None,
+        "total_ms": _ms(vision.finished_at - vision.created_at),
+    }
+    if vision.status == Vision.DONE:
+        latency.update(openai_ms=stats["openai_ms"], upload_ms=stats["upload_ms"])
+    vision.meta = {**(vision.meta or {}), "latency_ms": latency}
+    vision.save(update_fields=["status", "error", "image", "meta", "finished_at"])
+    if vision.status == Vision.DONE:
+        vision_cache.store(vision.prompt_key, vision)
+    return vision
+
+
+def _ms(delta):
+    return round(delta.total_seconds() * 1000)
+
+
+def run_one(vision):
+    """
+    process() a claimed job. If it raises something it doesn't handle (say a
+    DB error saving the result), the job goes back to the queue, or fails
+    after MAX_ATTEMPTS, instead of sitting RUNNING until requeue_stale.
+    """
+    try:
+        return process(vision)
+    except Exception as e:
+        log.exception("Vision job %s crashed", vision.pk)
+        close_old_connections()  # drop the connection if that's what broke
+        running = Vision.objects.filter(pk=vision.pk, status=Vision.RUNNING)
+        try:
+            if vision.attempts < conf("MAX_ATTEMPTS"):
+                running.update(status=Vision.QUEUED)
+            else:
+                handled = resilience.friendly(e)
+                running.update(status=Vision.FAILED, error=handled[1] if handled else str(e),
+                               finished_at=timezone.now())
+        except Exception:
+            log.exception("Could not record the crash of vision job %s", vision.pk)
+        return None
+
+
+def drain():
+    """Process queued jobs until the queue is empty."""
+    try:
+        sweep()
+        while True:
+            vision = claim_next()
+            if vision is None:
+                return
+            run_one(vision)
+    finally:
+        close_old_connections()
+
+
+# ---------- in-process pool ----------
+
+SWEEP_INTERVAL = 60  # seconds between requeue_stale() calls from drains in one process
+
+_pool = None
+_pool_lock = threading.Lock()
+_last_sweep = None
+
+
+def sweep():
+    """requeue_stale(), at most every SWEEP_INTERVAL per process (the first drain after a restart always runs it)."""
+    global _last_sweep
+    now = time.monotonic()
+    with _pool_lock:
+        if _last_sweep is not None and now - _last_sweep < SWEEP_INTERVAL:
+            return 0
+        _last_sweep = now
+    return requeue_stale()
+
+
+def looks_abandoned(vision):
+    """Pending for longer than STALE_AFTER: its worker may be gone."""
+    cutoff = timezone.now() - timedelta(seconds=conf("STALE_AFTER"))
+    if vision.status == Vision.RUNNING:
+        return vision.started_at is not None and vision.started_at < cutoff
+    return vision.status == Vision.QUEUED and vision.created_at < cutoff
+
+
+def nudge():
+    """From a status poll on an abandoned-looking job: in-process, start a drain (which sweeps)."""
+    if conf("IN_PROCESS"):
+        kick()
+
+
+def kick():
+    """Wake the in-process pool; at most CONCURRENCY drains run at once."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=conf("CONCURRENCY"), thread_name_prefix="vision-job")
+    _pool.submit(drain)
+
+
+def run_workers(concurrency=None, poll_interval=None, stop=None):
+    """Blocking loop for run_vision_workers: keep `concurrency` jobs in flight."""
+    concurrency = concurrency or conf("CONCURRENCY")
+    poll_interval = poll_interval or conf("POLL_INTERVAL")
+    stop = stop or threading.Event()
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def run(vision):
+        try:
+            run_one(vision)
+        finally:
+            close_old_connections()
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="vision-job") as pool:
+        while not stop.is_set():
+            requeue_stale()
+            while slots.acquire(blocking=False):
+                vision = claim_next()
+                if vision is None:
+                    slots.release()
+                    break
+                pool.submit(run, vision)
+            close_old_connections()
+            stop.wait(poll_interval)
@@ -0,0 +1,278 @@
+# myApp/mailer.py
+"""
+Bulk mail through Resend's HTTP API.
+
+The admin action used to POST one email at a time, each on a new
+connection, inside the admin request. Now it records a MailJob, builds the
+payloads, and hands them to a background thread here, which:
+
+- reuses connections through the process-wide pooled session (myApp/clients.py)
+- groups emails into /emails/batch calls (up to BATCH_SIZE each) and falls
+  back to /emails if the batch endpoint is refused
+- runs up to CONCURRENCY requests at once, all drawing from one token bucket
+  (RATE_PER_SEC) so the pool never outruns Resend's limit
+- on 429/5xx waits for Retry-After (or backs off exponentially) and retries.
+  A 429 pauses the whole bucket, not just the thread that got it.
+
+Progress lands on the MailJob row after every request (admin > Mail jobs).
+The sender is a daemon thread inside the web worker, so a recycled worker
+takes it down mid-send; a job whose row hasn't moved for STALE_AFTER seconds
+is marked failed (fail_stale, run when the admin lists mail jobs). The
+payloads carry one-time password links and aren't stored, so it can't resume.
+"""
+import email.utils
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+from requests import RequestException
+
+from . import clients, metrics
+from .models import MailJob
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "BASE_URL": "https://api.resend.com",
+    "RATE_PER_SEC": 2.0,
+    "CONCURRENCY": 4,
+    "BATCH_SIZE": 100,     # Resend accepts up to 100 emails per batch call
+    "MAX_RETRIES": 4,
+    "TIMEOUT": 20.0,
+    "STALE_AFTER": 600,    # seconds without progress before a running job is presumed dead
+}
+
+MAX_BACKOFF = 60.0
+MAX_ERRORS_KEPT = 50
+
+
+def strip_quotes(val):
+    """Handle Windows-style env vars like: RESEND_FROM="PSI <psi@psi.org>"."""
+    if not val:
+        return val
+    v = val.strip()
+    if (v.startswith('"') and v.endswith('"')) or (v.startswith("'") and v.endswith("'")):
+        return v[1:-1].strip()
+    return v
+
+
+def conf(key):
+    val = (getattr(settings, "RESEND", {}) or {}).get(key)
+    if val in (None, ""):
+        return DEFAULTS.get(key)
+    return strip_quotes(val) if isinstance(val, str) else val
+
+
+class RateLimiter:
+    """Thread-safe token bucket: `rate` requests/second, bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, int(rate)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (server said slow down)."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.updated = self.blocked_until
+
+
+class ResendError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def _describe(r):
+    # Friendlier errors for common cases
+    if r.status_code == 422:
+        return "422 Unprocessable Entity (is your From domain/sender verified in Resend?)."
+    if r.status_code == 429:
+        return "429 Too Many Requests (rate limited by Resend). Try again shortly."
+    return f"{r.status_code} – {r.text[:300]}"
+
+
+def _retry_after(r, attempt):
+    """Seconds to wait before retrying `r`: Retry-After (seconds or HTTP date), else exponential."""
+    value = r.headers.get("Retry-After") if r is not None else None
+    if value:
+        try:
+            return min(max(float(value), 0.0), MAX_BACKOFF)
+        except ValueError:
+            try:
+                when = email.utils.parsedate_to_datetime(value)
+                return min(max(when.timestamp() - time.time(), 0.0), MAX_BACKOFF)
+            except (TypeError, ValueError):
+                pass
+    return min(0.5 * 2 ** attempt, MAX_BACKOFF)
+
+
+class ResendClient:
+    def __init__(self, api_key, base_url=None, limiter=None, timeout=None, max_retries=None, session=None):
+        self.base_url = (base_url or conf("BASE_URL")).rstrip("/")
+        self.limiter = limiter or RateLimiter(conf("RATE_PER_SEC"))
+        self.timeout = (clients.conf("CONNECT_TIMEOUT"), timeout or conf("TIMEOUT"))
+        self.max_retries = conf("MAX_RETRIES") if max_retries is None else max_retries
+        self.session = session or clients.resend()  # pooled per process, shared by every job
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+
+    def post(self, path, body):
+        r = None
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                with metrics.timer("resend"):
+                    r = self.session.post(f"{self.base_url}{path}", json=body, headers=self.headers,
+                                          timeout=self.timeout)
+            except RequestException as e:
+                if attempt == self.max_retries:
+                    raise ResendError(f"Network error – {e}")
+                time.sleep(_retry_after(None, attempt))
+                continue
+            if r.status_code in (200, 201, 202):
+                return r.json() if r.content else {}
+            if r.status_code == 429 or r.status_code >= 500:
+                delay = _retry_after(r, attempt)
+                if r.status_code == 429:
+                    self.limiter.pause(delay)  # every thread backs off, not just this one
+                else:
+                    time.sleep(delay)
+                continue
+            raise ResendError(_describe(r), r.status_code)
+        raise ResendError(_describe(r), r.status_code)
+
+    def send(self, payload):
+        return self.post("/emails", payload)
+
+    def send_batch(self, payloads):
+        return self.post("/emails/batch", payloads)
+
+
+def send_bulk(client, payloads, batch_size=None, concurrency=None, on_progress=None):
+    """
+    Send every payload; returns (sent, failed, errors).
+    on_progress(sent, failed, errors) is called after each request with the
+    increments for that request (from worker threads).
+    """
+    batch_size = conf("BATCH_SIZE") if batch_size is None else batch_size
+    concurrency = concurrency or conf("CONCURRENCY")
+    use_batch = batch_size > 1
+    totals = {"sent": 0, "failed": 0, "errors": []}
+    mu = threading.Lock()
+
+    def report(sent, failed, errors):
+        with mu:
+            totals["sent"] += sent
+            totals["failed"] += failed
+            totals["errors"].extend(errors)
+        if on_progress:
+            on_progress(sent, failed, errors)
+
+    def send_one(payload):
+        try:
+            client.send(payload)
+        except ResendError as e:
+            report(0, 1, [f"{', '.join(payload['to'])}: Resend error {e}"])
+        else:
+            report(1, 0, [])
+
+    def send_chunk(chunk):
+        nonlocal use_batch
+        if use_batch and len(chunk) > 1:
+            try:
+                client.send_batch(chunk)
+            except ResendError as e:
+                if e.status in (404, 405):
+                    use_batch = False  # no batch endpoint here; go one by one from now on
+                elif e.status in (401, 403) or not (e.status and 400 <= e.status < 500):
+                    report(0, len(chunk), [f"batch of {len(chunk)}: Resend error {e}"])
+                    return
+                # any other 4xx (e.g. a 422 for one bad address): send this chunk
+                # one by one so only the bad recipients fail. Bad API keys fail every
+                # send alike, so they don't.
+            else:
+                report(len(chunk), 0, [])
+                return
+        for payload in chunk:
+            send_one(payload)
+
+    size = batch_size if use_batch else 1
+    chunks = [payloads[i:i + size] for i in range(0, len(payloads), size)]
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="resend") as pool:
+        for fut in as_completed([pool.submit(send_chunk, c) for c in chunks]):
+            fut.result()
+    return totals["sent"], totals["failed"], totals["errors"]
+
+
+# ---------- MailJob runner ----------
+
+def run_job(job_id, payloads, client=None):
+    """Send a MailJob's payloads, keeping the row's counters current."""
+    client = client or ResendClient(conf("API_KEY"))
+    errors = []
+
+    def progress(sent, failed, new_errors):
+        if new_errors:
+            errors.extend(new_errors)
+        MailJob.objects.filter(pk=job_id).update(
+            sent=F("sent") + sent, failed=F("failed") + failed, updated_at=timezone.now()
+        )
+        close_old_connections()
+
+    status = MailJob.DONE
+    try:
+        send_bulk(client, payloads, on_progress=progress)
+    except Exception as e:
+        log.exception("Mail job %s crashed", job_id)
+        errors.append(str(e))
+        status = MailJob.FAILED
+    finally:
+        MailJob.objects.filter(pk=job_id).update(
+            status=status, errors=errors[:MAX_ERRORS_KEPT], finished_at=timezone.now(), updated_at=timezone.now()
+        )
+        close_old_connections()
+
+
+def start(job, payloads):
+    """Run the job on a background thread (the admin request returns right away)."""
+    t = threading.Thread(target=run_job, args=(job.pk, payloads), name=f"mailjob-{job.pk}", daemon=True)
+    t.start()
+    return t
+
+
+def fail_stale():
+    """Mark running jobs whose sender thread is gone (no progress for STALE_AFTER) as failed."""
+    now = timezone.now()
+    return MailJob.objects.filter(
+        status=MailJob.RUNNING, updated_at__lt=now - timedelta(seconds=conf("STALE_AFTER"))
+    ).update(
+        status=MailJob.FAILED, finished_at=now, updated_at=now,
+        errors=["Sender stopped (worker restarted?) before the job finished; "
+                "sent/failed show how far it got."],
+    )
@@ -0,0 +1,116 @@
+# myApp/management/commands/bench_concurrency.py
+"""
+How many slow upstream calls can one process keep in flight?
+
+Drives the real chat_ai view with a fake OpenAI client (fixed latency, no
+network) in two modes:
+
+  wsgi  - a thread pool the size of a gunicorn worker's --threads; each
+          request pins a thread for its whole lifetime (the old model)
+  asgi  - every request on one event loop via AsyncClient (uvicorn model)
+
+    python manage.py bench_concurrency --requests 200 --latency 2 --threads 4
+
+(generate_vision no longer waits on OpenAI in the request - it enqueues a
+job - so chat_ai is the endpoint whose concurrency depends on the worker model.)
+
+Every request sends a different message, and rate limits are off for the
+run. Otherwise identical bodies share one upstream call (single-flight) and
+most requests get 429 from the per-IP limit, so the numbers would measure
+those instead.
+"""
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace as NS
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings, setup_test_environment
+
+from myApp import clients
+
+class _InFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.now = 0
+        self.peak = 0
+
+    def __enter__(self):
+        with self._lock:
+            self.now += 1
+            self.peak = max(self.peak, self.now)
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.now -= 1
+
+
+class _FakeAsyncOpenAI:
+    """Just enough of AsyncOpenAI for the views: sleeps instead of calling out."""
+
+    def __init__(self, latency, gauge):
+        self.latency = latency
+        self.gauge = gauge
+        self.chat = NS(completions=NS(create=self._chat))
+
+    async def _chat(self, **kwargs):
+        with self.gauge:
+            await asyncio.sleep(self.latency)
+        return NS(choices=[NS(message=NS(content="ok"))])
+
+
+class Command(BaseCommand):
+    help = "Compare in-flight upstream calls per process: thread-per-request vs async views."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--latency", type=float, default=2.0, help="Fake OpenAI latency (s).")
+        parser.add_argument("--threads", type=int, default=4, help="Threads per WSGI worker (gunicorn --threads).")
+
+    def handle(self, *args, **opts):
+        setup_test_environment()
+        path = "/chat-ai/"
+        bodies = [json.dumps({"message": f"Describe my vision #{i}"}) for i in range(opts["requests"])]
+
+        rows = []
+        for mode in ("wsgi", "asgi"):
+            gauge = _InFlight()
+            fake = _FakeAsyncOpenAI(opts["latency"], gauge)
+            # same slot stubs.use_stubs() swaps: the views call clients.aopenai()
+            with mock.patch.dict(clients._clients, {"openai_async": fake}), \
+                    override_settings(QUOTAS={"ENABLED": False}):
+                started = time.perf_counter()
+                if mode == "wsgi":
+                    statuses = self._run_threads(path, bodies, opts["threads"])
+                else:
+                    statuses = asyncio.run(self._run_async(path, bodies))
+                wall = time.perf_counter() - started
+
+            ok = sum(1 for s in statuses if s == 200)
+            rows.append((mode, ok, len(statuses), wall, gauge.peak, ok / wall if wall else 0.0))
+
+        self.stdout.write(f"chat-ai: {opts['requests']} requests, upstream {opts['latency']}s, "
+                          f"{opts['threads']} WSGI thread(s)")
+        self.stdout.write(f"{'mode':<6}{'ok':>8}{'wall s':>10}{'peak in-flight':>16}{'req/s':>10}")
+        for mode, ok, total, wall, peak, rps in rows:
+            self.stdout.write(f"{mode:<6}{f'{ok}/{total}':>8}{wall:>10.2f}{peak:>16}{rps:>10.1f}")
+
+    @staticmethod
+    def _run_threads(path, bodies, threads):
+        def one(body):
+            return Client().post(path, data=body, content_type="application/json").status_code
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            return list(pool.map(one, bodies))
+
+    @staticmethod
+    async def _run_async(path, bodies):
+        client = AsyncClient()
+        responses = await asyncio.gather(
+            *(client.post(path, data=body, content_type="application/json") for body in bodies)
+        )
+        return [r.status_code for r in responses]
@@ -0,0 +1,162 @@
+# myApp/management/commands/bench_db_writes.py
+"""
+Write concurrency per database mode (settings.DATABASES).
+
+Each mode gets a throwaway test database with the real migrations. Then
+--threads threads (one connection each, as with worker threads) run
+profile_save-style operations:
+
+  write  - load the user's Profile, change it, .save() (signals included)
+  read   - the workshop page's profile + latest visions lookups
+
+--read-ratio of the operations are reads. Modes:
+
+  sqlite      - Django's SQLite defaults (rollback journal, 5 s timeout)
+  sqlite-wal  - settings.SQLITE_OPTIONS (WAL, synchronous=NORMAL, mmap, IMMEDIATE)
+  postgres    - --postgres URL (or DATABASE_URL), persistent connections;
+                a test_<name> database is created next to it and dropped after
+
+    python manage.py bench_db_writes --threads 8 --ops 300
+    python manage.py bench_db_writes --modes postgres --postgres postgres://user:pw@host/db
+"""
+import copy
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+import dj_database_url
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+
+from myApp.models import Profile, Vision
+
+MODES = ("sqlite", "sqlite-wal", "postgres")
+
+
+def _pct(samples, p):
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))] if samples else 0.0
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent profile writes on SQLite (default vs WAL) and Postgres."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modes", default="sqlite,sqlite-wal", help="Comma-separated: " + ", ".join(MODES))
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--ops", type=int, default=300, help="Operations per thread.")
+        parser.add_argument("--read-ratio", type=float, default=0.5)
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--postgres", default=os.environ.get("DATABASE_URL"), help="Postgres URL for that mode.")
+
+    def handle(self, *args, **opts):
+        modes = [m.strip() for m in opts["modes"].split(",") if m.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown mode(s): {', '.join(sorted(unknown))}")
+        if "postgres" in modes and not opts["postgres"]:
+            raise CommandError("The postgres mode needs --postgres or DATABASE_URL.")
+
+        rows = []
+        for mode in modes:
+            self.stdout.write(f"{mode}…")
+            rows.append((mode, self._run_mode(mode, opts)))
+
+        self.stdout.write(f"\n{opts['threads']} threads × {opts['ops']} ops, {opts['read_ratio']:.0%} reads")
+        self.stdout.write(f"{'mode':<11} {'ops/s':>8} {'write p50':>10} {'write p99':>10} {'read p99':>9} {'errors':>7}")
+        for mode, r in rows:
+            self.stdout.write(f"{mode:<11} {r['ops_per_s']:>8.0f} {r['write_p50']:>8.1f}ms {r['write_p99']:>8.1f}ms "
+                              f"{r['read_p99']:>7.1f}ms {r['errors']:>7}")
+
+    # ---------- one mode ----------
+
+    def _settings(self, mode, opts, tmpdir):
+        base = copy.deepcopy(connections["default"].settings_dict)
+        if mode == "postgres":
+            base.update(dj_database_url.parse(opts["postgres"], conn_max_age=60, conn_health_checks=True))
+            base["OPTIONS"] = base.get("OPTIONS") or {}
+            base["TEST"] = {**base.get("TEST", {}), "NAME": None}
+            return base
+        path = os.path.join(tmpdir, f"{mode}.sqlite3")
+        base.update(ENGINE="django.db.backends.sqlite3", NAME=path, TEST={**base["TEST"], "NAME": path},
+                    OPTIONS=copy.deepcopy(settings.SQLITE_OPTIONS) if mode == "sqlite-wal" else {})
+        return base
+
+    def _run_mode(self, mode, opts):
+        alias = f"bench_{mode.replace('-', '_')}"
+        tmpdir = tempfile.mkdtemp(prefix="psi-dbbench-")
+        connections.settings[alias] = self._settings(mode, opts, tmpdir)
+        conn = connections[alias]
+        old_name = conn.settings_dict["NAME"]
+        conn.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            user_ids = self._seed(alias, opts["users"])
+            return self._drive(alias, user_ids, opts)
+        finally:
+            connections.close_all()
+            conn.creation.destroy_test_db(old_name, verbosity=0)
+            del connections.settings[alias]
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def _seed(self, alias, n):
+        User = get_user_model()
+        # bulk_create skips the post_save signal, so the profiles are created here too
+        User.objects.using(alias).bulk_create(
+            [User(username=f"db{i}", email=f"db{i}@example.com", password="!") for i in range(n)]
+        )
+        ids = list(User.objects.using(alias).values_list("pk", flat=True))
+        Profile.objects.using(alias).bulk_create([Profile(user_id=pk) for pk in ids])
+        return ids
+
+    def _drive(self, alias, user_ids, opts):
+        writes, reads, errors = [], [], [0]
+        mu = threading.Lock()
+        start = threading.Barrier(opts["threads"])
+        regions = [code for code, _ in Profile.REGION]
+
+        def worker(seed):
+            rng = random.Random(seed)
+            my_writes, my_reads, my_errors = [], [], 0
+            start.wait()
+            for i in range(opts["ops"]):
+                uid = rng.choice(user_ids)
+                t0 = time.perf_counter()
+                try:
+                    if rng.random() < opts["read_ratio"]:
+                        Profile.objects.using(alias).get(user_id=uid)
+                        list(Vision.objects.using(alias).filter(user_id=uid).order_by("-created_at")[:24])
+                        my_reads.append((time.perf_counter() - t0) * 1000)
+                    else:
+                        profile = Profile.objects.using(alias).get(user_id=uid)
+                        profile.region = rng.choice(regions)
+                        profile.style_keywords = f"run {seed}-{i}"
+                        profile.save(using=alias)
+                        my_writes.append((time.perf_counter() - t0) * 1000)
+                except OperationalError:  # "database is locked" once the busy timeout runs out
+                    my_errors += 1
+            connections[alias].close()
+            with mu:
+                writes.extend(my_writes)
+                reads.extend(my_reads)
+                errors[0] += my_errors
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(opts["threads"])]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - started
+        writes.sort()
+        reads.sort()
+        return {
+            "ops_per_s": (len(writes) + len(reads)) / wall,
+            "write_p50": _pct(writes, 50),
+            "write_p99": _pct(writes, 99),
+            "read_p99": _pct(reads, 99),
+            "errors": errors[0],
+        }
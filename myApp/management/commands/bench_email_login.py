@@ -0,0 +1,95 @@
+# myApp/management/commands/bench_email_login.py
+"""
+Email-login lookup cost at scale, on a throwaway test database.
+
+Seeds N users (a few sharing an email in different case), then times the
+lookup login_view does for an email ident:
+
+  iexact     - the old User.objects.get(email__iexact=...), a table scan
+  lower      - find_user_by_email() without the LOWER(email) index
+  lower+idx  - find_user_by_email() with the index from migration 0008
+
+    python manage.py bench_email_login --users 100000 --lookups 500
+
+Password hashing is left out on purpose; it costs the same on every path.
+"""
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+from django.db.models.functions import Lower
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from myApp.utils.accounts import find_user_by_email
+
+INDEX = models.Index(Lower("email"), name="auth_user_email_lower_idx")
+
+
+class Command(BaseCommand):
+    help = "Benchmark case-insensitive email lookup with and without the LOWER(email) index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--lookups", type=int, default=500)
+
+    def handle(self, *args, **opts):
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self._run(opts["users"], opts["lookups"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def _run(self, n_users, n_lookups):
+        User = get_user_model()
+        self.stdout.write(f"Seeding {n_users} users…")
+        started = time.perf_counter()
+        batch = []
+        for i in range(n_users):
+            email = f"Person{i}@Example.com"
+            if i % 1000 == 999:
+                email = f"person{i - 1}@example.COM"  # duplicate of the previous one, other case
+            batch.append(User(username=f"person{i}", email=email, password="!"))
+            if len(batch) == 5000:
+                User.objects.bulk_create(batch)
+                batch = []
+        User.objects.bulk_create(batch)
+        self.stdout.write(f"  done in {time.perf_counter() - started:.1f}s")
+
+        rng = random.Random(7)
+        idents = [f"PERSON{rng.randrange(n_users)}@example.com" for _ in range(n_lookups)]
+        idents += ["nobody@example.com"] * (n_lookups // 10)  # failed logins pay the most
+
+        def iexact(ident):
+            return User.objects.filter(email__iexact=ident).order_by("pk").first()
+
+        rows = []
+        with connection.schema_editor() as editor:
+            editor.remove_index(User, INDEX)
+        rows.append(("iexact", *self._time(iexact, idents)))
+        rows.append(("lower", *self._time(find_user_by_email, idents)))
+        with connection.schema_editor() as editor:
+            editor.add_index(User, INDEX)
+        rows.append(("lower+idx", *self._time(find_user_by_email, idents)))
+
+        self.stdout.write(f"\n{len(idents)} lookups against {n_users} users")
+        self.stdout.write(f"{'path':<10} {'mean ms':>9} {'p95 ms':>9}")
+        for name, mean, p95 in rows:
+            self.stdout.write(f"{name:<10} {mean:>9.3f} {p95:>9.3f}")
+
+        qs = User.objects.annotate(email_lower=Lower("email")).filter(email_lower="person1@example.com")
+        self.stdout.write("\nplan (lower+idx): " + qs.explain())
+
+    def _time(self, fn, idents):
+        fn(idents[0])  # warm
+        samples = []
+        for ident in idents:
+            t0 = time.perf_counter()
+            fn(ident)
+            samples.append((time.perf_counter() - t0) * 1000)
+        samples.sort()
+        return sum(samples) / len(samples), samples[int(len(samples) * 0.95) - 1]
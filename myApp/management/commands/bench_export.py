@@ -0,0 +1,113 @@
+# myApp/management/commands/bench_export.py
+"""
+Memory of the facilitator export (myApp/exports.py) against the old way of
+loading every row first, on a throwaway test database.
+
+    python manage.py bench_export --visions 50000 --images 300
+
+Seeds --visions visions for --visions/100 attendees. Then, for each path:
+- "buffered": the old script: list() of the model instances, rendered to
+  one CSV string
+- csv / jsonl: the streamed export, chunks discarded as a response would
+- zip: profiles + visions + --images images of --image-kb each, served
+  by the local stub (myApp/stubs.py) and copied through in chunks
+For each one it reports the tracemalloc peak and how much the process RSS grew.
+"""
+import csv
+import io
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from myApp import exports
+from myApp.models import Profile, Vision
+from myApp.stubs import StubServer
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmRSS:")) / 1024
+    except (OSError, StopIteration):
+        return 0.0
+
+
+def _buffered_csv():
+    rows = list(Vision.objects.select_related("user").order_by("pk"))
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([name for name, _ in exports.VISION_COLUMNS])
+    for v in rows:
+        writer.writerow([v.pk, v.user_id, v.user.username, v.user.email, v.status, v.prompt,
+                         (v.meta or {}).get("image_url"), v.image, (v.meta or {}).get("size"),
+                         v.created_at.isoformat(), v.finished_at, v.error])
+    return [buf.getvalue().encode()]
+
+
+class Command(BaseCommand):
+    help = "Compare memory of streamed exports with loading all rows first."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--visions", type=int, default=50_000)
+        parser.add_argument("--images", type=int, default=300, help="Visions in the zip that have an image.")
+        parser.add_argument("--image-kb", type=int, default=512)
+
+    def handle(self, *args, **opts):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            with StubServer(latency=0, image_kb=opts["image_kb"]) as stub:
+                self._seed(opts, stub)
+                # buffered last: once its heap has grown, the RSS column would hide the others' growth
+                results = [
+                    self._measure("csv", lambda: exports.stream("visions", "csv")[2]),
+                    self._measure("jsonl", lambda: exports.stream("visions", "jsonl")[2]),
+                    self._measure("zip", lambda: exports.stream("visions", "zip")[2]),
+                    self._measure("buffered", _buffered_csv),
+                ]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(f"\n{opts['visions']} visions, zip with {opts['images']} × {opts['image_kb']} KB images")
+        self.stdout.write(f"{'path':<9} {'output MB':>9} {'peak MB':>8} {'RSS +MB':>8} {'seconds':>8}")
+        for name, size, peak, rss, seconds in results:
+            self.stdout.write(f"{name:<9} {size / 1e6:>9.1f} {peak:>8.1f} {rss:>8.1f} {seconds:>8.2f}")
+
+    def _seed(self, opts, stub):
+        User = get_user_model()
+        attendees = max(1, opts["visions"] // 100)
+        users = User.objects.bulk_create(
+            [User(username=f"att{i}", email=f"att{i}@example.com", password="!") for i in range(attendees)]
+        )
+        Profile.objects.bulk_create([Profile(user=u, region="asia", onboarded=True) for u in users])
+        batch = []
+        for i in range(opts["visions"]):
+            with_image = i < opts["images"]
+            batch.append(Vision(
+                user=users[i % attendees], status=Vision.DONE,
+                prompt=f"My vision {i}: a calm studio by the sea, warm light, plants, a desk facing the water",
+                image=f"psi-vision/bench-{i}" if with_image else None,
+                meta={"image_url": f"{stub.url}/image/upload/v1/psi-vision/bench-{i}.png" if with_image else None,
+                      "size": "1024x1024", "background": None},
+            ))
+            if len(batch) == 5000:
+                Vision.objects.bulk_create(batch)
+                batch = []
+        Vision.objects.bulk_create(batch)
+        self.stdout.write(f"seeded {attendees} attendees, {opts['visions']} visions")
+
+    def _measure(self, name, make_chunks):
+        rss0 = _rss_mb()
+        tracemalloc.start()
+        started = time.perf_counter()
+        size = 0
+        for chunk in make_chunks():
+            size += len(chunk)
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+        self.stdout.write(f"{name}: done")
+        return name, size, peak, _rss_mb() - rss0, seconds
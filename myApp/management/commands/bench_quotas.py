@@ -0,0 +1,94 @@
+# myApp/management/commands/bench_quotas.py
+"""
+Cost of the quota check on the hot path, under contention.
+
+--threads threads hammer one user's bucket and the global bucket at the
+same time (the worst case: every check contends on the same keys), through
+whatever CACHES["default"] is configured. Reports per-check latency and
+checks that exactly `limit` requests got through, i.e. incr stayed atomic.
+
+On a box with fewer cores than threads the tail is GIL/CPU scheduling
+(threads waiting for their turn), not the check; compare with --threads 1.
+
+Also times the same check from an async view's point of view: called
+directly (what quotas.limited does) vs. through a sync_to_async hop.
+
+    python manage.py bench_quotas --threads 16 --checks 5000
+"""
+import asyncio
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache, caches
+from django.core.management.base import BaseCommand
+
+from myApp import quotas
+
+
+def _summary(samples):
+    samples.sort()
+    n = len(samples)
+    return samples[n // 2], samples[int(n * 0.99) - 1], samples[-1]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the rate-limit check (myApp/quotas.py) under thread contention."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--checks", type=int, default=5000, help="Checks per thread.")
+
+    def handle(self, *args, **opts):
+        threads, checks = opts["threads"], opts["checks"]
+        total = threads * checks
+        user_rate = (total // 2, 3600)      # half the checks should be refused
+        global_rate = (total * 10, 3600)    # never the limiting one
+        now = 3600.0 * 1000                 # fixed window, away from any real keys
+        cache.delete_many([f"rl:bench:u1:{int(now // 3600)}", f"rl:bench:all:{int(now // 3600)}"])
+
+        samples, admitted = [], [0]
+        mu = threading.Lock()
+        start = threading.Barrier(threads)
+
+        def worker():
+            mine, ok = [], 0
+            start.wait()
+            for _ in range(checks):
+                t0 = time.perf_counter()
+                if not quotas.hit("bench", "u1", user_rate, now) and not quotas.hit("bench", "all", global_rate, now):
+                    ok += 1
+                mine.append((time.perf_counter() - t0) * 1e6)
+            with mu:
+                samples.extend(mine)
+                admitted[0] += ok
+
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        started = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        wall = time.perf_counter() - started
+
+        p50, p99, worst = _summary(samples)
+        self.stdout.write(f"{total} checks (2 buckets each) on {threads} threads, cache: {type(caches['default']).__name__}")
+        self.stdout.write(f"  {total / wall:,.0f} checks/s   p50 {p50:.1f} µs   p99 {p99:.1f} µs   max {worst:.0f} µs")
+        verdict = "ok" if admitted[0] == user_rate[0] else "OVER/UNDER-ADMITTED"
+        self.stdout.write(f"  admitted {admitted[0]} of limit {user_rate[0]} ({verdict})")
+
+        direct, hopped = asyncio.run(self._async_paths(min(checks, 2000)))
+        self.stdout.write(f"from async code: direct p50 {direct:.1f} µs, via sync_to_async p50 {hopped:.1f} µs")
+
+    async def _async_paths(self, n):
+        rate = (n * 10, 3600)
+        hop = sync_to_async(quotas.hit)
+        direct, hopped = [], []
+        for i in range(n):
+            t0 = time.perf_counter()
+            quotas.hit("bench-async", "u1", rate)
+            direct.append((time.perf_counter() - t0) * 1e6)
+            t0 = time.perf_counter()
+            await hop("bench-async", "u2", rate)
+            hopped.append((time.perf_counter() - t0) * 1e6)
+        return _summary(direct)[0], _summary(hopped)[0]
@@ -0,0 +1,65 @@
+# myApp/management/commands/bench_upload_memory.py
+"""
+Peak Python memory of the image fetch + upload step, old path vs streaming.
+
+Both run against the local stubs (myApp/stubs.py) with a --image-kb PNG,
+--concurrency jobs at a time, while tracemalloc records the peak:
+
+  buffered   - images.generate() -> b64_json str -> b64decode() -> upload(bytes)
+               (the pre-streaming code)
+  streaming  - jobs.render_vision(): decode-as-you-read into a spooled file,
+               chunked upload
+
+    python manage.py bench_upload_memory --image-kb 3072 --concurrency 8
+"""
+import base64
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from cloudinary.uploader import upload as cloudinary_upload
+from django.core.management.base import BaseCommand
+
+from myApp import clients, jobs
+from myApp.stubs import StubServer, use_stubs
+
+
+def _buffered(prompt):
+    resp = clients.openai().images.generate(model=jobs.IMAGE_MODEL, prompt=prompt, size="1536x1024", n=1)
+    raw = base64.b64decode(resp.data[0].b64_json)
+    return cloudinary_upload(raw, folder="psi-vision", resource_type="image", format="png")
+
+
+def _streaming(prompt):
+    return jobs.render_vision(prompt, "1536x1024", None)[0]
+
+
+class Command(BaseCommand):
+    help = "Compare peak memory of buffered vs streaming image upload against local stubs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--image-kb", type=int, default=3072, help="Decoded PNG size (1536x1024 is ~3 MB).")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--jobs", type=int, default=16)
+
+    def handle(self, *args, **opts):
+        with StubServer(latency=0.05, image_kb=opts["image_kb"]) as stub, use_stubs(stub):
+            rows = [(name, *self._measure(fn, opts)) for name, fn in (("buffered", _buffered), ("streaming", _streaming))]
+
+        mb = opts["image_kb"] / 1024
+        self.stdout.write(f"\n{opts['jobs']} jobs, {opts['concurrency']} at a time, {mb:.1f} MB images")
+        self.stdout.write(f"{'path':<10} {'peak MB':>9} {'per job':>9} {'seconds':>8}")
+        for name, peak, secs in rows:
+            self.stdout.write(f"{name:<10} {peak:>9.1f} {peak / opts['concurrency']:>9.1f} {secs:>8.2f}")
+
+    def _measure(self, fn, opts):
+        fn("warm-up")  # imports, connection pools
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=opts["concurrency"]) as pool:
+            list(pool.map(fn, [f"bench {i}" for i in range(opts["jobs"])]))
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak / 1024 / 1024, elapsed
@@ -0,0 +1,55 @@
+# myApp/management/commands/export_event.py
+"""
+Facilitator export from the shell, streamed like /export/ (myApp/exports.py).
+
+    python manage.py export_event visions --since 2026-10-01 --until 2026-10-02 -o visions.csv
+    python manage.py export_event profiles --format jsonl > profiles.jsonl
+    python manage.py export_event --format zip -o event.zip     # both tables + images
+"""
+import argparse
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from myApp import exports
+
+
+def _date(raw):
+    try:
+        value = parse_date(raw)
+    except ValueError:
+        value = None
+    if value is None:
+        raise argparse.ArgumentTypeError(f"not a date (YYYY-MM-DD): {raw}")
+    return value
+
+
+class Command(BaseCommand):
+    help = "Stream visions / profiles as CSV, JSONL or a ZIP with the images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("what", nargs="?", default="visions", choices=sorted(exports.KINDS))
+        parser.add_argument("--format", default="csv", choices=sorted(exports.FORMATS))
+        parser.add_argument("--since", type=_date)
+        parser.add_argument("--until", type=_date)
+        parser.add_argument("--no-images", action="store_true", help="zip: leave the images out.")
+        parser.add_argument("-o", "--output", help="File to write; default stdout.")
+
+    def handle(self, *args, **opts):
+        _, _, chunks = exports.stream(opts["what"], opts["format"], since=opts["since"],
+                                      until=opts["until"], images=not opts["no_images"])
+        out = open(opts["output"], "wb") if opts["output"] else sys.stdout.buffer
+        started, size = time.perf_counter(), 0
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+                size += len(chunk)
+        finally:
+            if opts["output"]:
+                out.close()
+            else:
+                out.flush()
+        if opts["output"]:
+            self.stderr.write(f"Wrote {size / 1e6:.1f} MB to {opts['output']} in {time.perf_counter() - started:.1f}s.")
@@ -0,0 +1,63 @@
+# myApp/management/commands/import_attendees.py
+import csv
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myApp.utils.accounts import import_attendees, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Create attendee accounts from a CSV (with header) or JSONL file. Columns: "
+        "username, email, password, first_name, last_name, age_group, gender, region "
+        "(all optional except username or email). Existing usernames/emails are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file, or - for stdin.")
+        parser.add_argument("--format", choices=["csv", "jsonl"], default=None,
+                            help="Input format (default: from the file extension, else csv).")
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--hash-workers", type=int, default=None,
+                            help="Processes for password hashing (default: CPU count; 1 = no pool).")
+        parser.add_argument("--temp-passwords", metavar="OUT_CSV", default=None,
+                            help="Give rows without a password a random one and write username,password here. "
+                                 "Without it those accounts get an unusable password (send the password-set email).")
+        parser.add_argument("--dry-run", action="store_true", help="Validate and count without writing.")
+
+    def handle(self, *args, **opts):
+        def progress(stats):
+            self.stdout.write(
+                f"  {stats['rows']} rows: {stats['created']} created, {stats['skipped']} skipped "
+                f"({stats['rows_per_sec']} rows/s)"
+            )
+
+        path = opts["path"]
+        try:
+            fileobj = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8-sig")
+        except OSError as e:
+            raise CommandError(e)
+        with fileobj:
+            stats = import_attendees(
+                read_rows(fileobj, fmt=opts["format"], name=path),
+                chunk_size=opts["chunk_size"],
+                hash_workers=opts["hash_workers"] or os.cpu_count() or 2,  # a CLI run can fork safely
+                temp_passwords=bool(opts["temp_passwords"]),
+                on_chunk=progress,
+                dry_run=opts["dry_run"],
+            )
+
+        if opts["temp_passwords"] and stats["credentials"]:
+            with open(opts["temp_passwords"], "w", newline="") as out:
+                writer = csv.writer(out)
+                writer.writerow(["username", "password"])
+                writer.writerows(stats["credentials"])
+            self.stdout.write(f"Temporary passwords written to {opts['temp_passwords']} — delete it after use.")
+
+        verb = "Would create" if opts["dry_run"] else "Created"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats['created']} of {stats['rows']} rows ({stats['skipped']} duplicates, "
+            f"{stats['invalid']} invalid) in {stats['seconds']}s — {stats['rows_per_sec']} rows/s."
+        ))
@@ -0,0 +1,281 @@
+# myApp/management/commands/loadtest.py
+"""
+Offline load test: the real URL stack against local OpenAI/Cloudinary stubs.
+
+Runs on a throwaway test database, in-process on one event loop (the ASGI
+model, as with uvicorn). Each endpoint is driven in turn at --concurrency
+until --requests have finished:
+
+  login          POST /login/                 fresh session, real password check
+  workshop       GET  /workshop/
+  profile_get    GET  /api/profile/
+  profile_save   POST /api/profile/save/
+  chat           POST /chat-ai/               unique message per request
+  chat_stream    POST /chat-ai/?stream=1      timed to the last byte; an "error"
+                                              event or no "done" counts as an error
+  vision         POST /generate-vision/       enqueue only; jobs reported below
+
+Prints requests/sec and p50/p95/p99 per endpoint. After the vision phase it
+waits for the queued jobs and reports their end-to-end time, then how many
+upstream connections served those calls (myApp/clients.py). --json saves
+the numbers as a regression baseline; --compare prints the change against
+a saved one.
+
+    python manage.py loadtest --concurrency 20 --requests 200 --latency 0.5
+    python manage.py loadtest --only chat,vision --json baseline.json
+    python manage.py loadtest --only chat,workshop --slow-rate 0.3   # degraded upstream
+"""
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import AsyncClient
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from myApp import clients
+from myApp.models import Profile, Vision
+from myApp.stubs import StubServer, use_stubs
+
+PASSWORD = "loadtest-password"
+ENDPOINTS = ("login", "workshop", "profile_get", "profile_save", "chat", "chat_stream", "vision")
+
+
+def sse_events(body):
+    """Event names of the frames in an SSE body ("message" for frames without one)."""
+    events = []
+    for frame in body.decode("utf-8", "replace").split("\n\n"):
+        if not frame.strip():
+            continue
+        names = [line[len("event:"):].strip() for line in frame.splitlines() if line.startswith("event:")]
+        events.append(names[-1] if names else "message")
+    return events
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    k = (len(sorted_samples) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+
+class Command(BaseCommand):
+    help = "Load-test the main endpoints against local OpenAI/Cloudinary stubs; report p50/p95/p99 and req/s."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint.")
+        parser.add_argument("--only", default=",".join(ENDPOINTS), help="Comma-separated subset of: " + ", ".join(ENDPOINTS))
+        parser.add_argument("--latency", type=float, default=0.5, help="Stub seconds per upstream call.")
+        parser.add_argument("--jitter", type=float, default=0.1)
+        parser.add_argument("--chat-tokens", type=int, default=60)
+        parser.add_argument("--image-kb", type=int, default=512)
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of OpenAI calls the stub fails.")
+        parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of OpenAI calls the stub stalls.")
+        parser.add_argument("--slow-latency", type=float, default=30.0, help="Seconds a stalled call takes.")
+        parser.add_argument("--job-timeout", type=float, default=300, help="Max seconds to wait for vision jobs.")
+        parser.add_argument("--json", dest="json_out", default=None, help="Write results to this file.")
+        parser.add_argument("--compare", default=None, help="Baseline JSON from an earlier --json run.")
+
+    def handle(self, *args, **opts):
+        only = [e.strip() for e in opts["only"].split(",") if e.strip()]
+        unknown = set(only) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoint(s): {', '.join(sorted(unknown))}")
+
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        tmpdir = None
+        if connection.vendor == "sqlite":
+            # a file, not shared-cache memory: closer to production locking, and job threads can see it
+            tmpdir = tempfile.mkdtemp(prefix="psi-loadtest-")
+            connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(tmpdir, "loadtest.sqlite3")
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        quiet = {**getattr(settings, "METRICS", {}), "SLOW_REQUEST_MS": 0}  # every login would be "slow"
+        unlimited = {**getattr(settings, "QUOTAS", {}), "ENABLED": False}  # we're measuring the app, not the limiter
+        try:
+            stub = StubServer(latency=opts["latency"], jitter=opts["jitter"],
+                              chat_tokens=opts["chat_tokens"], image_kb=opts["image_kb"],
+                              error_rate=opts["error_rate"], slow_rate=opts["slow_rate"],
+                              slow_latency=opts["slow_latency"])
+            with stub, use_stubs(stub), override_settings(METRICS=quiet, QUOTAS=unlimited):
+                results = self._run(only, opts, stub)
+        finally:
+            close_old_connections()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if tmpdir:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+
+        self._report(results, opts)
+
+    # ---------- driving ----------
+
+    def _run(self, only, opts, stub):
+        users = self._seed(opts["concurrency"])
+        self.stdout.write(
+            f"{opts['requests']} requests/endpoint at concurrency {opts['concurrency']}; "
+            f"stub latency {opts['latency']}s ±{opts['jitter']}s\n"
+        )
+        results = asyncio.run(self._drive_all(only, users, opts))  # one loop: the OpenAI client is bound to it
+        if "vision" in only:
+            results["vision_jobs"] = self._wait_for_jobs(opts["job_timeout"])
+        results["_stub_calls"] = dict(stub.calls)
+        results["_upstream"] = clients.stats()
+        return results
+
+    def _seed(self, n):
+        User = get_user_model()
+        hashed = make_password(PASSWORD)  # one hash, shared: seeding shouldn't take minutes
+        users = User.objects.bulk_create([
+            User(username=f"load{i}", email=f"load{i}@example.com", password=hashed) for i in range(n)
+        ])
+        Profile.objects.bulk_create([Profile(user=u, onboarded=True) for u in users])
+        return users
+
+    async def _drive_all(self, only, users, opts):
+        results = {}
+        for name in only:
+            results[name] = await self._drive(name, users, opts)
+            self.stdout.write(f"  {name:<13} done ({results[name]['rps']:.1f} req/s)")
+        return results
+
+    async def _drive(self, name, users, opts):
+        clients = asyncio.Queue()
+        for user in users:
+            client = AsyncClient()
+            if name != "login":
+                await client.aforce_login(user)
+            await clients.put((client, user))
+
+        counter = iter(range(opts["requests"]))
+        samples, errors = [], {}
+
+        async def worker():
+            for i in counter:
+                client, user = await clients.get()
+                try:
+                    t0 = time.perf_counter()
+                    outcome = await self._request(name, client, user, i)
+                    samples.append((time.perf_counter() - t0) * 1000)
+                    if isinstance(outcome, str) or outcome >= 400:
+                        errors[outcome] = errors.get(outcome, 0) + 1
+                except Exception as e:  # count it, keep the run going
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                finally:
+                    if name == "login":
+                        client = AsyncClient()  # next login starts without a session
+                    await clients.put((client, user))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(opts["concurrency"])))
+        wall = time.perf_counter() - started
+        samples.sort()
+        return {
+            "requests": len(samples),
+            "errors": errors,
+            "seconds": round(wall, 3),
+            "rps": len(samples) / wall if wall else 0.0,
+            "p50": percentile(samples, 50),
+            "p95": percentile(samples, 95),
+            "p99": percentile(samples, 99),
+        }
+
+    async def _request(self, name, client, user, i):
+        """The status code, or for a stream that fails inside its 200 an error label."""
+        if name == "login":
+            resp = await client.post("/login/", {"username": user.username, "password": PASSWORD})
+        elif name == "workshop":
+            resp = await client.get("/workshop/")
+        elif name == "profile_get":
+            resp = await client.get("/api/profile/")
+        elif name == "profile_save":
+            resp = await client.post("/api/profile/save/", json.dumps({"region": "europe", "style_keywords": f"run {i}"}),
+                                     content_type="application/json")
+        elif name == "chat":
+            resp = await client.post("/chat-ai/", json.dumps({"message": f"Load test question {i}"}),
+                                     content_type="application/json")
+        elif name == "chat_stream":
+            resp = await client.post("/chat-ai/?stream=1", json.dumps({"message": f"Load test stream {i}"}),
+                                     content_type="application/json")
+            body = b"".join([chunk async for chunk in resp.streaming_content])
+            if resp.status_code == 200:
+                # upstream failures arrive as "event: error" inside a 200
+                events = sse_events(body)
+                if "error" in events:
+                    return "stream error"
+                if "done" not in events:
+                    return "stream incomplete"
+        else:  # vision
+            resp = await client.post("/generate-vision/", json.dumps({"vision": f"A lighthouse at dusk, take {i}"}),
+                                     content_type="application/json")
+        return resp.status_code
+
+    def _wait_for_jobs(self, timeout):
+        started = time.perf_counter()
+        pending = Vision.objects.filter(status__in=[Vision.QUEUED, Vision.RUNNING])
+        while pending.exists() and time.perf_counter() - started < timeout:
+            time.sleep(0.2)
+        done = list(Vision.objects.filter(status=Vision.DONE).values_list("meta", flat=True))
+        totals = sorted((m.get("latency_ms") or {}).get("total_ms") or 0 for m in done)
+        return {
+            "done": len(done),
+            "failed": Vision.objects.filter(status=Vision.FAILED).count(),
+            "pending": pending.count(),
+            "p50": percentile(totals, 50),
+            "p95": percentile(totals, 95),
+            "p99": percentile(totals, 99),
+        }
+
+    # ---------- output ----------
+
+    def _report(self, results, opts):
+        baseline = None
+        if opts["compare"]:
+            with open(opts["compare"]) as f:
+                baseline = json.load(f)
+
+        self.stdout.write(f"\n{'endpoint':<13} {'reqs':>6} {'errs':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name in ENDPOINTS:
+            row = results.get(name)
+            if row is None:
+                continue
+            errs = sum(row["errors"].values())
+            line = (f"{name:<13} {row['requests']:>6} {errs:>5} {row['rps']:>8.1f} "
+                    f"{row['p50']:>9.1f} {row['p95']:>9.1f} {row['p99']:>9.1f}")
+            old = (baseline or {}).get(name)
+            if old:
+                line += f"   p95 {self._delta(row['p95'], old['p95'])}, req/s {self._delta(row['rps'], old['rps'])}"
+            self.stdout.write(line)
+            if row["errors"]:
+                self.stdout.write(f"{'':<13} errors: {row['errors']}")
+
+        jobs = results.get("vision_jobs")
+        if jobs:
+            self.stdout.write(
+                f"\nvision jobs: {jobs['done']} done, {jobs['failed']} failed, {jobs['pending']} pending; "
+                f"enqueue→done p50 {jobs['p50']:.0f} ms, p95 {jobs['p95']:.0f} ms, p99 {jobs['p99']:.0f} ms"
+            )
+        self.stdout.write(f"stub calls: {results.get('_stub_calls')}")
+        for name, row in (results.get("_upstream") or {}).items():
+            self.stdout.write(f"upstream {name}: {row['requests']} requests over {row['connections']} connections "
+                              f"({row['reuse']:.0%} reused)")
+
+        if opts["json_out"]:
+            with open(opts["json_out"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Saved {opts['json_out']}")
+
+    def _delta(self, new, old):
+        if not old:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.0f}%"
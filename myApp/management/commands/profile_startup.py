@@ -0,0 +1,46 @@
+# myApp/management/commands/profile_startup.py
+"""
+What a worker pays before serving its first request (myApp/startup.py).
+
+    python manage.py profile_startup            # time, memory, slowest imports
+    python manage.py profile_startup --top 40 --runs 5
+
+Time is the best of --runs fresh boots; the import table comes from one
+`python -X importtime` run (which adds its own overhead). Exits non-zero
+when over settings.STARTUP's budgets, so it can gate a deploy.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from myApp import startup
+
+
+class Command(BaseCommand):
+    help = "Profile django.setup() + URLconf loading in a fresh interpreter."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20, help="Rows in each import table.")
+        parser.add_argument("--runs", type=int, default=3, help="Boots to time; the best one counts.")
+
+    def handle(self, *args, **opts):
+        runs = [startup.measure() for _ in range(max(1, opts["runs"]))]
+        best = min(runs, key=lambda r: r["seconds"])
+        profiled = startup.measure(importtime=True)
+        rows = profiled["imports"]
+
+        self.stdout.write(f"boot: {best['seconds'] * 1000:.0f} ms (best of {len(runs)}), "
+                          f"+{best['memory_mb']:.1f} MB RSS")
+        self.stdout.write(f"budget: {startup.conf('TIME_BUDGET')} s, {startup.conf('MEMORY_BUDGET_MB')} MB; "
+                          f"lazy: {', '.join(startup.conf('LAZY_MODULES'))}")
+
+        self.stdout.write("\nTop-level imports by cumulative time (-X importtime):")
+        for row in sorted((r for r in rows if r["depth"] == 0), key=lambda r: -r["cumulative_ms"])[:opts["top"]]:
+            self.stdout.write(f"  {row['cumulative_ms']:>8.1f} ms  {row['module']}")
+
+        self.stdout.write("\nSlowest modules by own time:")
+        for row in sorted(rows, key=lambda r: -r["self_ms"])[:opts["top"]]:
+            self.stdout.write(f"  {row['self_ms']:>8.1f} ms  {row['module']}")
+
+        problems = startup.over_budget(best)
+        if problems:
+            raise CommandError("Over the startup budget: " + "; ".join(problems))
+        self.stdout.write(self.style.SUCCESS("\nWithin the startup budget."))
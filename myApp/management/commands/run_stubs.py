@@ -0,0 +1,36 @@
+# myApp/management/commands/run_stubs.py
+from django.core.management.base import BaseCommand
+
+from myApp.stubs import StubServer
+
+
+class Command(BaseCommand):
+    help = "Serve local OpenAI/Cloudinary stand-ins (myApp/stubs.py) for load-testing a running server."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency", type=float, default=0.5, help="Seconds per upstream call.")
+        parser.add_argument("--jitter", type=float, default=0.0, help="± seconds of random latency.")
+        parser.add_argument("--chat-tokens", type=int, default=60, help="Words per chat reply.")
+        parser.add_argument("--image-kb", type=int, default=1024, help="Size of each generated image.")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of OpenAI calls that fail.")
+        parser.add_argument("--error-status", type=int, default=500, help="Status for those failures (e.g. 429, 503).")
+        parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of OpenAI calls that hang.")
+        parser.add_argument("--slow-latency", type=float, default=10.0, help="Extra seconds for a slow call.")
+
+    def handle(self, *args, **opts):
+        stub = StubServer(opts["host"], opts["port"], latency=opts["latency"], jitter=opts["jitter"],
+                          chat_tokens=opts["chat_tokens"], image_kb=opts["image_kb"],
+                          error_rate=opts["error_rate"], error_status=opts["error_status"],
+                          slow_rate=opts["slow_rate"], slow_latency=opts["slow_latency"])
+        self.stdout.write("Stubs listening. Start the app with:\n")
+        self.stdout.write(f"  OPENAI_API_KEY=stub OPENAI_BASE_URL={stub.openai_base_url} \\")
+        self.stdout.write(f"  CLOUDINARY_URL='{stub.cloudinary_url}' \\")
+        self.stdout.write("  uvicorn myProject.asgi:application\n")
+        try:
+            stub.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping.")
+        finally:
+            stub.stop()
@@ -0,0 +1,28 @@
+# myApp/management/commands/run_vision_workers.py
+from django.core.management.base import BaseCommand
+
+from myApp import jobs
+
+
+class Command(BaseCommand):
+    help = "Run image-generation workers against the Vision job queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=None,
+                            help="Jobs in flight in this process (default: VISION_JOBS['CONCURRENCY']).")
+        parser.add_argument("--poll-interval", type=float, default=None,
+                            help="Seconds between queue polls (default: VISION_JOBS['POLL_INTERVAL']).")
+        parser.add_argument("--once", action="store_true",
+                            help="Drain the queue once and exit instead of polling forever.")
+
+    def handle(self, *args, **opts):
+        if opts["once"]:
+            jobs.requeue_stale()
+            jobs.drain()
+            return
+        concurrency = opts["concurrency"] or jobs.conf("CONCURRENCY")
+        self.stdout.write(f"Vision workers: concurrency={concurrency}. Ctrl+C to stop.")
+        try:
+            jobs.run_workers(concurrency=concurrency, poll_interval=opts["poll_interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping.")
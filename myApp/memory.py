@@ -0,0 +1,140 @@
+# myApp/memory.py
+"""
+Per-user chat memory with token-budgeted context assembly.
+
+Each turn sends: system prompt + rolling summary + as many recent turns as fit
+in CHAT_MEMORY["CONTEXT_TOKENS"] + the new message. Once the turns not yet in
+the summary exceed SUMMARIZE_AT tokens, the oldest ones are folded into the
+summary (one small gpt-4o-mini call), keeping KEEP_RECENT tokens verbatim.
+Prompt size per turn is therefore bounded no matter how long the chat gets.
+"""
+import re
+
+from django.conf import settings
+
+from . import resilience
+from .metrics import timer
+from .models import ChatMessage, Conversation
+
+DEFAULTS = {
+    "CONTEXT_TOKENS": 1200,   # budget for recent turns sent verbatim
+    "SUMMARIZE_AT": 1600,     # unsummarized tokens that trigger a fold
+    "KEEP_RECENT": 600,       # tokens left verbatim after a fold
+    "SUMMARY_TOKENS": 250,    # max length of the rolling summary
+}
+
+MESSAGE_OVERHEAD = 4  # role/format tokens the chat API adds per message
+
+SUMMARY_PROMPT = (
+    "Update the running summary of a coaching conversation. Keep names, goals, "
+    "preferences and decisions; drop small talk. Reply with the summary only."
+)
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def conf(key):
+    return getattr(settings, "CHAT_MEMORY", {}).get(key, DEFAULTS[key])
+
+
+def estimate_tokens(text):
+    """
+    Local stand-in for the model tokenizer: one token per word or punctuation
+    mark, plus one per extra 4 chars of long words. Close enough to the real
+    BPE count on English chat for budgeting, without a tokenizer dependency.
+    """
+    n = 0
+    for tok in _TOKEN_RE.findall(text or ""):
+        n += 1 + (len(tok) - 1) // 4 if len(tok) > 4 else 1
+    return n + MESSAGE_OVERHEAD
+
+
+async def aget_conversation(user):
+    conversation, _ = await Conversation.objects.aget_or_create(user=user)
+    return conversation
+
+
+MAX_RECENT = 200  # hard cap in case summarizing falls behind
+
+
+async def _recent(conversation):
+    """Unsummarized turns, oldest first (normally bounded by SUMMARIZE_AT)."""
+    qs = conversation.messages.filter(id__gt=conversation.summarized_through).order_by("-id")[:MAX_RECENT]
+    rows = [m async for m in qs.only("id", "role", "content", "tokens")]
+    rows.reverse()
+    return rows
+
+
+async def abuild_context(conversation, system_prompt, user_message):
+    messages = [{"role": "system", "content": system_prompt}]
+    if conversation.summary:
+        messages.append({"role": "system", "content": f"Conversation so far: {conversation.summary}"})
+
+    budget = conf("CONTEXT_TOKENS")
+    picked = []
+    for m in reversed(await _recent(conversation)):
+        if m.tokens > budget:
+            break
+        budget -= m.tokens
+        picked.append({"role": m.role, "content": m.content})
+    picked.reverse()
+
+    return messages + picked + [{"role": "user", "content": user_message}]
+
+
+async def arecord_turn(conversation, user_message, reply):
+    last = [m async for m in conversation.messages.order_by("-id").values_list("content", flat=True)[:2]]
+    if last == [reply, user_message]:
+        return  # same turn already recorded (double-submit coalesced onto one reply)
+    await ChatMessage.objects.abulk_create([
+        ChatMessage(conversation=conversation, role="user", content=user_message,
+                    tokens=estimate_tokens(user_message)),
+        ChatMessage(conversation=conversation, role="assistant", content=reply,
+                    tokens=estimate_tokens(reply)),
+    ])
+    await conversation.asave(update_fields=["updated_at"])
+
+
+async def amaybe_summarize(conversation, client, model):
+    """Fold the oldest unsummarized turns into the summary once over SUMMARIZE_AT."""
+    recent = await _recent(conversation)
+    total = sum(m.tokens for m in recent)
+    if total <= conf("SUMMARIZE_AT"):
+        return False
+
+    # keep the newest KEEP_RECENT tokens verbatim; fold everything before them
+    keep = conf("KEEP_RECENT")
+    fold = []
+    for m in recent:
+        if total <= keep:
+            break
+        fold.append(m)
+        total -= m.tokens
+    if not fold:
+        return False
+
+    transcript = "\n".join(f"{m.role}: {m.content}" for m in fold)
+    budget = resilience.conf("SUMMARY_BUDGET")
+    with timer("openai_summary"):
+        response = await resilience.acall(
+            resilience.OPENAI_CHAT,
+            lambda timeout: client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": f"Summary so far:\n{conversation.summary or '(none)'}\n\nNew turns:\n{transcript}"},
+                ],
+                max_tokens=conf("SUMMARY_TOKENS"),
+                timeout=timeout,
+            ),
+            budget=budget,
+            attempt_timeout=budget,
+        )
+    conversation.summary = (response.choices[0].message.content or "").strip()
+    conversation.summarized_through = fold[-1].id
+    await conversation.asave(update_fields=["summary", "summarized_through", "updated_at"])
+    return True
+
+
+async def areset(user):
+    await Conversation.objects.filter(user=user).adelete()
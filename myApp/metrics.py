@@ -0,0 +1,228 @@
+# myApp/metrics.py
+"""
+In-process request/upstream metrics in Prometheus text format.
+
+- MetricsMiddleware times every request (histogram per URL name), counts its
+  DB queries and DB time, and logs slow requests with a per-phase breakdown.
+- `with timer("openai_chat"):` times one upstream phase. It feeds the
+  upstream histogram and, inside a request, that request's breakdown.
+- /metrics renders everything (views.metrics).
+
+No client library: a few histograms, counters and gauges guarded by one lock is all
+this needs. Numbers are per process, so scrape each worker (or run one).
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    "TOKEN": "",               # if set, /metrics wants "Authorization: Bearer <token>"
+    "SLOW_REQUEST_MS": 2000,   # 0 = don't log slow requests
+}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def conf(key):
+    return getattr(settings, "METRICS", {}).get(key, DEFAULTS[key])
+
+
+_lock = threading.Lock()
+_registry = []
+
+
+def _fmt_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1.0):
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_fmt_labels(self.labelnames, labels)} {value:g}"
+
+
+class Gauge:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def set(self, value, *labels):
+        with _lock:
+            self._values[labels] = float(value)
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_fmt_labels(self.labelnames, labels)} {value:g}"
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        with _lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in sorted(self._series.items()):
+            for bound, n in zip(self.buckets, series):
+                yield f"{self.name}_bucket{_fmt_labels(self.labelnames, labels, [('le', f'{bound:g}')])} {n}"
+            yield f"{self.name}_bucket{_fmt_labels(self.labelnames, labels, [('le', '+Inf')])} {series[-1]}"
+            yield f"{self.name}_sum{_fmt_labels(self.labelnames, labels)} {series[-2]:.6f}"
+            yield f"{self.name}_count{_fmt_labels(self.labelnames, labels)} {series[-1]}"
+
+
+def render():
+    with _lock:
+        lines = [line for metric in _registry for line in metric.collect()]
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram(
+    "psi_http_request_duration_seconds", "Request latency by URL name (to first byte for streams).",
+    ["view", "method", "status"],
+)
+UPSTREAM_SECONDS = Histogram(
+    "psi_upstream_duration_seconds", "Time in one upstream phase (OpenAI, base64 decode, Cloudinary, Resend).",
+    ["phase"],
+)
+UPSTREAM_ERRORS = Counter("psi_upstream_errors_total", "Upstream phases that raised.", ["phase"])
+DB_QUERIES = Histogram("psi_db_queries_per_request", "DB queries per request.", ["view"], buckets=COUNT_BUCKETS)
+DB_SECONDS = Histogram("psi_db_duration_seconds", "DB time per request.", ["view"])
+
+
+# ---------- per-request breakdown ----------
+
+# A mutable dict per request; sync_to_async copies the context into its
+# thread, so queries and timers there land in the same dict.
+_current = contextvars.ContextVar("psi_request_phases", default=None)
+
+
+@contextmanager
+def timer(phase):
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:  # not GeneratorExit/CancelledError: a client going away isn't an upstream error
+        UPSTREAM_ERRORS.inc(phase)
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        UPSTREAM_SECONDS.observe(elapsed, phase)
+        phases = _current.get()
+        if phases is not None:
+            phases[phase] = phases.get(phase, 0.0) + elapsed
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    phases = _current.get()
+    if phases is None:
+        return execute(sql, params, many, context)
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        phases["db"] = phases.get("db", 0.0) + (time.perf_counter() - t0)
+        phases["db_queries"] = phases.get("db_queries", 0) + 1
+
+
+def install_db_wrapper(sender, connection, **kwargs):
+    """connection_created receiver (apps.ready): count queries on every connection, any thread."""
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not conf("ENABLED"):
+            return self.get_response(request)
+        phases, token, t0 = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, phases, t0)
+        return response
+
+    async def __acall__(self, request):
+        if not conf("ENABLED"):
+            return await self.get_response(request)
+        phases, token, t0 = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, phases, t0)
+        return response
+
+    def _start(self):
+        phases = {}
+        return phases, _current.set(phases), time.perf_counter()
+
+    def _finish(self, request, response, phases, t0):
+        elapsed = time.perf_counter() - t0
+        match = getattr(request, "resolver_match", None)
+        view = (match.url_name or match.view_name) if match else "unmatched"
+        if view == "metrics":
+            return
+        REQUEST_SECONDS.observe(elapsed, view, request.method, str(response.status_code))
+        DB_QUERIES.observe(phases.get("db_queries", 0), view)
+        DB_SECONDS.observe(phases.get("db", 0.0), view)
+
+        slow_ms = conf("SLOW_REQUEST_MS")
+        if slow_ms and elapsed * 1000 >= slow_ms:
+            breakdown = " ".join(
+                f"{k}={v}" if k == "db_queries" else f"{k}={v * 1000:.0f}ms"
+                for k, v in sorted(phases.items())
+            )
+            log.warning("Slow request %s %s (%s) %.0fms %s", request.method, request.path, view,
+                        elapsed * 1000, breakdown or "-")
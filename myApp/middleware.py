@@ -0,0 +1,84 @@
+# myApp/middleware.py
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.middleware.gzip import GZipMiddleware as BaseGZipMiddleware
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+from . import profiles
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise 6.x is sync-only. Under ASGI one sync middleware forces Django to
+    run everything below it (including our async views) through the single
+    thread-sensitive executor, so requests are served one at a time. This
+    subclass keeps the same static-file behaviour but stays async end to end.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class GZipMiddleware(BaseGZipMiddleware):
+    """
+    Django's GZipMiddleware (with its BREACH padding), minus server-sent
+    events: the chat stream must reach the browser chunk by chunk, and
+    compressing a few bytes at a time gains nothing. ZIP exports are
+    compressed already.
+    """
+
+    SKIP = ("text/event-stream", "application/zip")
+
+    def process_response(self, request, response):
+        if response.get("Content-Type", "").startswith(self.SKIP):
+            return response
+        return super().process_response(request, response)
+
+
+class ProfileMiddleware(MiddlewareMixin):
+    """
+    request.profile (sync) / await request.aprofile() (async views): the
+    signed-in user's Profile from myApp/profiles.py, None for anonymous users.
+    Lazy, so requests that never look at the profile cost nothing.
+    Must come after AuthenticationMiddleware.
+    """
+
+    def process_request(self, request):
+        request.profile = SimpleLazyObject(lambda: _profile(request))
+        request.aprofile = partial(_aprofile, request)
+
+
+def _profile(request):
+    if not hasattr(request, "_cached_profile"):
+        user = request.user
+        request._cached_profile = profiles.get_profile(user) if user.is_authenticated else None
+    return request._cached_profile
+
+
+async def _aprofile(request):
+    if not hasattr(request, "_cached_profile"):
+        user = await request.auser()
+        request._cached_profile = await profiles.aget_profile(user) if user.is_authenticated else None
+    return request._cached_profile
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0003_vision_job_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vision',
+            index=models.Index(fields=['user', 'created_at'], name='vision_user_created_idx'),
+        ),
+    ]
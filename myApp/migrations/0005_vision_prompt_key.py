@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0004_vision_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vision',
+            name='prompt_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
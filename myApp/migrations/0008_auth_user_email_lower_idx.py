@@ -0,0 +1,35 @@
+# Functional index for case-insensitive email login (myApp/utils/accounts.py:find_user_by_email).
+# auth.User belongs to django.contrib.auth, so the index is created here
+# with the schema editor rather than declared in a Meta.
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+INDEX_NAME = "auth_user_email_lower_idx"
+
+
+def _index():
+    return models.Index(Lower("email"), name=INDEX_NAME)
+
+
+def add_index(apps, schema_editor):
+    if not schema_editor.connection.features.supports_expression_indexes:
+        return
+    schema_editor.add_index(apps.get_model("auth", "User"), _index())
+
+
+def remove_index(apps, schema_editor):
+    if not schema_editor.connection.features.supports_expression_indexes:
+        return
+    schema_editor.remove_index(apps.get_model("auth", "User"), _index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("myApp", "0007_mailjob"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0008_auth_user_email_lower_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='daily_image_quota',
+            field=models.PositiveIntegerField(blank=True, help_text='Images per day. Empty = site default.', null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='daily_token_quota',
+            field=models.PositiveIntegerField(blank=True, help_text='Chat tokens per day. Empty = site default.', null=True),
+        ),
+        migrations.CreateModel(
+            name='DailyUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('images', models.PositiveIntegerField(default=0)),
+                ('tokens', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='daily_usage_user_day_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0009_quotas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailjob',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
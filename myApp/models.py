@@ -3,6 +3,9 @@ from django.db import models
 from django.contrib.auth.models import User
 from cloudinary.models import CloudinaryField
 
+from . import variants
+
+
 class Profile(models.Model):
     AGE_GROUPS = [
         ("teen", "Teen"),
@@ -48,6 +51,10 @@ class Profile(models.Model):
     )
     onboarded = models.BooleanField(default=False)
 
+    # per-user daily limits (myApp/quotas.py); empty = the QUOTAS defaults
+    daily_image_quota = models.PositiveIntegerField(null=True, blank=True, help_text="Images per day. Empty = site default.")
+    daily_token_quota = models.PositiveIntegerField(null=True, blank=True, help_text="Chat tokens per day. Empty = site default.")
+
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -55,11 +62,110 @@ class Profile(models.Model):
 
 
 class Vision(models.Model):
+    # A Vision row doubles as its generation job (see myApp/jobs.py)
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="visions")
     prompt = models.TextField()
-    image = CloudinaryField("vision_image", folder="psi_vision/visions/")  # stores Cloudinary public_id
+    image = CloudinaryField("vision_image", folder="psi_vision/visions/", null=True, blank=True)  # Cloudinary public_id, set once done
     meta = models.JSONField(default=dict, blank=True)  # store size, background, tokens, etc.
     created_at = models.DateTimeField(auto_now_add=True)
+    prompt_key = models.CharField(max_length=64, blank=True, db_index=True)  # sha256 of prompt+size+background (myApp/vision_cache.py)
+
+    status = models.CharField(max_length=10, choices=STATUS, default=DONE)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="vision_status_created_idx"),
+            # per-user gallery, newest first (keyset pagination in api/visions/)
+            models.Index(fields=["user", "created_at"], name="vision_user_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.created_at.strftime('%Y-%m-%d')}"
+
+    def image_variants(self):
+        """Thumbnail/medium URLs and AVIF/WebP srcsets (myApp/variants.py); {} until the image exists."""
+        meta = self.meta or {}
+        return meta.get("variants") or variants.build(meta.get("image_url"))
+
+
+class Conversation(models.Model):
+    """Server-side chat memory: recent turns + a rolling summary of older ones."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="conversation")
+    summary = models.TextField(blank=True)
+    summarized_through = models.BigIntegerField(default=0)  # last ChatMessage.id folded into summary
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Conversation({self.user.username})"
+
+
+class ChatMessage(models.Model):
+    ROLES = [
+        ("user", "User"),
+        ("assistant", "Assistant"),
+    ]
+
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="messages")
+    role = models.CharField(max_length=10, choices=ROLES)
+    content = models.TextField()
+    tokens = models.PositiveIntegerField(default=0)  # local estimate, see myApp/memory.py
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.role}: {self.content[:40]}"
+
+
+class DailyUsage(models.Model):
+    """What a user spent on one day, checked against their daily quotas (myApp/quotas.py)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="daily_usage")
+    day = models.DateField()
+    images = models.PositiveIntegerField(default=0)
+    tokens = models.PositiveIntegerField(default=0)  # local estimate, see myApp/memory.py
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["user", "day"], name="daily_usage_user_day_uniq")]
+
+    def __str__(self):
+        return f"{self.user.username} {self.day}: {self.images} images, {self.tokens} tokens"
+
+
+class MailJob(models.Model):
+    """One bulk send from the admin (myApp/mailer.py); counters update as batches finish."""
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS = [
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    subject = models.CharField(max_length=200)
+    created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    status = models.CharField(max_length=10, choices=STATUS, default=RUNNING)
+    total = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)  # first few "email: reason" lines
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # bumped on every progress write; see mailer.fail_stale
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} ({self.sent}/{self.total})"
@@ -0,0 +1,71 @@
+# myApp/profiles.py
+"""
+Cached Profile lookup.
+
+Every page and API call used to run Profile.objects.get_or_create(user=...).
+Now the profile is read once, kept in the default cache under
+profile:<user_id>, and refreshed whenever a Profile is saved or deleted
+(signals.py). Queryset .update() skips signals, so call invalidate() after one.
+
+The signals only reach this process's cache. With per-process locmem, a save
+handled by another worker would go unseen for up to PROFILE_TTL, so there
+entries live LOCAL_TTL instead (and profile_version in conditional.py checks
+the row's updated_at).
+"""
+import copy
+
+from django.core.cache import cache
+
+from .checks import is_shared
+from .models import Profile
+
+PROFILE_TTL = 60 * 60  # the signals keep it fresh; the TTL only bounds memory
+LOCAL_TTL = 30         # per-process cache: bounds how stale another worker's save can look
+
+
+def ttl():
+    return PROFILE_TTL if is_shared("default") else LOCAL_TTL
+
+
+def cache_key(user_id):
+    return f"profile:{user_id}"
+
+
+def _snapshot(profile):
+    # don't pickle the related User into the cache; callers re-attach their own
+    snap = copy.copy(profile)
+    snap._state = copy.copy(profile._state)
+    snap._state.fields_cache = {}
+    return snap
+
+
+def store(profile):
+    cache.set(cache_key(profile.user_id), _snapshot(profile), ttl())
+
+
+def invalidate(user_id):
+    cache.delete(cache_key(user_id))
+
+
+def invalidate_many(user_ids):
+    cache.delete_many([cache_key(pk) for pk in user_ids])
+
+
+def get_profile(user):
+    profile = cache.get(cache_key(user.pk))
+    if profile is None:
+        profile, created = Profile.objects.get_or_create(user=user)
+        if not created:  # a create already went through the post_save write-through
+            store(profile)
+    profile.user = user
+    return profile
+
+
+async def aget_profile(user):
+    profile = await cache.aget(cache_key(user.pk))
+    if profile is None:
+        profile, created = await Profile.objects.aget_or_create(user=user)
+        if not created:
+            await cache.aset(cache_key(user.pk), _snapshot(profile), ttl())
+    profile.user = user
+    return profile
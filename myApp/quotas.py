@@ -0,0 +1,246 @@
+# myApp/quotas.py
+"""
+Rate limits and daily quotas for the AI endpoints (chat_ai, generate_vision).
+
+Rate limits are checked per user (signed in) or per IP (anonymous), plus
+one global limit per endpoint, e.g. "20/min". Each is a token bucket that
+holds `limit` tokens and refills completely at the start of each period.
+That is a fixed-window counter: one cache.incr() on
+rl:<scope>:<who>:<window>, which is atomic in Redis/Memcached (and under
+LocMemCache's lock). The global limit is only global if the default cache
+is shared; with per-process LocMemCache it is per worker.
+
+Daily quotas (images, chat tokens) default to QUOTAS DAILY_IMAGES /
+DAILY_TOKENS and can be changed per user on their Profile. What a user
+spent is recorded in DailyUsage, with a cache counter in front so the check
+does no query. Where the cost is known up front (one image), areserve takes
+it from the counter first (one atomic incr) and compares afterwards, so
+parallel requests can't all pass the check and then overshoot together.
+With a per-process LocMemCache every worker keeps its own counter and sees
+only its own spending, so counters are re-read from DailyUsage every
+LOCAL_TTL seconds: across workers a user can go over by at most what they
+spend in that window.
+
+Over a limit -> 429 JSON with Retry-After (seconds to the next window, or to
+midnight for daily quotas).
+
+Checks call the sync cache API directly, even from async views. A
+LocMem/Redis incr takes microseconds, while a sync_to_async hop costs more
+than the check itself (bench_quotas).
+"""
+import functools
+import time
+from datetime import datetime, time as dtime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .checks import is_shared
+from .models import DailyUsage
+
+DEFAULTS = {
+    "ENABLED": True,
+    "CHAT_PER_USER": "20/min",
+    "CHAT_PER_IP": "10/min",       # anonymous chat
+    "CHAT_GLOBAL": "600/min",
+    "VISION_PER_USER": "5/min",
+    "VISION_GLOBAL": "60/min",
+    "DAILY_IMAGES": 30,
+    "DAILY_TOKENS": 60000,
+    "PROXY_COUNT": 0,              # trusted proxies in front (Railway: 1); picks the client IP from X-Forwarded-For
+}
+
+PERIODS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+USAGE_TTL = 2 * 86400
+LOCAL_TTL = 10  # per-process cache: how long another worker's spending can go unseen
+
+
+def conf(key):
+    return getattr(settings, "QUOTAS", {}).get(key, DEFAULTS[key])
+
+
+@functools.lru_cache(maxsize=64)
+def parse_rate(rate):
+    """'20/min' -> (20, 60); falsy/'0' -> None (no limit)."""
+    if not rate:
+        return None
+    count, _, unit = str(rate).partition("/")
+    if int(count) <= 0:
+        return None
+    return int(count), PERIODS[unit.strip() or "s"]
+
+
+def hit(scope, who, rate, now=None):
+    """Take one token from scope/who's bucket. Returns 0 if allowed, else seconds until it refills."""
+    limit, period = rate
+    now = time.time() if now is None else now
+    window = int(now // period)
+    key = f"rl:{scope}:{who}:{window}"
+    try:
+        n = cache.incr(key)
+    except ValueError:  # first hit in this window
+        n = 1 if cache.add(key, 1, period + 1) else cache.incr(key)
+    if n <= limit:
+        return 0
+    return (window + 1) * period - now
+
+
+def client_ip(request):
+    meta = request.META
+    proxies = conf("PROXY_COUNT")
+    if proxies:
+        forwarded = [p.strip() for p in meta.get("HTTP_X_FORWARDED_FOR", "").split(",") if p.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return meta.get("REMOTE_ADDR", "")
+
+
+def too_many(retry_after, error):
+    seconds = max(1, int(retry_after + 0.999))
+    resp = JsonResponse({"error": error, "retry_after": seconds}, status=429)
+    resp["Retry-After"] = str(seconds)
+    return resp
+
+
+def check_rates(scope, user, request):
+    """Apply scope's per-user/per-IP and global limits; a 429 response, or None."""
+    if user.is_authenticated:
+        rate, who = parse_rate(conf(f"{scope.upper()}_PER_USER")), f"u{user.pk}"
+    else:
+        rate, who = parse_rate(conf(f"{scope.upper()}_PER_IP")), f"ip{client_ip(request)}"
+    now = time.time()
+    if rate:
+        wait = hit(scope, who, rate, now)
+        if wait:
+            return too_many(wait, "Too many requests. Please slow down.")
+    rate = parse_rate(conf(f"{scope.upper()}_GLOBAL"))
+    if rate:
+        wait = hit(scope, "all", rate, now)
+        if wait:
+            return too_many(wait, "The assistant is busy right now. Please try again shortly.")
+    return None
+
+
+# ---------- daily quotas ----------
+
+KINDS = {"images": ("daily_image_quota", "DAILY_IMAGES"), "tokens": ("daily_token_quota", "DAILY_TOKENS")}
+
+
+def usage_key(kind, user_id, day):
+    return f"quota:{kind}:{user_id}:{day:%Y%m%d}"
+
+
+def daily_limit(profile, kind):
+    field, default = KINDS[kind]
+    value = getattr(profile, field, None)
+    return conf(default) if value is None else value
+
+
+def seconds_to_midnight():
+    now = timezone.localtime()
+    midnight = timezone.make_aware(datetime.combine(now.date() + timedelta(days=1), dtime.min), now.tzinfo)
+    return (midnight - now).total_seconds()
+
+
+def usage_ttl():
+    return USAGE_TTL if is_shared("default") else LOCAL_TTL
+
+
+def _load_usage(user_id, day):
+    row = DailyUsage.objects.filter(user_id=user_id, day=day).values("images", "tokens").first()
+    return row or {"images": 0, "tokens": 0}
+
+
+async def aused(user_id, kind, day):
+    key = usage_key(kind, user_id, day)
+    value = cache.get(key)
+    if value is None:
+        row = await sync_to_async(_load_usage)(user_id, day)
+        cache.add(key, row[kind], usage_ttl())
+        value = row[kind]
+    return value
+
+
+async def acheck_daily(request, user, kind):
+    """429 once the user has spent today's `kind` quota; None otherwise."""
+    if not conf("ENABLED"):
+        return None
+    limit = daily_limit(await request.aprofile(), kind)
+    if limit and await aused(user.pk, kind, timezone.localdate()) >= limit:
+        noun = "image" if kind == "images" else "chat"
+        return too_many(seconds_to_midnight(), f"You've reached today's {noun} limit. It resets at midnight.")
+    return None
+
+
+async def areserve(request, user, kind, amount=1):
+    """
+    Take `amount` off today's `kind` quota before spending it: 429 (and
+    nothing taken) if that goes past the limit, None otherwise. Follow with
+    arecord(..., reserved=True) once it is spent, or release() if it isn't.
+    """
+    day = timezone.localdate()
+    used = await aused(user.pk, kind, day)  # counter loaded from DailyUsage if it isn't cached
+    try:
+        used = cache.incr(usage_key(kind, user.pk, day), amount)
+    except ValueError:  # expired in between; the next check reloads it from the row
+        used += amount
+    if conf("ENABLED"):
+        limit = daily_limit(await request.aprofile(), kind)
+        if limit and used > limit:
+            release(user.pk, kind, amount)
+            noun = "image" if kind == "images" else "chat"
+            return too_many(seconds_to_midnight(), f"You've reached today's {noun} limit. It resets at midnight.")
+    return None
+
+
+def release(user_id, kind, amount=1):
+    """Give back a reservation that wasn't spent."""
+    try:
+        cache.decr(usage_key(kind, user_id, timezone.localdate()), amount)
+    except ValueError:
+        pass
+
+
+def record(user_id, kind, amount=1, reserved=False):
+    """Add to today's usage: the DailyUsage row, then the cache counter (unless areserve already did)."""
+    if amount <= 0:
+        return
+    day = timezone.localdate()
+    updated = DailyUsage.objects.filter(user_id=user_id, day=day).update(**{kind: F(kind) + amount})
+    if not updated:
+        usage, created = DailyUsage.objects.get_or_create(user_id=user_id, day=day, defaults={kind: amount})
+        if not created:
+            DailyUsage.objects.filter(pk=usage.pk).update(**{kind: F(kind) + amount})
+    if reserved:
+        return
+    try:
+        cache.incr(usage_key(kind, user_id, day), amount)
+    except ValueError:
+        pass  # not cached yet: the next check loads the row
+
+
+arecord = sync_to_async(record)
+
+
+# ---------- view decorator ----------
+
+def limited(scope):
+    """
+    Async view decorator: the per-user/per-IP and global rate limits for
+    `scope` ("chat", "vision"). Daily quotas are checked by the view itself,
+    only where it is about to spend (acheck_daily or areserve, then arecord).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if conf("ENABLED"):
+                denied = check_rates(scope, await request.auser(), request)
+                if denied is not None:
+                    return denied
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
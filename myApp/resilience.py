@@ -0,0 +1,303 @@
+# myApp/resilience.py
+"""
+Deadlines, retries, circuit breakers and hedging around OpenAI calls.
+
+When OpenAI slowed down, each call waited out the SDK's default timeout and
+retries. Workers filled up with stuck calls, and every other page stalled
+behind them. Now every call goes through call() / acall():
+
+- deadline: each request gets a budget (CHAT_BUDGET, IMAGE_BUDGET).
+  Each attempt gets min(ATTEMPT_TIMEOUT, what's left of the budget) as
+  its timeout. The async path enforces that as a hard limit.
+- retries: only errors that are worth retrying (timeouts, connection
+  errors, 429, 5xx). They wait an exponential backoff with full jitter, or
+  the 429's Retry-After. There's no retry if the wait would overrun the
+  deadline. The clients themselves have max_retries=0, so nothing retries
+  behind our back.
+- circuit breaker, one per upstream and per process. When at least
+  BREAKER_FAILURE_RATE of the last BREAKER_WINDOW seconds' calls failed
+  (and there were BREAKER_MIN_CALLS), it opens. While open, calls fail at
+  once with CircuitOpen, which the views turn into a friendly 503. After
+  BREAKER_COOLDOWN one probe call is let through (half-open). Its result
+  closes or reopens the breaker.
+- hedging (chat, optional): if the first attempt hasn't answered after
+  CHAT_HEDGE_AFTER seconds, a second identical request is sent. The first
+  answer wins and the other is cancelled.
+
+Breaker state, rejections, retries and hedges are exported on /metrics.
+To try it locally, run StubServer with error_rate / slow_rate, or call
+fail_next() (myApp/stubs.py).
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.http import JsonResponse
+
+from . import metrics
+
+DEFAULTS = {
+    "CHAT_BUDGET": 25.0,             # seconds for one chat request, all attempts included
+    "CHAT_ATTEMPT_TIMEOUT": 15.0,
+    "CHAT_HEDGE_AFTER": 0.0,         # seconds before a hedge request; 0 = never hedge
+    "IMAGE_BUDGET": 240.0,
+    "IMAGE_ATTEMPT_TIMEOUT": 150.0,
+    "SUMMARY_BUDGET": 20.0,
+    "MAX_ATTEMPTS": 3,
+    "BACKOFF_BASE": 0.25,
+    "BACKOFF_MAX": 4.0,
+    "BREAKER_FAILURE_RATE": 0.5,
+    "BREAKER_MIN_CALLS": 10,
+    "BREAKER_WINDOW": 30.0,
+    "BREAKER_COOLDOWN": 15.0,
+}
+
+
+def conf(key):
+    return getattr(settings, "RESILIENCE", {}).get(key, DEFAULTS[key])
+
+
+BREAKER_STATE = metrics.Gauge("psi_circuit_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open.", ["breaker"])
+BREAKER_REJECTED = metrics.Counter("psi_circuit_rejected_total", "Calls refused while the breaker was open.", ["breaker"])
+RETRIES = metrics.Counter("psi_upstream_retries_total", "Upstream calls retried.", ["breaker"])
+HEDGES = metrics.Counter("psi_hedged_requests_total", "Hedge requests sent, and how they ended.", ["breaker", "outcome"])
+
+class CircuitOpen(Exception):
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is temporarily unavailable.")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def retryable(e):
+    import openai  # not at module level: views import this module at startup (see myApp/clients.py)
+
+    if isinstance(e, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError,
+                      openai.InternalServerError, asyncio.TimeoutError)):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500
+
+
+# ---------- circuit breaker ----------
+
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+
+class CircuitBreaker:
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self._calls = deque()  # (monotonic time, ok)
+        self._lock = threading.Lock()
+        BREAKER_STATE.set(CLOSED, name)
+
+    def _set(self, state):
+        self.state = state
+        BREAKER_STATE.set(state, self.name)
+
+    def retry_after(self):
+        return max(0.0, self.opened_at + conf("BREAKER_COOLDOWN") - time.monotonic())
+
+    def before(self):
+        """Raise CircuitOpen unless a call may go out now."""
+        with self._lock:
+            if self.state == OPEN:
+                if self.retry_after() > 0:
+                    BREAKER_REJECTED.inc(self.name)
+                    raise CircuitOpen(self.name, self.retry_after())
+                self._set(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self.probing:
+                    BREAKER_REJECTED.inc(self.name)
+                    raise CircuitOpen(self.name, 1.0)
+                self.probing = True
+
+    def is_open(self):
+        return self.state == OPEN and self.retry_after() > 0
+
+    def record(self, ok):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probing = False
+                self._calls.clear()
+                if ok:
+                    self._set(CLOSED)
+                else:
+                    self.opened_at = now
+                    self._set(OPEN)
+                return
+            calls = self._calls
+            calls.append((now, ok))
+            horizon = now - conf("BREAKER_WINDOW")
+            while calls and calls[0][0] < horizon:
+                calls.popleft()
+            if ok or self.state != CLOSED or len(calls) < conf("BREAKER_MIN_CALLS"):
+                return
+            failed = sum(1 for _, good in calls if not good)
+            if failed / len(calls) >= conf("BREAKER_FAILURE_RATE"):
+                self.opened_at = now
+                self._set(OPEN)
+
+    def cancelled(self):
+        """The call was cancelled (client went away): free the probe slot, count nothing."""
+        with self._lock:
+            self.probing = False
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self.probing = False
+            self._set(CLOSED)
+
+
+OPENAI_CHAT = CircuitBreaker("openai_chat")
+OPENAI_IMAGE = CircuitBreaker("openai_image")
+
+
+# ---------- retries ----------
+
+def _backoff(attempt, error):
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    cap = min(conf("BACKOFF_MAX"), conf("BACKOFF_BASE") * 2 ** attempt)
+    return random.uniform(0, cap)  # full jitter
+
+
+def _next_wait(breaker, attempt, error, deadline):
+    """Seconds to sleep before retrying, or None to give up and raise."""
+    if not retryable(error) or attempt + 1 >= conf("MAX_ATTEMPTS") or breaker.is_open():
+        return None
+    delay = _backoff(attempt, error)
+    if time.monotonic() + delay >= deadline:
+        return None
+    RETRIES.inc(breaker.name)
+    return delay
+
+
+def _outcome(breaker, error):
+    # 4xx other than 429 means OpenAI answered: healthy upstream, bad request
+    breaker.record(error is None or not retryable(error))
+
+
+def call(breaker, fn, budget, attempt_timeout):
+    """Sync: fn(timeout) with the deadline, retries and breaker above."""
+    deadline = time.monotonic() + budget
+    attempt = 0
+    while True:
+        timeout = min(attempt_timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            raise DeadlineExceeded(f"{breaker.name}: no time left for another attempt.")
+        breaker.before()
+        try:
+            result = fn(timeout)
+        except Exception as e:
+            _outcome(breaker, e)
+            wait = _next_wait(breaker, attempt, e, deadline)
+            if wait is None:
+                raise
+            time.sleep(wait)
+            attempt += 1
+            continue
+        _outcome(breaker, None)
+        return result
+
+
+async def acall(breaker, fn, budget, attempt_timeout, hedge_after=0.0, record_success=True):
+    """
+    Async: await fn(timeout) with the deadline, retries and breaker; optionally hedged.
+    record_success=False leaves a successful call's outcome to the caller
+    (a stream: breaker.record() once it ends, so each call counts once).
+    """
+    deadline = time.monotonic() + budget
+    attempt = 0
+    while True:
+        timeout = min(attempt_timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            raise DeadlineExceeded(f"{breaker.name}: no time left for another attempt.")
+        breaker.before()
+        try:
+            if hedge_after and attempt == 0 and hedge_after < timeout:
+                result = await _hedged(breaker, fn, timeout, hedge_after)
+            else:
+                result = await asyncio.wait_for(fn(timeout), timeout)
+        except asyncio.CancelledError:
+            breaker.cancelled()
+            raise
+        except Exception as e:
+            _outcome(breaker, e)
+            wait = _next_wait(breaker, attempt, e, deadline)
+            if wait is None:
+                raise
+            await asyncio.sleep(wait)
+            attempt += 1
+            continue
+        if record_success:
+            _outcome(breaker, None)
+        return result
+
+
+async def _hedged(breaker, fn, timeout, hedge_after):
+    started = time.monotonic()
+    first = asyncio.ensure_future(asyncio.wait_for(fn(timeout), timeout))
+    pending = {first}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=hedge_after)
+        if done:
+            return first.result()
+        left = timeout - (time.monotonic() - started)
+        second = asyncio.ensure_future(asyncio.wait_for(fn(left), left))
+        HEDGES.inc(breaker.name, "sent")
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    HEDGES.inc(breaker.name, "won" if task is second else "lost")
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+# ---------- responses ----------
+
+def friendly(error):
+    """(status, message, retry_after) for errors the views show to people."""
+    if isinstance(error, CircuitOpen):
+        return 503, "The AI assistant is temporarily unavailable. Please try again in a moment.", error.retry_after
+    import openai
+
+    if isinstance(error, (DeadlineExceeded, asyncio.TimeoutError, openai.APITimeoutError)):
+        return 504, "The AI assistant is taking too long to answer. Please try again.", None
+    if retryable(error):
+        return 503, "The AI assistant is busy right now. Please try again shortly.", 5
+    return None
+
+
+def error_response(error):
+    """JsonResponse for a friendly() error, else None (let the view report it)."""
+    handled = friendly(error)
+    if handled is None:
+        return None
+    status, message, retry_after = handled
+    resp = JsonResponse({"error": message}, status=status)
+    if retry_after:
+        resp["Retry-After"] = str(max(1, int(retry_after + 0.999)))
+    return resp
@@ -1,13 +1,35 @@
 # myApp/signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile
+from . import backends, conditional, profiles
+from .models import Profile, Vision
 
 @receiver(post_save, sender=User)
 def ensure_profile(sender, instance, created, **kwargs):
+    # Only on signup. Every login re-saves the User (last_login), so doing a
+    # get_or_create here cost a query per login; older/imported users without
+    # a Profile get one lazily from profiles.get_profile().
     if created:
         Profile.objects.create(user=instance)
-    else:
-        # Ensure profile exists for imported/older users
-        Profile.objects.get_or_create(user=instance)
+
+@receiver(post_save, sender=User)
+def cache_user(sender, instance, **kwargs):
+    backends.store(instance)  # write-through for request.user (myApp/backends.py)
+
+@receiver(post_delete, sender=User)
+def uncache_user(sender, instance, **kwargs):
+    backends.invalidate(instance.pk)
+
+@receiver(post_save, sender=Profile)
+def cache_profile(sender, instance, **kwargs):
+    profiles.store(instance)  # write-through: next read is a cache hit
+
+@receiver(post_delete, sender=Profile)
+def uncache_profile(sender, instance, **kwargs):
+    profiles.invalidate(instance.user_id)
+
+@receiver(post_save, sender=Vision)
+@receiver(post_delete, sender=Vision)
+def bump_vision_history(sender, instance, **kwargs):
+    conditional.bump_visions(instance.user_id)  # new ETag for api/visions/
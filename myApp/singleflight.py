@@ -0,0 +1,214 @@
+# myApp/singleflight.py
+"""
+Single-flight request coalescing.
+
+While one upstream call for a key is pending, later callers with the same
+key wait for it and share its result instead of making their own call.
+
+- within a process: a dict of concurrent.futures.Future guarded by a lock.
+  Threads wait with fut.result(); coroutines (from any event loop) wait with
+  asyncio.wrap_future(fut), so WSGI threads and ASGI tasks can share a flight.
+- across processes: the in-process leader also takes a lock file for the key
+  (O_CREAT|O_EXCL, portable stand-in for a DB/Redis lock; see FileLock for
+  ownership and stale locks). A leader in another
+  worker blocks on that file, then calls `recheck` to pick up the result the
+  first worker stored in the shared cache/DB before calling upstream itself.
+"""
+import asyncio
+import hashlib
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+
+def _lock_dir():
+    path = getattr(settings, "SINGLEFLIGHT_LOCK_DIR", None) or os.path.join(tempfile.gettempdir(), "psi-singleflight")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class FileLock:
+    """
+    Lock file held by one process at a time. It holds the owner's token
+    (host:pid:random), and release() only removes a file that still holds
+    ours. A file older than stale_after whose process is gone (crashed
+    holder) is broken: renamed aside, re-checked, then removed, so two
+    waiters breaking it at once can't remove each other's fresh lock. A live
+    holder is never broken, however long it runs.
+    """
+
+    def __init__(self, path, timeout=120.0, stale_after=300.0, poll=0.05):
+        self.path = path
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.poll = poll
+        self.token = None
+
+    def acquire(self):
+        """True once held; False if `timeout` passed (caller proceeds unlocked)."""
+        deadline = time.monotonic() + self.timeout
+        token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if self._break_stale():
+                    continue
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(self.poll)
+            else:
+                with os.fdopen(fd, "w") as f:
+                    f.write(token)
+                self.token = token
+                return True
+
+    def release(self):
+        """Remove the lock file if it is still ours."""
+        if self.token and _read(self.path) == self.token:
+            _remove(self.path)
+        self.token = None
+
+    def _is_stale(self, path):
+        try:
+            age = time.time() - os.path.getmtime(path)
+        except FileNotFoundError:
+            return False
+        return age > self.stale_after and not _holder_alive(_read(path))
+
+    def _break_stale(self):
+        """True if the lock file was stale and is gone now (worth trying to create it again)."""
+        if not self._is_stale(self.path):
+            return False
+        aside = f"{self.path}.{uuid.uuid4().hex}.stale"
+        try:
+            os.rename(self.path, aside)  # atomic: one waiter gets each file
+        except FileNotFoundError:
+            return True
+        if not self._is_stale(aside):
+            # another waiter broke the stale file first and this is its new lock: put it back
+            try:
+                os.link(aside, self.path)
+            except FileExistsError:
+                pass
+        _remove(aside)
+        return True
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _holder_alive(token):
+    """Whether the process named in a lock token still runs (only knowable on this host)."""
+    if not token:
+        return True  # created a moment ago, token not written yet
+    host, _, rest = token.partition(":")
+    pid = rest.partition(":")[0]
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    return True
+
+
+class SingleFlight:
+    def __init__(self, name, cross_process=True, lock_timeout=120.0):
+        self.name = name
+        self.cross_process = cross_process
+        self.lock_timeout = lock_timeout
+        self._mu = threading.Lock()
+        self._calls = {}
+
+    # --- in-process ---
+
+    def begin(self, key):
+        """(future, is_leader). The leader must call finish() exactly once."""
+        with self._mu:
+            fut = self._calls.get(key)
+            if fut is not None:
+                return fut, False
+            fut = self._calls[key] = Future()
+            return fut, True
+
+    def finish(self, key, fut, result=None, exc=None):
+        with self._mu:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+        if fut.done():
+            return
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(result)
+
+    # --- cross-process ---
+
+    def lock(self, key):
+        """Held FileLock for `key`, or None (cross_process off, or wait timed out)."""
+        if not self.cross_process:
+            return None
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+        lock = FileLock(os.path.join(_lock_dir(), f"{self.name}-{digest}.lock"), timeout=self.lock_timeout)
+        return lock if lock.acquire() else None
+
+    # --- call helpers: return (value, shared) ---
+
+    def do(self, key, fn, recheck=None):
+        fut, leader = self.begin(key)
+        if not leader:
+            return fut.result(), True
+        lock = None
+        try:
+            lock = self.lock(key)
+            hit = recheck() if (lock and recheck) else None
+            value, shared = (hit, True) if hit is not None else (fn(), False)
+        except BaseException as e:
+            self.finish(key, fut, exc=e)
+            raise
+        finally:
+            if lock:
+                lock.release()
+        self.finish(key, fut, result=value)
+        return value, shared
+
+    async def ado(self, key, afn, recheck=None):
+        """Async do(): afn/recheck are coroutine functions."""
+        fut, leader = self.begin(key)
+        if not leader:
+            return await asyncio.wrap_future(fut), True
+        lock = None
+        try:
+            lock = await sync_to_async(self.lock, thread_sensitive=False)(key)
+            hit = await recheck() if (lock and recheck) else None
+            value, shared = (hit, True) if hit is not None else (await afn(), False)
+        except BaseException as e:
+            self.finish(key, fut, exc=e)
+            raise
+        finally:
+            if lock:
+                lock.release()
+        self.finish(key, fut, result=value)
+        return value, shared
@@ -0,0 +1,86 @@
+# myApp/startup.py
+"""
+Worker boot cost: django.setup() plus loading the URLconf. Every gunicorn /
+uvicorn worker and management command pays it before doing anything, and
+autoscaling waits on it.
+
+measure() boots a fresh interpreter (the current process has imported
+everything already) and returns how long that took, how much memory it
+added, which LAZY_MODULES it pulled in and, with importtime=True, the
+`python -X importtime` breakdown. `manage.py profile_startup` prints it;
+StartupBudgetTests fails when boot goes over TIME_BUDGET / MEMORY_BUDGET_MB
+or a lazy module becomes eager again.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+DEFAULTS = {
+    "TIME_BUDGET": 2.0,                 # seconds for django.setup() + URLconf
+    "MEMORY_BUDGET_MB": 60,             # RSS added by the same
+    "LAZY_MODULES": ("openai", "httpx"),  # imported on first use, never at boot
+}
+
+
+def conf(key):
+    return getattr(settings, "STARTUP", {}).get(key, DEFAULTS[key])
+
+
+PROBE = """
+import json, resource, sys, time
+def rss():
+    # current RSS; ru_maxrss would include the parent's high-water mark from before exec
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(l.split()[1]) for l in f if l.startswith("VmRSS:")) / 1024
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+rss0, t0 = rss(), time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+seconds = time.perf_counter() - t0
+print(json.dumps({"seconds": seconds, "memory_mb": rss() - rss0, "modules": sorted(sys.modules)}))
+"""
+
+
+def _parse_importtime(stderr):
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append({"module": name.strip(), "depth": depth,
+                     "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    return rows
+
+
+def measure(importtime=False):
+    """{"seconds", "memory_mb", "eager": [lazy modules imported at boot], "imports": [...]} from a fresh process."""
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE]
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "myProject.settings")}
+    proc = subprocess.run(cmd, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=120)
+    if proc.returncode:
+        raise RuntimeError(f"Boot probe failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    modules = set(result.pop("modules"))
+    result["eager"] = [m for m in conf("LAZY_MODULES") if m in modules]
+    result["imports"] = _parse_importtime(proc.stderr) if importtime else []
+    return result
+
+
+def over_budget(result):
+    """Human-readable budget violations for a measure() result; empty when within budget."""
+    problems = []
+    if result["seconds"] > conf("TIME_BUDGET"):
+        problems.append(f"boot took {result['seconds']:.2f}s (budget {conf('TIME_BUDGET')}s)")
+    if result["memory_mb"] > conf("MEMORY_BUDGET_MB"):
+        problems.append(f"boot added {result['memory_mb']:.1f} MB (budget {conf('MEMORY_BUDGET_MB')} MB)")
+    if result["eager"]:
+        problems.append("imported at boot: " + ", ".join(result["eager"]))
+    return problems
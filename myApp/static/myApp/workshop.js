@@ -0,0 +1,610 @@
+// myApp/static/myApp/workshop.js
+// Workshop page: onboarding, profile, chat and image generation.
+// Server-side values come from window.PSI_WORKSHOP (see workshop.html).
+"use strict";
+
+/* =========================
+   GLOBAL CONFIG + HELPERS
+   ========================= */
+const STYLE_MIN = 3;          // how many vibes required on step 2
+const AUTONEXT_STYLES = true; // auto-advance when min is met
+const { shouldOnboard: SHOULD_ONBOARD, urls: URLS } = window.PSI_WORKSHOP;  // set by workshop.html
+
+// CSRF (define once)
+function getCookie(name){
+  const value = `; ${document.cookie}`;
+  const parts = value.split(`; ${name}=`);
+  if (parts.length === 2) return decodeURIComponent(parts.pop().split(";").shift());
+}
+window.CSRF_TOKEN = window.CSRF_TOKEN || getCookie("csrftoken");
+
+// tiny utils (shared)
+const $  = (s, r=document) => r.querySelector(s);
+const $$ = (s, r=document) => [...r.querySelectorAll(s)];
+
+function escapeHtml(s){
+  return s.replace(/[&<>"']/g, c => ({"&":"&amp;","<":"&lt;",">":"&gt;","\"":"&quot;","'":"&#39;"}[c]));
+}
+function normalizeListBreaks(raw){
+  let t = raw;
+  t = t.replace(/(\S)\s+(\d+)\.\s/g, "$1\n$2. ");
+  t = t.replace(/(\S)\s+([\-•])\s/g, "$1\n$2 ");
+  return t;
+}
+function mdInline(htmlEscaped){
+  htmlEscaped = htmlEscaped.replace(/\*\*(.+?)\*\*/g, "<strong>$1</strong>");
+  htmlEscaped = htmlEscaped.replace(/`([^`]+)`/g, "<code class='px-1 rounded bg-black/20'>$1</code>");
+  return htmlEscaped;
+}
+function renderMarkdownish(raw){
+  let txt = normalizeListBreaks(raw);
+  const lines = txt.split(/\r?\n/);
+  let htmlParts = [], ol = [], ul = [];
+  const flushLists = () => {
+    if (ol.length){
+      htmlParts.push(`<ol class="list-decimal pl-5 space-y-1">${ol.map(li => `<li>${mdInline(escapeHtml(li))}</li>`).join("")}</ol>`);
+      ol = [];
+    }
+    if (ul.length){
+      htmlParts.push(`<ul class="list-disc pl-5 space-y-1">${ul.map(li => `<li>${mdInline(escapeHtml(li))}</li>`).join("")}</ul>`);
+      ul = [];
+    }
+  };
+  for (let line of lines){
+    const t = line.trim();
+    if (!t){ flushLists(); continue; }
+    const mNum = t.match(/^(\d+)\.\s+(.*)$/);
+    const mBul = t.match(/^[\-•]\s+(.*)$/);
+    if (mNum){ ol.push(mNum[2]); continue; }
+    if (mBul){ ul.push(mBul[1]); continue; }
+    flushLists();
+    htmlParts.push(`<p class="leading-relaxed">${mdInline(escapeHtml(t))}</p>`);
+  }
+  flushLists();
+  return htmlParts.join("");
+}
+// Read a text/event-stream fetch() body and call onEvent(name, data) per frame
+async function readEventStream(res, onEvent){
+  const reader  = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = "";
+  for (;;){
+    const { value, done } = await reader.read();
+    if (done) break;
+    buf += decoder.decode(value, { stream: true });
+    let cut;
+    while ((cut = buf.indexOf("\n\n")) !== -1){
+      const frame = buf.slice(0, cut);
+      buf = buf.slice(cut + 2);
+      let name = "message", data = "";
+      for (const line of frame.split("\n")){
+        if (line.startsWith("event:")) name = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trimStart();
+      }
+      if (data) onEvent(name, JSON.parse(data));
+    }
+  }
+}
+// Poll a queued image generation until a worker marks it done/failed
+async function waitForVision(statusUrl, timeoutMs = 180000){
+  const started = Date.now();
+  let delay = 1000;
+  for (;;){
+    await new Promise(r => setTimeout(r, delay));
+    const res  = await fetch(statusUrl, { headers: { "X-Requested-With": "fetch" }});
+    const data = await res.json().catch(() => ({}));
+    if (!res.ok) throw new Error(data.error || `Status check failed (${res.status})`);
+    if (data.status === "done" || data.status === "failed") return data;
+    if (Date.now() - started > timeoutMs) throw new Error("Still working on your image — check back in a moment.");
+    delay = Math.min(delay * 1.5, 4000);
+  }
+}
+// Sized AVIF/WebP variants when the API has them; tap opens the full-size original
+function visionPicture(job, src){
+  const img = `<img src="${job.medium_url || src}" alt="Your Vision" class="rounded-lg shadow-md w-full h-auto"
+    ${job.width && job.height ? `width="${job.width}" height="${job.height}"` : ""}
+    ${job.sizes ? `sizes="${job.sizes}"` : ""} loading="lazy" decoding="async"/>`;
+  if (!job.srcset) return img;
+  return `<a href="${src}" target="_blank" rel="noopener"><picture>
+    <source type="image/avif" srcset="${job.srcset.avif}" sizes="${job.sizes}">
+    <source type="image/webp" srcset="${job.srcset.webp}" sizes="${job.sizes}">
+    ${img}
+  </picture></a>`;
+}
+function showTypingIndicator(chatBox){
+  const id = "typing-" + Date.now();
+  chatBox?.insertAdjacentHTML("beforeend", `
+    <div id="${id}" class="self-start bg-[#1A237E] px-4 py-3 rounded-2xl text-white max-w-[80%] flex gap-2 shadow">
+      <span class="w-2 h-2 bg-white rounded-full animate-bounce"></span>
+      <span class="w-2 h-2 bg-white rounded-full animate-bounce [animation-delay:200ms]"></span>
+      <span class="w-2 h-2 bg-white rounded-full animate-bounce [animation-delay:400ms]"></span>
+    </div>
+  `);
+  chatBox?.lastElementChild?.scrollIntoView({ behavior: "smooth", block: "end" });
+  return id;
+}
+function removeTypingIndicator(id){
+  const el = document.getElementById(id);
+  if (el) el.remove();
+}
+function urlHasOnboardFlag(){
+  try {
+    const u = new URL(window.location.href);
+    return u.searchParams.get("onboard") === "1" || window.location.hash.includes("#onboard");
+  } catch { return false; }
+}
+
+/* =========================
+   ONBOARDING: helpers
+   ========================= */
+function openOnboarding(){ $('#onboard-overlay')?.classList.remove('hidden'); }
+function closeOnboarding(){ $('#onboard-overlay')?.classList.add('hidden'); }
+
+function setObStatus(msg, isError=false){
+  const el = $('#onboard-status');
+  if (!el) return;
+  el.textContent = msg;
+  el.classList.toggle("hidden", !msg);
+  el.classList.toggle("text-red-600", isError);
+  el.classList.toggle("text-gray-500", !isError);
+}
+
+function formToJson(form){
+  const fd = new FormData(form);
+  const o = {};
+  for (const [k, v] of fd.entries()){
+    if (k === "consent_use_demographics") o[k] = true;
+    else o[k] = (v || "").toString().trim();
+  }
+  if (!fd.has("consent_use_demographics")) o.consent_use_demographics = false;
+  return o;
+}
+
+// POST to onboarding endpoint (csrf_exempt on backend)
+async function postOnboarding(payload){
+  const res = await fetch(URLS.saveOnboarding, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(payload),
+  });
+  const data = await res.json().catch(() => ({}));
+  if (!res.ok || !data.ok) throw new Error(data.error || `Failed (${res.status})`);
+  return data;
+}
+
+/* =========================
+   PROFILE: helpers
+   ========================= */
+function openProfile(){ $('#profile-overlay')?.classList.remove('hidden'); }
+function closeProfile(){ $('#profile-overlay')?.classList.add('hidden'); }
+function setProfStatus(msg, isError=false){
+  const el = $('#profile-status');
+  if (!el) return;
+  el.textContent = msg;
+  el.classList.toggle("hidden", !msg);
+  el.classList.toggle("text-red-600", isError);
+  el.classList.toggle("text-gray-500", !isError);
+}
+async function loadProfile(){
+  setProfStatus("Loading…");
+  const res = await fetch(URLS.profileGet, { headers: { "X-Requested-With": "fetch" }});
+  const data = await res.json().catch(() => ({}));
+  if (!res.ok || !data.ok) throw new Error(data.error || `Failed (${res.status})`);
+  const p = data.profile || {};
+  const f = $('#profile-form');
+  if (!f) return;
+  f.age_group.value = p.age_group || "";
+  f.gender.value = p.gender || "";
+  f.region.value  = p.region  || "";
+  f.style_keywords.value = p.style_keywords || "";
+  f.consent_use_demographics.checked = !!p.consent_use_demographics;
+  setProfStatus("");
+}
+async function saveProfile(payload){
+  const res = await fetch(URLS.profileSave, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", "X-CSRFToken": window.CSRF_TOKEN },
+    body: JSON.stringify(payload),
+  });
+  const data = await res.json().catch(() => ({}));
+  if (!res.ok || !data.ok) throw new Error(data.error || `Failed (${res.status})`);
+  return data;
+}
+
+/* =========================
+   ONBOARDING QUIZ CONTROLLER
+   ========================= */
+(function setupOnboardingQuiz(){
+  const obForm     = $('#onboard-form');            if (!obForm) return; // quiz not present
+  const progress   = $('#ob-progress');
+  const stepLabel  = $('#ob-step-label');
+  const btnBack    = $('#ob-back');
+  const btnNext    = $('#ob-next');
+  const btnSave    = $('#ob-save');
+  const btnSkip    = $('#onboard-skip');
+
+  const hidAge     = $('#ob-age');
+  const hidRegion  = $('#ob-region');
+  const hidStyles  = $('#ob-styles');
+  const extraStyles= $('#ob-style-extra');
+
+  const styleMinEl   = $('#ob-style-min');
+  const styleCountEl = $('#ob-style-count');
+
+  const totalSteps = 4;
+  let step = 1;
+  const styleSet = new Set();
+  let extrasCount = 0;
+  let styleTotal  = 0;
+
+  function canProceedFromStyle(){ return styleTotal >= STYLE_MIN; }
+  function updateProgressUI(){
+    if (styleMinEl) styleMinEl.textContent = STYLE_MIN;
+    if (stepLabel) stepLabel.textContent = `Step ${step} of ${totalSteps}`;
+    if (progress)  progress.style.width = `${(step/totalSteps)*100}%`;
+
+    $$('.ob-step').forEach(sec => sec.classList.toggle('hidden', sec.dataset.step !== String(step)));
+
+    if (btnBack) btnBack.disabled = step === 1;
+    if (btnNext) btnNext.classList.toggle('hidden', step === totalSteps);
+    if (btnSave) btnSave.classList.toggle('hidden', step !== totalSteps);
+
+    if (btnNext){
+      if (step === 2){
+        const ok = canProceedFromStyle();
+        btnNext.disabled = !ok;
+        btnNext.classList.toggle('opacity-50', !ok);
+        btnNext.classList.toggle('cursor-not-allowed', !ok);
+      } else {
+        btnNext.disabled = false;
+        btnNext.classList.remove('opacity-50','cursor-not-allowed');
+      }
+    }
+  }
+  function next(){ if (step < totalSteps){ step++; updateProgressUI(); } }
+  function back(){ if (step > 1){ step--; updateProgressUI(); } }
+
+  // Step 1: Age select
+  $$('.ob-card[data-target="age_group"]').forEach(btn => {
+    btn.addEventListener('click', () => {
+      if (hidAge) hidAge.value = btn.dataset.value || "";
+      $$('.ob-card[data-target="age_group"]').forEach(b => b.classList.remove('selected'));
+      btn.classList.add('selected');
+      next();
+    });
+  });
+
+  // Step 2: Vibes
+  function syncStyles(){
+    const extras = (extraStyles?.value || '')
+      .split(',')
+      .map(s => s.trim())
+      .filter(Boolean);
+    extrasCount = extras.length;
+    styleTotal  = styleSet.size + extrasCount;
+    if (hidStyles) hidStyles.value = [...styleSet, ...extras].join(', ');
+    if (styleCountEl) styleCountEl.textContent = String(styleTotal);
+
+    if (step === 2 && btnNext){
+      const ok = canProceedFromStyle();
+      btnNext.disabled = !ok;
+      btnNext.classList.toggle('opacity-50', !ok);
+      btnNext.classList.toggle('cursor-not-allowed', !ok);
+    }
+  }
+  $$('.ob-card[data-group="style"]').forEach(btn => {
+    btn.addEventListener('click', () => {
+      const key = btn.dataset.chip;
+      if (!key) return;
+      if (styleSet.has(key)){
+        styleSet.delete(key);
+        btn.classList.remove('selected');
+      } else {
+        styleSet.add(key);
+        btn.classList.add('selected');
+      }
+      syncStyles();
+      if (step === 2 && AUTONEXT_STYLES && canProceedFromStyle()) next();
+    });
+  });
+  extraStyles?.addEventListener('input', syncStyles);
+
+  // Step 3: Region chips
+  $$('.ob-chip[data-target="region"]').forEach(chip => {
+    chip.addEventListener('click', () => {
+      if (hidRegion) hidRegion.value = chip.dataset.value || "";
+      $$('.ob-chip[data-target="region"]').forEach(c => c.classList.remove('selected'));
+      chip.classList.add('selected');
+      next();
+    });
+  });
+
+  // Step 4: Consent toggle
+  (function(){
+    const consent = $('#ob-consent');
+    const toggle  = document.querySelector('[data-toggle]');
+    const knob    = document.querySelector('[data-knob]');
+    toggle?.addEventListener('click', () => {
+      if (!consent || !toggle || !knob) return;
+      consent.checked = !consent.checked;
+      toggle.classList.toggle('bg-[#1A237E]', consent.checked);
+      toggle.classList.toggle('bg-gray-300', !consent.checked);
+      knob.style.transform = consent.checked ? 'translateX(22px)' : 'translateX(4px)';
+    });
+    if (knob) knob.style.transform = 'translateX(4px)';
+  })();
+
+  // Nav buttons
+  btnNext?.addEventListener('click', () => {
+    if (step === 2 && !canProceedFromStyle()){
+      setObStatus(`Pick at least ${STYLE_MIN} vibe${STYLE_MIN>1?'s':''} to continue.`, true);
+      setTimeout(() => setObStatus('', false), 1600);
+      return;
+    }
+    next();
+  });
+  btnBack?.addEventListener('click', back);
+
+  // Skip button -> mark onboarded with blanks
+  btnSkip?.addEventListener('click', async () => {
+    setObStatus("Skipping…");
+    try {
+      await postOnboarding({});
+      setObStatus("");
+      closeOnboarding();
+      const chatBox = $('#chat-messages');
+      chatBox?.insertAdjacentHTML("beforeend", `
+        <div class="self-start bg-[#1A237E] px-5 py-3 rounded-2xl text-white max-w-[80%] shadow">
+          No worries — we can personalize later. Tell me a vision and I’ll get creating.
+        </div>
+      `);
+      chatBox?.lastElementChild?.scrollIntoView({ behavior: "smooth" });
+    } catch (err) {
+      setObStatus(err.message || "Couldn’t skip.", true);
+    }
+  });
+
+  // Final submit
+  obForm.addEventListener('submit', async (e) => {
+    e.preventDefault();
+    setObStatus("Saving…");
+    try {
+      const payload = formToJson(obForm);
+      await postOnboarding(payload);
+      setObStatus("Saved!");
+      closeOnboarding();
+      const chatBox = $('#chat-messages');
+      chatBox?.insertAdjacentHTML("beforeend", `
+        <div class="self-start bg-[#1A237E] px-5 py-3 rounded-2xl text-white max-w-[80%] shadow">
+          Awesome — I’ll tailor images to your profile. What do you want to visualize first?
+        </div>
+      `);
+      chatBox?.lastElementChild?.scrollIntoView({ behavior: "smooth" });
+    } catch (err) {
+      setObStatus(err.message || "Something went wrong.", true);
+    }
+  });
+
+  // init
+  syncStyles();
+  updateProgressUI();
+})();
+
+/* =========================
+   PAGE WIRING (on load)
+   ========================= */
+window.addEventListener("DOMContentLoaded", async () => {
+  // Welcome bubble
+  const chatBox = $('#chat-messages');
+  chatBox?.insertAdjacentHTML("beforeend", `
+    <div class="self-start bg-[#1A237E] px-5 py-3 rounded-2xl text-white max-w-[80%] shadow">
+      Welcome to <strong>PSI Vision</strong> ✨<br/>
+      I’m here to help you dream bigger and visualize your future.<br/>
+      What’s on your mind today?
+    </div>
+  `);
+  chatBox?.lastElementChild?.scrollIntoView({ behavior: "smooth" });
+
+  // Open onboarding on first visit or URL flag
+  if (SHOULD_ONBOARD || urlHasOnboardFlag()) openOnboarding();
+
+  // Prefill onboarding from saved profile
+  (async () => {
+    try {
+      const res = await fetch(URLS.profileGet);
+      const data = await res.json();
+      if (!data?.ok) return;
+      const p   = data.profile || {};
+      const ob  = $('#onboard-form');
+      if (!ob) return;
+      if (ob.age_group)  ob.age_group.value  = p.age_group || "";
+      if (ob.gender)     ob.gender.value     = p.gender || "";
+      if (ob.region)     ob.region.value     = p.region  || "";
+      if (ob.style_keywords) ob.style_keywords.value = p.style_keywords || "";
+      if (ob.consent_use_demographics) ob.consent_use_demographics.checked = !!p.consent_use_demographics;
+    } catch {}
+  })();
+
+  // Profile modal wiring
+  const btnOpenProfile = $('#open-profile');
+  const btnCloseProf   = $('#profile-close');
+  const btnCancelProf  = $('#profile-cancel');
+  const btnReOnboard   = $('#profile-reonboard');
+  const profileForm    = $('#profile-form');
+
+  btnOpenProfile?.addEventListener("click", async () => {
+    openProfile();
+    try { await loadProfile(); } catch(e){ setProfStatus(e.message || "Could not load profile", true); }
+  });
+  btnCloseProf?.addEventListener("click", closeProfile);
+  btnCancelProf?.addEventListener("click", closeProfile);
+
+  btnReOnboard?.addEventListener("click", async () => {
+    try {
+      await loadProfile();
+      // copy values from profile -> onboarding form (if present)
+      const pf = $('#profile-form');
+      const ob = $('#onboard-form');
+      if (pf && ob){
+        ob.age_group.value  = pf.age_group.value;
+        ob.gender.value     = pf.gender.value;
+        ob.region.value     = pf.region.value;
+        ob.style_keywords.value = pf.style_keywords.value;
+        ob.consent_use_demographics.checked = pf.consent_use_demographics.checked;
+      }
+    } catch {}
+    closeProfile();
+    openOnboarding();
+  });
+
+  profileForm?.addEventListener("submit", async (e) => {
+    e.preventDefault();
+    setProfStatus("Saving…");
+    try {
+      const payload = formToJson(profileForm);
+      payload.onboarded = true; // treat edits as onboarded
+      await saveProfile(payload);
+      setProfStatus("Saved!");
+      setTimeout(closeProfile, 400);
+    } catch (err) {
+      setProfStatus(err.message || "Save failed.", true);
+    }
+  });
+
+  // Chat / Image mode toggle + submit
+  let mode = "chat";
+  const btnChat  = $('#mode-chat');
+  const btnImage = $('#mode-image');
+  const chatForm = $('#chat-form');
+  const input    = chatForm?.querySelector("input");
+
+  btnChat?.addEventListener("click", () => {
+    mode = "chat";
+    btnChat.classList.add("bg-[#1A237E]","text-white");
+    btnChat.classList.remove("bg-gray-100","text-gray-700");
+    btnImage?.classList.add("bg-gray-100","text-gray-700");
+    btnImage?.classList.remove("bg-[#1A237E]","text-white");
+  });
+  btnImage?.addEventListener("click", () => {
+    mode = "image";
+    btnImage.classList.add("bg-[#1A237E]","text-white");
+    btnImage.classList.remove("bg-gray-100","text-gray-700");
+    btnChat?.classList.add("bg-gray-100","text-gray-700");
+    btnChat?.classList.remove("bg-[#1A237E]","text-white");
+  });
+
+  chatForm?.addEventListener("submit", async (e) => {
+    e.preventDefault();
+    const message = (input?.value || "").trim();
+    if (!message) return;
+
+    chatBox?.insertAdjacentHTML("beforeend", `
+      <div class="self-end bg-white border border-gray-200 px-5 py-3 rounded-2xl shadow-sm text-gray-800 max-w-[80%]">
+        ${escapeHtml(message)}
+      </div>
+    `);
+    if (input) input.value = "";
+
+    const typingId = showTypingIndicator(chatBox);
+
+    try {
+      const endpoint = mode === "chat" ? `${URLS.chatAi}?stream=1` : URLS.generateVision;
+      const payload  = mode === "chat" ? { message } : { vision: message, size: "1024x1024" };
+      const headers  = { "Content-Type": "application/json" };
+      if (mode === "chat" && window.CSRF_TOKEN) headers["X-CSRFToken"] = window.CSRF_TOKEN;
+
+      const res  = await fetch(endpoint, { method: "POST", headers, body: JSON.stringify(payload) });
+      const isStream = (res.headers.get("Content-Type") || "").startsWith("text/event-stream");
+      const data = isStream ? {} : await res.json().catch(() => ({}));
+
+      const showError = (errMsg) => {
+        chatBox?.insertAdjacentHTML("beforeend", `
+          <div class="self-start bg-red-50 text-red-700 px-4 py-3 rounded-2xl border border-red-200 max-w-[90%]">
+            <strong>Whoops.</strong> ${escapeHtml(errMsg)}
+          </div>
+        `);
+        chatBox?.lastElementChild?.scrollIntoView({ behavior: "smooth" });
+      };
+
+      if (!res.ok){
+        removeTypingIndicator(typingId);
+        showError(data?.error || `Request failed (${res.status})`);
+        return;
+      }
+
+      if (mode === "chat"){
+        // Paint tokens as they arrive; repaint at most once per frame
+        let reply = "", el = null, queued = false, streamError = null;
+        const paint = () => {
+          queued = false;
+          el.innerHTML = renderMarkdownish(reply);
+          el.scrollIntoView({ behavior: "auto", block: "end" });
+        };
+        const onToken = (event, payload) => {
+          if (event === "error"){ streamError = payload.error || "Stream interrupted"; return; }
+          if (event === "done") reply = payload.reply ?? reply;
+          else if (payload.delta) reply += payload.delta;
+          if (!el){
+            removeTypingIndicator(typingId);
+            const bubbleId = "ai-" + Date.now();
+            chatBox?.insertAdjacentHTML("beforeend", `
+              <div id="${bubbleId}" class="self-start bg-[#1A237E] px-5 py-3 rounded-2xl text-white max-w-[80%] shadow space-y-2"></div>
+            `);
+            el = document.getElementById(bubbleId);
+          }
+          if (!queued){ queued = true; requestAnimationFrame(paint); }
+        };
+
+        if (isStream) await readEventStream(res, onToken);
+        else onToken("done", { reply: data.reply || "" });
+
+        removeTypingIndicator(typingId);
+        if (streamError){ showError(streamError); return; }
+      } else {
+        // 202 + status_url: the image is generated by a background worker (200 = cache hit)
+        let job = data;
+        try {
+          if (data.status_url && data.status !== "done") job = await waitForVision(data.status_url);
+        } catch (err){
+          removeTypingIndicator(typingId);
+          showError(err.message || "Image generation failed.");
+          return;
+        }
+        removeTypingIndicator(typingId);
+        if (job.status === "failed"){ showError(job.error || "Image generation failed."); return; }
+
+        let src = null;
+        if (job.image_url) src = job.image_url;
+        else if (job.image_b64) src = `data:image/png;base64,${job.image_b64}`;
+        else if (job.image_file) src = job.image_file.startsWith("/") ? job.image_file : `/${job.image_file}`;
+
+        if (src){
+          chatBox?.insertAdjacentHTML("beforeend", `
+            <div class="self-start bg-white px-5 py-3 rounded-2xl text-gray-800 max-w-[95%] shadow">
+              <p class="mb-2">✨ Here’s your vision:</p>
+              ${visionPicture(job, src)}
+            </div>
+          `);
+        } else {
+          chatBox?.insertAdjacentHTML("beforeend", `
+            <div class="self-start bg-red-50 text-red-700 px-4 py-3 rounded-2xl border border-red-200 max-w-[90%]">
+              Sorry—couldn’t render an image. Check console for details.
+            </div>
+          `);
+          console.error("No renderable image in response:", job);
+        }
+      }
+
+      chatBox?.lastElementChild?.scrollIntoView({ behavior: "smooth" });
+    } catch (err){
+      console.error(err);
+      removeTypingIndicator(typingId);
+      chatBox?.insertAdjacentHTML("beforeend", `
+        <div class="self-start bg-red-50 text-red-700 px-4 py-3 rounded-2xl border border-red-200 max-w-[90%]">
+          Network error. Please try again.
+        </div>
+      `);
+      chatBox?.lastElementChild?.scrollIntoView({ behavior: "smooth" });
+    }
+  });
+});
@@ -0,0 +1,23 @@
+# myApp/storage.py
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    collectstatic writes content-hashed copies (workshop.3f2a….js) plus .gz and
+    .br versions; WhiteNoise serves the hashed names with
+    "Cache-Control: max-age=315360000, immutable" and the compressed file the
+    browser accepts.
+
+    A name the manifest doesn't know (collectstatic not rerun after adding a
+    file, or a file that doesn't exist) falls back to its plain URL instead of
+    raising ValueError and turning every page that links it into a 500.
+    """
+
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
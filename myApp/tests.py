@@ -1,3 +1,1267 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import io
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace as NS
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models.functions import Lower
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    backends, checks, clients, exports, jobs, mailer, memory, metrics, profiles, quotas, resilience, startup, variants,
+    views, vision_cache,
+)
+from .middleware import GZipMiddleware
+from .models import ChatMessage, Conversation, MailJob, Profile, Vision
+from .singleflight import FileLock, SingleFlight
+from .storage import StaticFilesStorage
+from .stubs import StubServer, use_stubs
+
+
+# what settings pick with a shared cache (pair with use_shared_cache)
+CACHED_AUTH = override_settings(SESSION_ENGINE=checks.CACHED_SESSIONS,
+                                AUTHENTICATION_BACKENDS=[checks.CACHED_BACKEND, "django.contrib.auth.backends.ModelBackend"])
+
+
+def use_shared_cache(test):
+    """Point the default cache at a file cache (what every worker would see) for the rest of the test."""
+    location = tempfile.mkdtemp(prefix="psi-cache-")
+    test.addCleanup(shutil.rmtree, location, True)
+    shared = override_settings(CACHES={**settings.CACHES, "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location}})
+    shared.enable()
+    test.addCleanup(shared.disable)
+
+
+def profile_queries(ctx):
+    """SQL from ctx that touched the Profile table."""
+    return [q["sql"] for q in ctx.captured_queries if "myapp_profile" in q["sql"].lower()]
+
+
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("ana", "ana@example.com", "pw-12345")
+
+    def test_signup_creates_profile(self):
+        self.assertTrue(Profile.objects.filter(user=self.user).exists())
+
+    def test_login_does_not_touch_profile(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(reverse("login"), {"username": "ana", "password": "pw-12345"})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(profile_queries(ctx), [])
+
+    @CACHED_AUTH
+    def test_workshop_reads_profile_from_cache(self):
+        use_shared_cache(self)
+        self.client.force_login(self.user)
+        self.client.get(reverse("workshop"))  # warm (already warm from signup's write-through)
+        # session, user and profile all come from the cache
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse("workshop"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.context["should_onboard"])
+
+    def test_login_then_workshop(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse("login"), {"username": "ana", "password": "pw-12345"})
+            self.client.get(reverse("workshop"))
+        self.assertEqual(profile_queries(ctx), [])
+        # auth + session + last_login + session reload/user; nothing per-profile
+        sql = [q["sql"] for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+        self.assertLessEqual(len(sql), 7)
+
+    def test_cold_cache_loads_once(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("workshop"))
+            self.client.get(reverse("workshop"))
+        self.assertEqual(len(profile_queries(ctx)), 1)
+
+    def test_save_refreshes_cache(self):
+        use_shared_cache(self)
+        self.client.force_login(self.user)
+        resp = self.client.post(
+            reverse("profile_save"),
+            json.dumps({"region": "europe", "onboarded": True}),
+            content_type="application/json",
+        )
+        self.assertEqual(resp.status_code, 200)
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(reverse("profile_get")).json()
+        self.assertEqual(profile_queries(ctx), [])
+        self.assertEqual(data["profile"]["region"], "europe")
+        self.assertTrue(data["profile"]["onboarded"])
+
+    def test_missing_profile_created_lazily(self):
+        Profile.objects.filter(user=self.user).delete()
+        self.assertIsNone(cache.get(profiles.cache_key(self.user.pk)))
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("profile_get")).status_code, 200)
+        self.assertTrue(Profile.objects.filter(user=self.user).exists())
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        use_shared_cache(self)
+        self.user = User.objects.create_user("ben", "ben@example.com", "pw-12345")
+        self.client.force_login(self.user)
+
+    def test_profile_not_modified(self):
+        first = self.client.get(reverse("profile_get"))
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("ETag", first)
+        self.assertIn("Last-Modified", first)
+        with CaptureQueriesContext(connection) as ctx:
+            again = self.client.get(reverse("profile_get"), HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(profile_queries(ctx), [])
+
+    def test_profile_etag_changes_on_save(self):
+        etag = self.client.get(reverse("profile_get"))["ETag"]
+        self.client.post(reverse("profile_save"), json.dumps({"region": "oceania"}), content_type="application/json")
+        resp = self.client.get(reverse("profile_get"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["profile"]["region"], "oceania")
+
+    def test_vision_history_not_modified_until_new_vision(self):
+        url = reverse("vision_list")
+        etag = self.client.get(url)["ETag"]
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertFalse(any("myapp_vision" in q["sql"].lower() for q in ctx.captured_queries))
+        self.assertNotEqual(self.client.get(url + "?limit=5")["ETag"], etag)
+
+        Vision.objects.create(user=self.user, prompt="a lighthouse", status=Vision.DONE)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()["results"]), 1)
+
+
+class LocalCacheConditionalGetTests(TestCase):
+    """Per-process locmem: another process's writes never reach this cache, so the validators read the DB."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("bea", "bea@example.com", "pw-12345")
+        self.client.force_login(self.user)
+
+    def test_vision_finished_elsewhere_is_not_served_304(self):
+        url = reverse("vision_list")
+        vision = Vision.objects.create(user=self.user, prompt="a bridge", status=Vision.RUNNING)
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # what run_vision_workers does in its own process: no signal reaches this cache
+        Vision.objects.filter(pk=vision.pk).update(status=Vision.DONE, finished_at=timezone.now())
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([v["job_id"] for v in resp.json()["results"]], [vision.pk])
+
+    def test_profile_saved_elsewhere_is_not_served_304(self):
+        etag = self.client.get(reverse("profile_get"))["ETag"]
+        Profile.objects.filter(user=self.user).update(region="africa", updated_at=timezone.now())
+        resp = self.client.get(reverse("profile_get"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["profile"]["region"], "africa")
+        self.assertEqual(self.client.get(reverse("profile_get"), HTTP_IF_NONE_MATCH=resp["ETag"]).status_code, 304)
+
+
+class VisionHistoryPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("nia", "nia@example.com", "pw-12345")
+        self.client.force_login(self.user)
+
+    def make(self, n, at=None):
+        visions = Vision.objects.bulk_create([Vision(user=self.user, prompt=f"p{i}", status=Vision.DONE) for i in range(n)])
+        if at is not None:
+            Vision.objects.filter(user=self.user).update(created_at=at)
+        return visions
+
+    def page(self, **params):
+        resp = self.client.get(reverse("vision_list"), params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_pages_split_equal_timestamps_without_gaps_or_repeats(self):
+        visions = self.make(5, at=timezone.now())  # same created_at: the pk breaks the tie
+        Vision.objects.create(user=self.user, prompt="queued", status=Vision.QUEUED)
+        seen, cursor = [], None
+        while True:
+            data = self.page(limit=2, **({"cursor": cursor} if cursor else {}))
+            seen += [v["job_id"] for v in data["results"]]
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted((v.pk for v in visions), reverse=True))
+
+    def test_invalid_cursor_and_limit_are_rejected(self):
+        url = reverse("vision_list")
+        for cursor in ("!!!", "bm90LWEtY3Vyc29y", base64.urlsafe_b64encode(b"2024-01-01T00:00:00|x").decode()):
+            resp = self.client.get(url, {"cursor": cursor})
+            self.assertEqual(resp.status_code, 400, cursor)
+            self.assertEqual(resp.json()["error"], "Invalid cursor.")
+        self.assertEqual(self.client.get(url, {"limit": "ten"}).status_code, 400)
+
+    def test_limit_is_clamped(self):
+        self.make(views.VISION_PAGE_MAX + 1)
+        self.assertEqual(len(self.page(limit=0)["results"]), 1)
+        data = self.page(limit=10_000)
+        self.assertEqual(len(data["results"]), views.VISION_PAGE_MAX)
+        self.assertIsNotNone(data["next_cursor"])
+        self.assertEqual(len(self.page()["results"]), views.VISION_PAGE_SIZE)
+
+
+def sse_frames(body):
+    """[(event or None, data dict)] from a text/event-stream body."""
+    frames = []
+    for raw in body.decode().split("\n\n"):
+        if raw.strip():
+            fields = dict(line.split(": ", 1) for line in raw.splitlines())
+            frames.append((fields.get("event"), json.loads(fields["data"])))
+    return frames
+
+
+@override_settings(VISION_JOBS={"IN_PROCESS": False})
+class AsyncViewTests(TestCase):
+    """The views converted for ASGI workers, driven through AsyncClient (and login_required)."""
+
+    VIEWS = ("save_onboarding", "chat_ai", "generate_vision", "profile_get", "profile_save")
+
+    def setUp(self):
+        cache.clear()
+        resilience.OPENAI_CHAT.reset()
+        self.user = User.objects.create_user("quin", "quin@example.com", "pw-12345")
+
+    def post(self, name, body):
+        return self.async_client.post(reverse(name), json.dumps(body), content_type="application/json")
+
+    def test_views_stay_coroutines_under_their_decorators(self):
+        for name in self.VIEWS:
+            self.assertTrue(asyncio.iscoroutinefunction(getattr(views, name)), name)
+
+    async def test_signed_out_requests_are_redirected_to_login(self):
+        for name in ("save_onboarding", "generate_vision", "profile_save"):
+            resp = await self.post(name, {})
+            self.assertEqual(resp.status_code, 302, name)
+            self.assertTrue(resp["Location"].startswith(settings.LOGIN_URL), name)
+        self.assertEqual((await self.async_client.get(reverse("profile_get"))).status_code, 302)
+
+    async def test_signed_in_smoke(self):
+        await self.async_client.aforce_login(self.user)
+        resp = await self.post("save_onboarding",
+                               {"region": "asia", "style_keywords": "warm", "consent_use_demographics": "yes"})
+        self.assertEqual(resp.json()["profile"]["region"], "asia")
+        profile = await Profile.objects.aget(user=self.user)
+        self.assertTrue(profile.onboarded and profile.consent_use_demographics)
+
+        self.assertEqual((await self.post("profile_save", {"gender": "female"})).json(), {"ok": True})
+        resp = await self.async_client.get(reverse("profile_get"))
+        self.assertEqual(resp.json()["profile"]["gender"], "female")
+
+        with StubServer(latency=0, chat_tokens=2) as stub, use_stubs(stub):
+            self.assertEqual((await self.post("chat_ai", {"message": "hi"})).json(), {"reply": "word0 word1"})
+        resp = await self.post("generate_vision", {"vision": "a windmill"})
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(resp.json()["status"], Vision.QUEUED)
+
+    def test_chat_under_wsgi_gets_a_client_per_request_loop(self):
+        # the sync Client runs each async view on a fresh async_to_sync loop, as wsgi.py does
+        with StubServer(latency=0, chat_tokens=2) as stub, use_stubs(stub):
+            for message in ("first", "second", "third"):
+                resp = self.client.post(reverse("chat_ai"), json.dumps({"message": message}),
+                                        content_type="application/json")
+                self.assertEqual(resp.json(), {"reply": "word0 word1"})
+        self.assertEqual(stub.calls["/v1/chat/completions"], 3)  # no retries behind a closed loop
+        self.assertEqual([ok for _, ok in resilience.OPENAI_CHAT._calls], [True] * 3)
+
+
+class ChatStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        resilience.OPENAI_CHAT.reset()
+
+    async def stream(self, message):
+        resp = await self.async_client.post("/chat-ai/?stream=1", json.dumps({"message": message}),
+                                            content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        self.assertEqual(resp["Cache-Control"], "no-cache")
+        return sse_frames(b"".join([chunk async for chunk in resp.streaming_content]))
+
+    async def test_deltas_then_done(self):
+        with StubServer(latency=0, chat_tokens=4) as stub, use_stubs(stub):
+            frames = await self.stream("hello")
+        *deltas, done = frames
+        self.assertEqual([event for event, _ in deltas], [None] * 4)
+        self.assertEqual("".join(data["delta"] for _, data in deltas), "word0 word1 word2 word3 ")
+        self.assertEqual(done, ("done", {"reply": "word0 word1 word2 word3"}))
+
+    async def test_breaker_counts_one_outcome_per_stream(self):
+        breaker = resilience.OPENAI_CHAT
+        with StubServer(latency=0, chat_tokens=3) as stub, use_stubs(stub):
+            await self.stream("hello")
+        self.assertEqual([ok for _, ok in breaker._calls], [True])
+
+        async def broken_stream():
+            yield NS(choices=[NS(delta=NS(content="half "))])
+            raise asyncio.TimeoutError()  # retryable: the upstream stalled mid-stream
+
+        async def create(**kwargs):
+            return broken_stream()
+
+        fake = NS(chat=NS(completions=NS(create=create)))
+        breaker.reset()
+        with mock.patch.dict(clients._clients, {"openai_async": fake}):
+            frames = await self.stream("hello again")
+        self.assertEqual([event for event, _ in frames], [None, "error"])
+        self.assertEqual([ok for _, ok in breaker._calls], [False])
+
+    async def test_upstream_failure_is_an_error_event(self):
+        with StubServer(latency=0) as stub, use_stubs(stub):
+            stub.fail_next(1, 400)  # not retryable
+            frames = await self.stream("hello")
+        self.assertEqual(len(frames), 1)
+        event, data = frames[0]
+        self.assertEqual(event, "error")
+        self.assertTrue(data["error"])
+
+
+class StubResend(BaseHTTPRequestHandler):
+    """Local stand-in for api.resend.com: 429 (Retry-After) on the first call, then accepts."""
+    calls = []
+    lock = threading.Lock()
+    fail_first = 1
+    batch_status = 200
+    bad_addresses = set()  # single sends to these get a 422
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.lock:
+            self.calls.append((self.path, body, time.monotonic()))
+            throttled = len(self.calls) <= self.fail_first
+        if throttled:
+            return self._reply(429, {"message": "slow down"}, {"Retry-After": "0.2"})
+        if self.path == "/emails/batch" and self.batch_status != 200:
+            return self._reply(self.batch_status, {"message": "nope"})
+        if self.path == "/emails/batch":
+            return self._reply(200, {"data": [{"id": str(i)} for i in range(len(body))]})
+        if set(body["to"]) & self.bad_addresses:
+            return self._reply(422, {"message": "invalid `to` field"})
+        return self._reply(200, {"id": "x"})
+
+    def _reply(self, status, data, headers=None):
+        raw = json.dumps(data).encode()
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+class BulkMailTests(TransactionTestCase):
+    def setUp(self):
+        StubResend.calls = []
+        StubResend.fail_first = 1
+        StubResend.batch_status = 200
+        StubResend.bad_addresses = set()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubResend)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def client_for_stub(self, rate=50):
+        return mailer.ResendClient("re_test", base_url=self.base_url, limiter=mailer.RateLimiter(rate), max_retries=3)
+
+    def payloads(self, n):
+        return [{"from": "psi@example.com", "to": [f"u{i}@example.com"], "subject": "hi", "text": "hi"} for i in range(n)]
+
+    def test_batches_and_retries_after_429(self):
+        job = MailJob.objects.create(subject="hi", total=250)
+        with self.settings(RESEND={"BATCH_SIZE": 100, "CONCURRENCY": 3}):
+            mailer.run_job(job.pk, self.payloads(250), client=self.client_for_stub())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.sent, job.failed), (MailJob.DONE, 250, 0))
+        paths = [c[0] for c in StubResend.calls]
+        self.assertEqual(paths, ["/emails/batch"] * 4)  # 3 batches + one retried after the 429
+        self.assertEqual(sorted(len(c[1]) for c in StubResend.calls[1:]), [50, 100, 100])
+
+    def test_falls_back_to_single_sends(self):
+        StubResend.fail_first = 0
+        StubResend.batch_status = 404
+        sent, failed, errors = mailer.send_bulk(self.client_for_stub(), self.payloads(5), batch_size=5, concurrency=2)
+        self.assertEqual((sent, failed, errors), (5, 0, []))
+        self.assertEqual([c[0] for c in StubResend.calls].count("/emails"), 5)
+
+    def test_rejected_batch_fails_only_bad_recipients(self):
+        StubResend.fail_first = 0
+        StubResend.batch_status = 422
+        StubResend.bad_addresses = {"u2@example.com"}
+        sent, failed, errors = mailer.send_bulk(self.client_for_stub(), self.payloads(10), batch_size=5, concurrency=2)
+        self.assertEqual((sent, failed), (9, 1))
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith("u2@example.com:"))
+        paths = [c[0] for c in StubResend.calls]
+        self.assertEqual(paths.count("/emails/batch"), 2)  # still tries batches for each chunk
+        self.assertEqual(paths.count("/emails"), 10)
+
+    def test_stale_running_job_is_marked_failed(self):
+        stale = MailJob.objects.create(subject="hi", total=10, sent=4)
+        fresh = MailJob.objects.create(subject="hi", total=10)
+        MailJob.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        with self.settings(RESEND={"STALE_AFTER": 600}):
+            self.assertEqual(mailer.fail_stale(), 1)
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale.status, stale.sent), (MailJob.FAILED, 4))
+        self.assertIsNotNone(stale.finished_at)
+        self.assertEqual(fresh.status, MailJob.RUNNING)
+
+    def test_rate_limit_is_shared(self):
+        StubResend.fail_first = 0
+        started = time.monotonic()
+        mailer.send_bulk(self.client_for_stub(rate=10), self.payloads(15), batch_size=1, concurrency=8)
+        # burst of 10, then 10/s for the remaining 5
+        self.assertGreaterEqual(time.monotonic() - started, 0.45)
+
+
+class AttendeeImportTests(TestCase):
+    def test_admin_upload_bulk_creates_and_skips_duplicates(self):
+        admin_user = User.objects.create_superuser("root", "root@example.com", "pw-12345")
+        User.objects.create_user("taken", "dup@example.com", "pw-12345")
+        lines = [
+            {"username": "amy", "email": "amy@example.com", "region": "europe", "age_group": "30s"},
+            {"email": "bo@example.com", "gender": "made-up"},
+            {"username": "taken", "email": "new@example.com"},
+            {"username": "carl", "email": "dup@EXAMPLE.com"},
+            {"username": "amy", "email": "amy2@example.com"},
+        ]
+        upload = SimpleUploadedFile("people.jsonl", "\n".join(json.dumps(r) for r in lines).encode())
+        self.client.force_login(admin_user)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(reverse("admin:auth_user_import_attendees"), {"file": upload})
+        self.assertEqual(resp.status_code, 302)
+
+        self.assertEqual(sorted(User.objects.values_list("username", flat=True)),
+                         ["amy", "bo@example.com", "root", "taken"])
+        amy = User.objects.get(username="amy")
+        self.assertFalse(amy.has_usable_password())
+        self.assertEqual((amy.profile.region, amy.profile.age_group), ("europe", "30s"))
+        self.assertEqual(User.objects.get(username="bo@example.com").profile.gender, "")
+        user_inserts = [q for q in ctx.captured_queries if q["sql"].startswith('INSERT INTO "auth_user"')]
+        self.assertEqual(len(user_inserts), 1)
+
+
+    def test_command_writes_temp_passwords(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        source, out = os.path.join(tmp, "people.csv"), os.path.join(tmp, "passwords.csv")
+        with open(source, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["username", "email", "password", "region"])
+            writer.writerows([
+                ["dee", "dee@example.com", "", "africa"],
+                ["eli", "eli@example.com", "own-pass-123", ""],
+                ["", "fay@example.com", "", ""],
+                ["", "", "", ""],  # no username or email: invalid
+            ])
+        stdout = io.StringIO()
+        call_command("import_attendees", source, "--temp-passwords", out, "--hash-workers", "2", stdout=stdout)
+
+        self.assertIn("Created 3 of 4 rows (0 duplicates, 1 invalid)", stdout.getvalue())
+        with open(out, newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ["username", "password"])
+        self.assertEqual([r[0] for r in rows[1:]], ["dee", "fay@example.com"])
+        for username, password in rows[1:]:
+            self.assertTrue(User.objects.get(username=username).check_password(password))
+        self.assertTrue(User.objects.get(username="eli").check_password("own-pass-123"))
+        self.assertEqual(User.objects.get(username="dee").profile.region, "africa")
+
+
+class SetBasedAdminTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_superuser("root", "root@example.com", "pw-12345")
+        self.client.force_login(self.admin_user)
+
+    def make_users(self, n, start=0):
+        users = User.objects.bulk_create([User(username=f"u{start + i}") for i in range(n)])
+        Profile.objects.bulk_create([Profile(user=u, onboarded=True) for u in users[: n // 2]])  # half lack one
+        return users
+
+    def run_action(self):
+        ids = User.objects.exclude(pk=self.admin_user.pk).values_list("pk", flat=True)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(reverse("admin:auth_user_changelist"), {
+                "action": "require_onboarding_again",
+                "_selected_action": list(ids),
+            })
+        self.assertEqual(resp.status_code, 302)
+        return len(ctx)
+
+    def test_require_onboarding_again_is_constant_queries(self):
+        self.make_users(4)
+        few = self.run_action()
+        self.make_users(60, start=100)
+        many = self.run_action()
+        self.assertEqual(few, many)
+        self.assertEqual(Profile.objects.exclude(user=self.admin_user).count(), 64)
+        self.assertFalse(Profile.objects.filter(onboarded=True).exclude(user=self.admin_user).exists())
+
+    def test_changelist_preloads_profiles(self):
+        self.make_users(4)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("admin:auth_user_changelist"))
+        few = len(ctx)
+        self.make_users(40, start=100)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("admin:auth_user_changelist"))
+        self.assertEqual(few, len(ctx))
+
+
+class EmailLoginTests(TestCase):
+    def test_email_login_is_case_insensitive_and_picks_one_duplicate(self):
+        older = User.objects.create_user("first", "Same@Example.com", "pw-first")
+        User.objects.create_user("second", "same@example.com", "pw-second")
+        resp = self.client.post(reverse("login"), {"username": "SAME@example.com", "password": "pw-first"})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(int(self.client.session["_auth_user_id"]), older.pk)
+
+    @skipUnless(connection.vendor == "sqlite", "plan text is backend-specific")
+    def test_email_lookup_uses_index(self):
+        qs = User.objects.annotate(email_lower=Lower("email")).filter(email_lower="dee@example.com")
+        self.assertIn("auth_user_email_lower_idx", qs.explain())
+
+
+class MetricsTests(TestCase):
+    def test_requests_and_phases_show_up_on_metrics(self):
+        user = User.objects.create_user("eve", "eve@example.com", "pw-12345")
+        self.client.force_login(user)
+        self.client.get(reverse("profile_get"))
+        with metrics.timer("cloudinary_upload"):
+            pass
+        body = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('psi_http_request_duration_seconds_count{view="profile_get",method="GET",status="200"}', body)
+        self.assertIn('psi_db_queries_per_request_count{view="profile_get"}', body)
+        self.assertIn('psi_upstream_duration_seconds_count{phase="cloudinary_upload"}', body)
+
+    def test_token_required_when_configured(self):
+        with self.settings(METRICS={"TOKEN": "s3cret"}):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+            resp = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret")
+            self.assertEqual(resp.status_code, 200)
+
+    def test_slow_request_logs_breakdown(self):
+        with self.settings(METRICS={"SLOW_REQUEST_MS": 0.001}), self.assertLogs("myApp.metrics", "WARNING") as logs:
+            self.client.get(reverse("login"))
+        self.assertIn("Slow request GET /login/ (login)", logs.output[0])
+
+
+class StubServerTests(TestCase):
+    def test_chat_and_vision_render_against_stubs(self):
+        # signed out: under the sync client a signed-in chat summarizes on a thread, outside the test transaction
+        with StubServer(latency=0.01, chat_tokens=5, image_kb=16) as stub, use_stubs(stub):
+            reply = self.client.post("/chat-ai/", json.dumps({"message": "hi"}), content_type="application/json").json()
+            result, stats = jobs.render_vision("a red kite", "1024x1024", None)
+        self.assertEqual(reply["reply"], "word0 word1 word2 word3 word4")
+        self.assertTrue(result["secure_url"].startswith(stub.url))
+        self.assertGreater(result["bytes"], 16 * 1024)
+        self.assertEqual(stub.calls["/v1/images/generations"], 1)
+
+
+@override_settings(VISION_JOBS={"IN_PROCESS": False, "STALE_AFTER": 60, "MAX_ATTEMPTS": 2})
+class VisionJobQueueTests(TestCase):
+    def setUp(self):
+        caches["visions"].clear()
+        resilience.OPENAI_IMAGE.reset()
+        self.user = User.objects.create_user("mo", "mo@example.com", "pw-12345")
+
+    def job(self, prompt, status=Vision.QUEUED, **fields):
+        return Vision.objects.create(user=self.user, prompt=prompt, status=status, meta={"size": "1024x1024"}, **fields)
+
+    def ago(self, seconds):
+        return timezone.now() - timedelta(seconds=seconds)
+
+    def test_claim_next_takes_the_oldest_once(self):
+        first, second = self.job("one"), self.job("two")
+        claimed = jobs.claim_next()
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts), (first.pk, Vision.RUNNING, 1))
+        self.assertIsNotNone(claimed.started_at)
+        self.assertEqual(jobs.claim_next().pk, second.pk)
+        self.assertIsNone(jobs.claim_next())
+
+    def test_max_running_caps_claims(self):
+        running = self.job("busy", Vision.RUNNING, started_at=timezone.now())
+        queued = self.job("waiting")
+        with self.settings(VISION_JOBS={"MAX_RUNNING": 1}):
+            self.assertIsNone(jobs.claim_next())
+            Vision.objects.filter(pk=running.pk).update(status=Vision.DONE)
+            self.assertEqual(jobs.claim_next().pk, queued.pk)
+            self.assertIsNone(jobs.claim_next())
+        self.assertEqual(Vision.objects.get(pk=queued.pk).status, Vision.RUNNING)
+
+    def test_requeue_stale_retries_then_gives_up(self):
+        retry = self.job("retry me", Vision.RUNNING, started_at=self.ago(120), attempts=1)
+        dead = self.job("gave up", Vision.RUNNING, started_at=self.ago(120), attempts=2)
+        busy = self.job("still going", Vision.RUNNING, started_at=self.ago(10), attempts=1)
+        self.assertEqual(jobs.requeue_stale(), 1)
+        statuses = dict(Vision.objects.values_list("pk", "status"))
+        self.assertEqual(statuses, {retry.pk: Vision.QUEUED, dead.pk: Vision.FAILED, busy.pk: Vision.RUNNING})
+        self.assertEqual(Vision.objects.get(pk=dead.pk).error, "Worker timed out.")
+
+    def test_in_process_sweep_runs_after_restart_then_throttles(self):
+        stale = self.job("orphan", Vision.RUNNING, started_at=self.ago(120), attempts=1)
+        self.assertTrue(jobs.looks_abandoned(stale))
+        jobs._last_sweep = None  # a fresh process
+        self.assertEqual(jobs.sweep(), 1)
+        Vision.objects.filter(pk=stale.pk).update(status=Vision.RUNNING)
+        self.assertEqual(jobs.sweep(), 0)  # again within SWEEP_INTERVAL
+        self.assertFalse(jobs.looks_abandoned(self.job("fresh")))
+
+    def test_run_workers_once_against_stubs(self):
+        stale = self.job("orphaned kite", Vision.RUNNING, started_at=self.ago(120), attempts=1)
+        fresh, _ = jobs.enqueue(self.user, "a paper boat", "1024x1024", None)
+        with StubServer(latency=0, image_kb=8) as stub, use_stubs(stub):
+            stub.fail_next(1, 500)  # retried inside the job (myApp/resilience.py)
+            call_command("run_vision_workers", "--once")
+        for vision in Vision.objects.filter(pk__in=[stale.pk, fresh.pk]):
+            self.assertEqual(vision.status, Vision.DONE, vision.error)
+            self.assertTrue(vision.meta["image_url"].startswith(stub.url))
+            self.assertIsNotNone(vision.meta["latency_ms"]["total_ms"])
+        self.assertEqual(Vision.objects.get(pk=stale.pk).attempts, 2)
+        self.assertEqual(stub.calls["/v1/images/generations"], 3)
+
+    def test_crash_inside_a_job_is_retried_then_failed_and_drain_goes_on(self):
+        crashing, fine = self.job("crashes"), self.job("fine")  # no prompt_key: straight to _generate
+
+        def generate(vision):
+            if vision.pk == crashing.pk:
+                raise DatabaseError("disk I/O error")
+            vision.status = Vision.DONE
+            vision.save(update_fields=["status"])
+            return vision
+
+        with mock.patch.object(jobs, "_generate", side_effect=generate) as gen, \
+                self.assertLogs("myApp.jobs", "ERROR") as logs:
+            jobs.drain()
+        crashing.refresh_from_db()
+        self.assertEqual((crashing.status, crashing.attempts), (Vision.FAILED, 2))  # MAX_ATTEMPTS
+        self.assertEqual(crashing.error, "disk I/O error")
+        self.assertIsNotNone(crashing.finished_at)
+        self.assertEqual(Vision.objects.get(pk=fine.pk).status, Vision.DONE)
+        self.assertEqual(gen.call_count, 3)
+        self.assertEqual(len([line for line in logs.output if "crashed" in line]), 2)
+
+    def test_upstream_rejection_fails_the_job(self):
+        vision, _ = jobs.enqueue(self.user, "something not allowed", "1024x1024", None)
+        with StubServer(latency=0) as stub, use_stubs(stub), self.assertLogs("myApp.jobs", "ERROR"):
+            stub.fail_next(1, 400)  # not retryable
+            jobs.drain()
+        vision.refresh_from_db()
+        self.assertEqual(vision.status, Vision.FAILED)
+        self.assertIn("stub fault 400", vision.error)
+        self.assertIsNotNone(vision.finished_at)
+        self.assertEqual(stub.calls["/v1/images/generations"], 1)
+        self.assertIsNone(jobs.claim_next())
+
+
+@override_settings(VISION_JOBS={"IN_PROCESS": False})
+class VisionResultCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["visions"].clear()
+        self.user = User.objects.create_user("oli", "oli@example.com", "pw-12345")
+        self.client.force_login(self.user)
+
+    def generate(self, **body):
+        return self.client.post("/generate-vision/", json.dumps(body), content_type="application/json")
+
+    def test_prompt_key_normalizes_case_and_whitespace(self):
+        key = vision_cache.prompt_key("A  Lighthouse at dawn ", "1024x1024", None)
+        self.assertEqual(key, vision_cache.prompt_key("a lighthouse\tat DAWN", "1024x1024", None))
+        self.assertNotEqual(key, vision_cache.prompt_key("a lighthouse at dawn", "1536x1024", None))
+        self.assertNotEqual(key, vision_cache.prompt_key("a lighthouse at dawn", "1024x1024", "white"))
+
+    def test_hit_records_a_vision_without_calling_upstream(self):
+        with StubServer(latency=0, image_kb=8) as stub, use_stubs(stub):
+            self.assertEqual(self.generate(vision="A lighthouse at dawn").status_code, 202)
+            jobs.drain()
+            calls = dict(stub.calls)
+            caches["visions"].clear()  # the indexed prompt_key answers too
+            resp = self.generate(vision="  a LIGHTHOUSE at dawn")
+            self.assertEqual(stub.calls, calls)  # no OpenAI, no Cloudinary
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertTrue(data["cached"])
+        original = Vision.objects.get(prompt="A lighthouse at dawn")
+        copy = Vision.objects.get(pk=data["job_id"])
+        self.assertNotEqual(copy.pk, original.pk)
+        self.assertEqual((copy.status, str(copy.image)), (Vision.DONE, str(original.image)))
+        self.assertTrue(copy.meta["cached"])
+        self.assertEqual(data["image_url"], original.meta["image_url"])
+
+    def test_regenerate_bypasses_the_cache(self):
+        done = Vision.objects.create(user=self.user, prompt="a kite", status=Vision.DONE, image="psi-vision/k",
+                                     prompt_key=vision_cache.prompt_key("a kite", "1024x1024", None),
+                                     meta={"image_url": "https://res.cloudinary.com/demo/image/upload/v1/k.png"})
+        self.assertEqual(self.generate(vision="a kite").json()["cached"], True)
+        resp = self.generate(vision="a kite", regenerate=True)
+        self.assertEqual(resp.status_code, 202)
+        queued = Vision.objects.get(pk=resp.json()["job_id"])
+        self.assertNotEqual(queued.pk, done.pk)
+        self.assertEqual((queued.status, queued.meta.get("regenerate")), (Vision.QUEUED, True))
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(QUOTAS={"ENABLED": False})
+    async def test_identical_chats_in_flight_share_one_upstream_call(self):
+        body = json.dumps({"message": "What should my vision board say?"})
+        with StubServer(latency=0.3, chat_tokens=3) as stub, use_stubs(stub):
+            responses = await asyncio.gather(*(
+                self.async_client.post("/chat-ai/", body, content_type="application/json") for _ in range(8)
+            ))
+        self.assertEqual({r.json()["reply"] for r in responses}, {"word0 word1 word2"})
+        self.assertEqual(stub.calls["/v1/chat/completions"], 1)
+
+    def run_threads(self, flight, fn, n=6):
+        results, barrier = [], threading.Barrier(n)
+
+        def call():
+            barrier.wait()
+            try:
+                results.append(flight.do("k", fn))
+            except Exception as e:
+                results.append(e)
+        threads = [threading.Thread(target=call) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_threads_share_the_leader_result(self):
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.2)
+            return "image"
+        results = self.run_threads(SingleFlight("test", cross_process=False), fn)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [("image", False)] + [("image", True)] * 5)
+
+    def test_leader_exception_reaches_every_follower(self):
+        boom = RuntimeError("upstream down")
+
+        def fn():
+            time.sleep(0.2)
+            raise boom
+        flight = SingleFlight("test", cross_process=False)
+        self.assertEqual(self.run_threads(flight, fn), [boom] * 6)
+        self.assertEqual(flight.do("k", lambda: "recovered"), ("recovered", False))  # the failed flight is gone
+
+    def lock_path(self):
+        path = os.path.join(tempfile.mkdtemp(prefix="psi-flight-"), "k.lock")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), True)
+        return path
+
+    def crashed_holder(self, path):
+        """Leave a two-minute-old lock file whose process has exited."""
+        proc = subprocess.Popen([sys.executable, "-c", ""])
+        proc.wait()
+        with open(path, "w") as f:
+            f.write(f"{socket.gethostname()}:{proc.pid}:gone")
+        os.utime(path, (time.time() - 120, time.time() - 120))
+
+    def test_stale_lock_file_is_broken(self):
+        path = self.lock_path()
+        held = FileLock(path)
+        self.assertTrue(held.acquire())
+        self.assertFalse(FileLock(path, timeout=0.1, stale_after=60).acquire())  # live holder: wait, then give up
+        os.utime(path, (time.time() - 120, time.time() - 120))  # still running two minutes later: not stale
+        self.assertFalse(FileLock(path, timeout=0.1, stale_after=60).acquire())
+        self.crashed_holder(path)
+        started = time.monotonic()
+        self.assertTrue(FileLock(path, timeout=5, stale_after=60).acquire())
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_release_leaves_another_owners_lock(self):
+        path = self.lock_path()
+        old = FileLock(path)
+        self.assertTrue(old.acquire())
+        with open(path, "w") as f:
+            f.write("elsewhere:1:new-owner")  # broken as stale and taken over meanwhile
+        old.release()
+        self.assertTrue(os.path.exists(path))
+
+    def test_one_waiter_breaks_a_stale_lock(self):
+        path = self.lock_path()
+        self.crashed_holder(path)
+        start, won = threading.Barrier(8), []
+
+        def waiter():
+            lock = FileLock(path, timeout=0.5, stale_after=60, poll=0.01)
+            start.wait()
+            if lock.acquire():
+                won.append(lock)
+        threads = [threading.Thread(target=waiter) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(won), 1)
+        with open(path) as f:
+            self.assertEqual(f.read(), won[0].token)
+        self.assertEqual(os.listdir(os.path.dirname(path)), ["k.lock"])  # nothing left aside
+
+
+@override_settings(CHAT_MEMORY={"CONTEXT_TOKENS": 100, "SUMMARIZE_AT": 150, "KEEP_RECENT": 60, "SUMMARY_TOKENS": 50})
+class ChatMemoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        resilience.OPENAI_CHAT.reset()
+        self.user = User.objects.create_user("pia", "pia@example.com", "pw-12345")
+
+    def test_context_stays_within_the_token_budget(self):
+        conversation = Conversation.objects.create(user=self.user, summary="Pia wants to open a bakery.")
+        ChatMessage.objects.bulk_create([
+            ChatMessage(conversation=conversation, role="user" if i % 2 == 0 else "assistant",
+                        content=f"turn {i} " + "words " * 20, tokens=memory.estimate_tokens(f"turn {i} " + "words " * 20))
+            for i in range(40)
+        ])
+        messages = async_to_sync(memory.abuild_context)(conversation, "system prompt", "what next?")
+        turns = messages[2:-1]
+        self.assertEqual(messages[1]["content"], "Conversation so far: Pia wants to open a bakery.")
+        self.assertEqual(messages[-1], {"role": "user", "content": "what next?"})
+        self.assertLessEqual(sum(memory.estimate_tokens(m["content"]) for m in turns), 100)
+        self.assertTrue(turns[-1]["content"].startswith("turn 39 "))  # the newest turns are the ones kept
+        self.assertGreater(len(turns), 1)
+
+    async def chat(self, text):
+        resp = await self.async_client.post("/chat-ai/", json.dumps({"message": text}), content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()["reply"]
+
+    async def test_long_chat_is_summarized_and_reset_forgets_it(self):
+        # async client: one event loop for every turn, as under uvicorn
+        await self.async_client.aforce_login(self.user)
+        with StubServer(latency=0, chat_tokens=10) as stub, use_stubs(stub):  # ~36 tokens per turn
+            for i in range(4):
+                await self.chat(f"Tell me about step {i} of my plan")
+            conversation = await Conversation.objects.aget(user=self.user)
+            self.assertEqual((conversation.summary, stub.calls["/v1/chat/completions"]), ("", 4))
+            await self.chat("Tell me about step 4 of my plan")  # unsummarized turns now pass SUMMARIZE_AT
+            await asyncio.gather(*views._background)  # the summary runs after the reply went out
+        await conversation.arefresh_from_db()
+        self.assertEqual(stub.calls["/v1/chat/completions"], 6)  # the reply + one summary call
+        self.assertTrue(conversation.summary.startswith("word0"))
+        recent = conversation.messages.filter(id__gt=conversation.summarized_through)
+        self.assertEqual([role async for role in recent.order_by("id").values_list("role", flat=True)],
+                         ["user", "assistant"])
+        self.assertLessEqual(sum([t async for t in recent.values_list("tokens", flat=True)]), 60)
+        self.assertEqual(await conversation.messages.acount(), 10)
+
+        resp = await self.async_client.post(reverse("chat_reset"))
+        self.assertEqual(resp.json(), {"ok": True})
+        self.assertFalse(await Conversation.objects.filter(user=self.user).aexists())
+        self.assertFalse(await ChatMessage.objects.filter(conversation__user=self.user).aexists())
+
+
+    async def test_json_reply_does_not_wait_for_the_summary(self):
+        await self.async_client.aforce_login(self.user)
+        release = asyncio.Event()
+
+        async def slow_summary(*args):
+            await release.wait()
+            return True
+
+        with StubServer(latency=0, chat_tokens=3) as stub, use_stubs(stub), \
+                mock.patch.object(memory, "amaybe_summarize", slow_summary):
+            self.assertEqual(await asyncio.wait_for(self.chat("hello"), 5), "word0 word1 word2")
+            self.assertEqual(len(views._background), 1)  # still summarizing
+            release.set()
+            await asyncio.gather(*views._background)
+        self.assertFalse(views._background)
+
+
+class StreamingImageDecodeTests(TestCase):
+    def test_extract_b64_across_any_chunk_boundaries(self):
+        png = b"\x89PNG" + os.urandom(5000)
+        doc = json.dumps({"created": 1, "data": [{"b64_json": base64.b64encode(png).decode()}],
+                          "usage": {"total_tokens": 7}}).encode()
+        for size in (1, 3, 7, 64, 4096, len(doc)):
+            chunks = (doc[i:i + size] for i in range(0, len(doc), size))
+            parsed, image = jobs._extract_b64(chunks)
+            self.assertEqual(image.read(), png)
+            self.assertEqual(parsed["usage"], {"total_tokens": 7})
+            self.assertEqual(parsed["data"][0]["b64_json"], "")
+
+    def test_url_response_has_no_image_file(self):
+        doc = json.dumps({"data": [{"url": "https://example.com/a.png"}]}).encode()
+        parsed, image = jobs._extract_b64([doc])
+        self.assertIsNone(image)
+        self.assertEqual(parsed["data"][0]["url"], "https://example.com/a.png")
+
+
+class ClientRegistryTests(TestCase):
+    def test_sync_openai_and_cloudinary_reuse_connections(self):
+        before = clients.stats()
+        with StubServer(latency=0, chat_tokens=3, image_kb=4) as stub, use_stubs(stub):
+            for i in range(5):
+                clients.openai().chat.completions.create(model="stub", messages=[{"role": "user", "content": str(i)}])
+            for i in range(3):
+                jobs.render_vision(f"kite {i}", "1024x1024", None)
+        after = clients.stats()
+
+        def delta(name, key):
+            return after[name][key] - before.get(name, {}).get(key, 0)
+
+        self.assertEqual(delta("openai", "requests"), 8)
+        self.assertEqual(delta("openai", "connections"), 1)
+        self.assertEqual(delta("cloudinary", "requests"), 3)
+        self.assertEqual(delta("cloudinary", "connections"), 1)
+
+    def test_counters_are_exported(self):
+        clients.REQUESTS.inc("example")
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn('psi_upstream_requests_total{client="example"}', body)
+        self.assertIn("psi_upstream_connections_total", body)
+
+
+class QuotaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(QUOTAS={"CHAT_PER_IP": "2/min", "CHAT_GLOBAL": ""})
+    def test_anonymous_chat_is_limited_per_ip(self):
+        def post(ip):
+            return self.client.post("/chat-ai/", json.dumps({"message": ""}), content_type="application/json",
+                                    REMOTE_ADDR=ip)
+
+        self.assertEqual([post("10.0.0.1").status_code for _ in range(3)], [400, 400, 429])
+        resp = post("10.0.0.1")
+        self.assertTrue(1 <= int(resp["Retry-After"]) <= 60)
+        self.assertEqual(resp.json()["retry_after"], int(resp["Retry-After"]))
+        self.assertEqual(post("10.0.0.2").status_code, 400)  # another client has its own bucket
+
+    def test_daily_image_quota_comes_from_the_profile(self):
+        user = User.objects.create_user("gil", "gil@example.com", "pw-12345")
+        profile = Profile.objects.get(user=user)
+        profile.daily_image_quota = 1
+        profile.save()
+        self.client.force_login(user)
+        quotas.record(user.pk, "images")
+        resp = self.client.post("/generate-vision/", json.dumps({"vision": "a harbour"}), content_type="application/json")
+        self.assertEqual(resp.status_code, 429)
+        self.assertIn("Retry-After", resp)
+        self.assertEqual(user.daily_usage.get().images, 1)
+
+        profile.daily_image_quota = 2
+        profile.save()
+        cache.delete(quotas.usage_key("images", user.pk, timezone.localdate()))  # row is the source of truth
+        self.assertEqual(async_to_sync(quotas.aused)(user.pk, "images", timezone.localdate()), 1)
+
+    @override_settings(VISION_JOBS={"IN_PROCESS": False})
+    def test_duplicate_vision_click_is_charged_once(self):
+        user = User.objects.create_user("ivo", "ivo@example.com", "pw-12345")
+        self.client.force_login(user)
+        first, second = (
+            self.client.post("/generate-vision/", json.dumps({"vision": "a red kite"}), content_type="application/json")
+            for _ in range(2)
+        )
+        self.assertEqual((first.status_code, second.status_code), (202, 202))
+        self.assertEqual(first.json()["job_id"], second.json()["job_id"])
+        self.assertEqual(user.daily_usage.get().images, 1)
+        self.assertEqual(async_to_sync(quotas.aused)(user.pk, "images", timezone.localdate()), 1)
+
+    def test_parallel_reservations_stop_at_the_daily_limit(self):
+        user = User.objects.create_user("uma", "uma@example.com", "pw-12345")
+        Profile.objects.filter(user=user).update(daily_image_quota=3)
+        profile = Profile.objects.get(user=user)
+
+        class Request:
+            async def aprofile(self):
+                return profile
+
+        async def burst():
+            return await asyncio.gather(*(quotas.areserve(Request(), user, "images") for _ in range(6)))
+
+        denied = [r for r in async_to_sync(burst)() if r is not None]
+        self.assertEqual(len(denied), 3)
+        self.assertEqual(denied[0].status_code, 429)
+        self.assertEqual(async_to_sync(quotas.aused)(user.pk, "images", timezone.localdate()), 3)
+
+    def test_daily_quota_holds_across_workers_with_local_caches(self):
+        user = User.objects.create_user("vic", "vic@example.com", "pw-12345")
+        Profile.objects.filter(user=user).update(daily_image_quota=2)
+        profile = Profile.objects.get(user=user)
+        workers = {name: LocMemCache(f"worker-{name}", {}) for name in "ab"}  # one per process
+
+        class Request:
+            async def aprofile(self):
+                return profile
+
+        def spend(worker):
+            with mock.patch.object(quotas, "cache", workers[worker]):
+                denied = async_to_sync(quotas.areserve)(Request(), user, "images")
+                if denied is None:
+                    quotas.record(user.pk, "images", reserved=True)
+                return denied is None
+
+        self.assertTrue(spend("a"))
+        self.assertEqual([spend("b"), spend("b")], [True, False])  # b starts from the row: 1 used
+        # a's own counter still says 1, but only until it is re-read from the row
+        later = time.time() + quotas.LOCAL_TTL + 1
+        with mock.patch("django.core.cache.backends.locmem.time", NS(time=lambda: later)):
+            self.assertFalse(spend("a"))
+        self.assertEqual(user.daily_usage.get().images, 2)
+
+    def test_hit_admits_exactly_the_limit_under_contention(self):
+        rate, admitted = (50, 60), []
+
+        def worker():
+            admitted.extend(1 for _ in range(20) if not quotas.hit("bench", "x", rate, now=120.0))
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(admitted), 50)
+
+
+class ResilienceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        resilience.OPENAI_CHAT.reset()
+
+    def chat(self):
+        return self.client.post("/chat-ai/", json.dumps({"message": "hello"}), content_type="application/json")
+
+    def test_retryable_error_is_retried(self):
+        with StubServer(latency=0, chat_tokens=2) as stub, use_stubs(stub):
+            stub.fail_next(1, 503)
+            resp = self.chat()
+        self.assertEqual(resp.json(), {"reply": "word0 word1"})
+        self.assertEqual(stub.calls["/v1/chat/completions"], 2)
+
+    @override_settings(RESILIENCE={"MAX_ATTEMPTS": 1, "BREAKER_MIN_CALLS": 2, "BREAKER_COOLDOWN": 0.3})
+    def test_breaker_opens_fails_fast_and_recovers(self):
+        with StubServer(latency=0, chat_tokens=2) as stub, use_stubs(stub):
+            stub.fail_next(2, 500)
+            self.assertEqual([self.chat().status_code for _ in range(2)], [503, 503])
+            resp = self.chat()  # open: answered without calling upstream
+            self.assertEqual(resp.status_code, 503)
+            self.assertIn("temporarily unavailable", resp.json()["error"])
+            self.assertIn("Retry-After", resp)
+            self.assertEqual(stub.calls["/v1/chat/completions"], 2)
+            self.assertIn('psi_circuit_state{breaker="openai_chat"} 2', metrics.render())
+
+            time.sleep(0.35)  # cooldown over: one probe goes through and closes it
+            self.assertEqual(self.chat().status_code, 200)
+        self.assertEqual(resilience.OPENAI_CHAT.state, resilience.CLOSED)
+
+    @override_settings(RESILIENCE={"CHAT_BUDGET": 0.5, "CHAT_ATTEMPT_TIMEOUT": 0.5})
+    def test_slow_upstream_hits_the_deadline(self):
+        with StubServer(latency=0, slow_rate=1.0, slow_latency=2.0) as stub, use_stubs(stub):
+            started = time.monotonic()
+            resp = self.chat()
+        self.assertEqual(resp.status_code, 504)
+        self.assertLess(time.monotonic() - started, 1.5)
+
+    def test_hedged_call_takes_the_first_answer(self):
+        calls = []
+
+        async def fn(timeout):
+            calls.append(timeout)
+            await asyncio.sleep(1.0 if len(calls) == 1 else 0.01)
+            return len(calls)
+
+        async def run():
+            return await resilience.acall(resilience.OPENAI_CHAT, fn, budget=5, attempt_timeout=5, hedge_after=0.05)
+
+        started = time.monotonic()
+        self.assertEqual(async_to_sync(run)(), 2)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+
+class ImageVariantTests(TestCase):
+    URL = "https://res.cloudinary.com/demo/image/upload/v17/psi-vision/abc.png"
+
+    def test_variant_url_splices_the_transformation(self):
+        self.assertEqual(variants.variant_url(self.URL, 640, "webp"),
+                         "https://res.cloudinary.com/demo/image/upload/c_limit,q_auto,w_640/v17/psi-vision/abc.webp")
+        self.assertIsNone(variants.variant_url("https://example.com/a.png", 640, "webp"))
+        self.assertEqual(variants.build(None), {})
+
+    def test_status_api_returns_srcsets_even_for_older_rows(self):
+        user = User.objects.create_user("hal", "hal@example.com", "pw-12345")
+        self.client.force_login(user)
+        vision = Vision.objects.create(user=user, prompt="p", status=Vision.DONE, image="psi-vision/abc",
+                                       meta={"image_url": self.URL, "width": 1024, "height": 1024})
+        data = self.client.get(reverse("vision_status", args=[vision.pk])).json()
+        self.assertEqual(data["image_url"], self.URL)
+        self.assertTrue(data["thumb_url"].endswith("/c_limit,q_auto,w_320/v17/psi-vision/abc.webp"))
+        self.assertEqual(data["srcset"]["avif"].count("w,") + 1, len(variants.WIDTHS))
+        self.assertIn(" 1024w", data["srcset"]["webp"])
+
+
+@CACHED_AUTH
+class CachedAuthTests(TestCase):
+    def setUp(self):
+        use_shared_cache(self)
+        self.user = User.objects.create_user("ivy", "ivy@example.com", "pw-12345")
+
+    def test_authenticated_hot_path_runs_no_queries(self):
+        self.client.post(reverse("login"), {"username": "ivy", "password": "pw-12345"})
+        for name in ("workshop", "profile_get"):
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+
+    def test_cold_cache_falls_back_to_the_database_once(self):
+        self.client.force_login(self.user)
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("profile_get"))
+        self.assertEqual(len(ctx), 3)  # session, user, profile
+        with self.assertNumQueries(0):
+            self.client.get(reverse("profile_get"))
+
+    def test_password_change_and_deactivation_take_effect(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("profile_get"))
+        self.user.set_password("pw-67890")
+        self.user.save()
+        self.assertIsNone(cache.get(backends.cache_key(self.user.pk))._password)
+        self.assertEqual(self.client.get(reverse("profile_get")).status_code, 302)  # session hash no longer matches
+
+        self.client.force_login(self.user)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse("profile_get")).status_code, 302)
+
+    def test_refused_on_per_process_cache(self):
+        self.assertEqual(checks.check_shared_cache(None), [])
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            self.assertEqual([e.id for e in checks.check_shared_cache(None)], ["myApp.E001", "myApp.E002"])
+
+
+class StaticBundleTests(TestCase):
+    def test_workshop_links_bundles_and_is_compressed(self):
+        user = User.objects.create_user("jo", "jo@example.com", "pw-12345")
+        self.client.force_login(user)
+        resp = self.client.get(reverse("workshop"), headers={"accept-encoding": "gzip"})
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        html = self.client.get(reverse("workshop")).content.decode()
+        self.assertIn("myApp/workshop.", html)
+        self.assertNotIn("function escapeHtml", html)  # the JS lives in the static bundle now
+        self.assertLess(len(html), 24_000)
+
+    def test_event_streams_are_not_gzipped(self):
+        request = RequestFactory().get("/", headers={"accept-encoding": "gzip"})
+        stream = StreamingHttpResponse(iter([b"data: hi\n\n"] * 50), content_type="text/event-stream")
+        page = HttpResponse(b"<p>hello</p>" * 50)
+        middleware = GZipMiddleware(lambda r: None)
+        self.assertFalse(middleware.process_response(request, stream).has_header("Content-Encoding"))
+        self.assertEqual(middleware.process_response(request, page)["Content-Encoding"], "gzip")
+
+    def test_unknown_static_names_fall_back_instead_of_raising(self):
+        storage = StaticFilesStorage(location="/nonexistent")  # no manifest there
+        self.assertEqual(storage.url("img/favicon.ico"), "/static/img/favicon.ico")
+
+
+class StartupBudgetTests(TestCase):
+    def test_boot_stays_within_budget(self):
+        # fresh interpreter: django.setup() + URLconf, against settings.STARTUP
+        result = startup.measure()
+        self.assertEqual(startup.over_budget(result), [], result)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user("kim", "kim@example.com", "pw-12345", is_staff=True)
+        self.user = User.objects.create_user("lee", "lee@example.com", "pw-12345")
+        Profile.objects.filter(user=self.user).update(region="europe", onboarded=True)
+        self.old = Vision.objects.create(user=self.user, prompt="last year", status=Vision.DONE)
+        Vision.objects.filter(pk=self.old.pk).update(created_at=timezone.now() - timedelta(days=400))
+        self.new = Vision.objects.create(user=self.user, prompt='a "quoted", prompt', status=Vision.DONE)
+
+    def test_staff_only(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("export")).status_code, 302)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse("export"), {"format": "xml"}).status_code, 400)
+
+    async def test_csv_streams_under_asgi_with_date_window(self):
+        await self.async_client.aforce_login(self.staff)
+        resp = await self.async_client.get(reverse("export"), {"what": "visions", "since": date.today().isoformat()})
+        self.assertTrue(resp.streaming)
+        body = b"".join([chunk async for chunk in resp.streaming_content]).decode()
+        lines = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(lines[0], [name for name, _ in exports.VISION_COLUMNS])
+        self.assertEqual([row[0] for row in lines[1:]], [str(self.new.pk)])
+        self.assertEqual(lines[1][5], 'a "quoted", prompt')
+
+    def test_jsonl_profiles(self):
+        self.client.force_login(self.staff)
+        resp = self.client.get(reverse("export"), {"what": "profiles", "format": "jsonl"})
+        rows = [json.loads(line) for line in b"".join(resp.streaming_content).splitlines()]
+        lee = next(r for r in rows if r["username"] == "lee")
+        self.assertEqual((lee["region"], lee["onboarded"]), ("europe", True))
+        Vision.objects.filter(pk=self.new.pk).update(image="psi-vision/c")
+        resp = self.client.get(reverse("export"), {"format": "jsonl"})
+        rows = [json.loads(line) for line in b"".join(resp.streaming_content).splitlines()]
+        self.assertEqual(rows[-1]["public_id"], "psi-vision/c")
+
+    def test_zip_streams_images_and_lists_missing_ones(self):
+        with StubServer(latency=0, image_kb=64) as stub:
+            Vision.objects.filter(pk=self.new.pk).update(
+                image="psi-vision/a", meta={"image_url": f"{stub.url}/image/upload/v1/psi-vision/a.png"})
+            broken = Vision.objects.create(user=self.user, prompt="gone", status=Vision.DONE,
+                                           image="psi-vision/b", meta={"image_url": f"{stub.url}/nope/b.png"})
+            _, _, chunks = exports.stream("visions", "zip", since=date.today())
+            with self.assertLogs("myApp.exports", "WARNING"):
+                archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+        names = archive.namelist()
+        self.assertIn("profiles.csv", names)
+        self.assertEqual(len(archive.read(f"images/{self.new.pk}.png")), 64 * 1024)
+        self.assertIn(str(broken.pk), archive.read("missing_images.txt").decode())
+        self.assertNotIn(f"images/{broken.pk}.png", names)
+        self.assertNotIn(f"images/{self.old.pk}.png", names)
@@ -8,6 +8,7 @@ urlpatterns = [
     path("workshop/", views.workshop_view, name="workshop"),
 
     path("chat-ai/", views.chat_ai, name="chat_ai"),
+    path("chat-ai/reset/", views.chat_reset, name="chat_reset"),
     path("generate-vision/", views.generate_vision, name="generate_vision"),
     path("save-onboarding/", views.save_onboarding, name="save_onboarding"),
 
@@ -18,5 +19,9 @@ urlpatterns = [
 
     path("api/profile/", views.profile_get, name="profile_get"),
     path("api/profile/save/", views.profile_save, name="profile_save"),
+    path("api/visions/", views.vision_list, name="vision_list"),
+    path("api/visions/<int:pk>/", views.vision_status, name="vision_status"),
+    path("export/", views.export_view, name="export"),
+    path("metrics", views.metrics_view, name="metrics"),
     path("", views.workshop_view, name="home"),
 ]
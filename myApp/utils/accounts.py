@@ -0,0 +1,228 @@
+# myApp/utils/accounts.py
+import csv
+import io
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils.crypto import get_random_string
+
+from ..models import Profile  # ensures type + for profile fields
+
+User = get_user_model()
+
+@transaction.atomic
+def create_attendee(username: str, email: str, *, temp_password: str | None = None,
+                    age_group: str = "", gender: str = "", region: str = ""):
+    """
+    Creates a User + ensures Profile.
+    Returns (user, plain_password_or_None) — don't store the plain password anywhere!
+    For more than a handful of people use import_attendees() below.
+    """
+    if temp_password is None:
+        # Short, readable, but random
+        temp_password = get_random_string(12)
+
+    user = User.objects.create_user(
+        username=username,
+        email=email,
+        password=temp_password,  # you can set unusable and send reset instead
+        is_active=True,
+    )
+
+    # The post_save signal created the Profile and cached it on user.profile
+    profile = user.profile
+    if age_group: profile.age_group = age_group
+    if gender:    profile.gender = gender
+    if region:    profile.region = region
+    profile.onboarded = False
+    profile.save()
+
+    return user, temp_password
+
+
+def find_user_by_email(email):
+    """
+    Case-insensitive email lookup that uses the LOWER(email) index
+    (migration 0008); email__iexact can't, so it scanned auth_user.
+    Emails aren't unique in auth.User: with duplicates, active accounts win,
+    then the oldest, so the same person always gets the same account.
+    """
+    email = (email or "").strip()
+    if not email:
+        return None
+    return (
+        User.objects.annotate(email_lower=Lower("email"))
+        .filter(email_lower=email.lower())
+        .order_by("-is_active", "pk")
+        .first()
+    )
+
+
+# ---------- bulk import ----------
+#
+# create_attendee costs a full password hash plus ~6 queries per person.
+# import_attendees streams rows in chunks and per chunk does: one query for
+# existing usernames/emails, password hashes (in parallel across processes
+# when run from the management command), one bulk INSERT for users and one
+# for profiles (bulk_create skips signals, so the profiles are created here).
+
+IMPORT_FIELDS = ("username", "email", "password", "first_name", "last_name", "age_group", "gender", "region")
+PROFILE_FIELDS = ("age_group", "gender", "region")
+_CHOICES = {
+    "age_group": {k for k, _ in Profile.AGE_GROUPS},
+    "gender": {k for k, _ in Profile.GENDER},
+    "region": {k for k, _ in Profile.REGION},
+}
+
+
+def read_rows(fileobj, fmt=None, name=""):
+    """Yield dict rows from a CSV (header row) or JSONL file, one at a time."""
+    fmt = fmt or ("jsonl" if name.lower().endswith((".jsonl", ".ndjson")) else "csv")
+    if isinstance(fileobj, (io.BufferedIOBase, io.RawIOBase)) or "b" in getattr(fileobj, "mode", ""):
+        fileobj = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    if fmt == "jsonl":
+        for line in fileobj:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(fileobj)
+
+
+def _clean(row):
+    data = {k: (str(row.get(k) or "")).strip() for k in IMPORT_FIELDS}
+    data["email"] = User.objects.normalize_email(data["email"])
+    if not data["username"]:
+        data["username"] = data["email"]
+    for f in PROFILE_FIELDS:  # bulk_create doesn't validate; drop unknown choices
+        if data[f] not in _CHOICES[f]:
+            data[f] = ""
+    return data
+
+
+def _init_hasher():
+    # spawn-based pools (macOS/Windows) start without Django configured
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _hash(password):
+    return make_password(password)
+
+
+def import_attendees(rows, *, chunk_size=500, hash_workers=1, temp_passwords=False,
+                     on_chunk=None, dry_run=False):
+    """
+    Create users + profiles from an iterable of dicts (see IMPORT_FIELDS).
+
+    Rows already present by username or email (in the DB or earlier in the
+    file) are skipped. Rows without a password get an unusable one, so they
+    sign in through the password-set email, unless temp_passwords=True, in
+    which case a random one is generated and handed back in `credentials`.
+
+    Returns stats: {"rows", "created", "skipped", "invalid", "seconds",
+    "rows_per_sec", "credentials": [(username, password), ...]}.
+    on_chunk(stats) is called after each chunk.
+
+    hash_workers > 1 hashes in a process pool. Only do that from a
+    single-threaded process (the management command): forking a threaded
+    web worker can copy a lock some other thread holds and deadlock the child.
+    """
+    stats = {"rows": 0, "created": 0, "skipped": 0, "invalid": 0, "credentials": []}
+    seen_usernames, seen_emails = set(), set()
+    started = time.perf_counter()
+
+    pool = None  # started on the first chunk that has passwords to hash
+    try:
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            stats["rows"] += len(chunk)
+
+            cleaned = []
+            for row in chunk:
+                data = _clean(row)
+                if not data["username"]:
+                    stats["invalid"] += 1
+                    continue
+                cleaned.append(data)
+
+            # one indexed lookup for the whole chunk (username unique + LOWER(email) index)
+            usernames = [d["username"] for d in cleaned]
+            emails = [d["email"].lower() for d in cleaned if d["email"]]
+            for username, email in User.objects.annotate(email_lower=Lower("email")).filter(
+                Q(username__in=usernames) | Q(email_lower__in=emails)
+            ).values_list("username", "email"):
+                seen_usernames.add(username)
+                if email:
+                    seen_emails.add(email.lower())
+
+            fresh = []
+            for data in cleaned:
+                email_key = data["email"].lower()
+                if data["username"] in seen_usernames or (email_key and email_key in seen_emails):
+                    stats["skipped"] += 1
+                    continue
+                seen_usernames.add(data["username"])
+                if email_key:
+                    seen_emails.add(email_key)
+                if not data["password"] and temp_passwords:
+                    data["password"] = get_random_string(12)
+                    stats["credentials"].append((data["username"], data["password"]))
+                fresh.append(data)
+
+            to_hash = [d["password"] for d in fresh if d["password"]] if not dry_run else []
+            if hash_workers > 1 and len(to_hash) > 1:
+                if pool is None:
+                    pool = ProcessPoolExecutor(max_workers=hash_workers, initializer=_init_hasher)
+                hashed = iter(pool.map(_hash, to_hash, chunksize=max(1, len(to_hash) // (hash_workers * 4))))
+            else:
+                hashed = iter(map(_hash, to_hash))
+
+            users = []
+            for data in fresh:
+                password = next(hashed) if data["password"] and not dry_run else make_password(None)  # None = unusable
+                users.append(User(
+                    username=data["username"], email=data["email"], password=password,
+                    first_name=data["first_name"], last_name=data["last_name"], is_active=True,
+                ))
+
+            if users and not dry_run:
+                with transaction.atomic():
+                    created = User.objects.bulk_create(users)
+                    if any(u.pk is None for u in created):  # backends that can't return ids
+                        ids = dict(User.objects.filter(username__in=[u.username for u in created])
+                                   .values_list("username", "pk"))
+                        for u in created:
+                            u.pk = ids[u.username]
+                    Profile.objects.bulk_create([
+                        Profile(user_id=u.pk, onboarded=False,
+                                **{f: data[f] for f in PROFILE_FIELDS})
+                        for u, data in zip(created, fresh)
+                    ])
+            stats["created"] += len(users)
+
+            elapsed = time.perf_counter() - started
+            stats["seconds"] = round(elapsed, 2)
+            stats["rows_per_sec"] = round(stats["rows"] / elapsed, 1) if elapsed else 0.0
+            if on_chunk:
+                on_chunk(stats)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 2)
+    stats["rows_per_sec"] = round(stats["rows"] / elapsed, 1) if elapsed else 0.0
+    return stats
@@ -0,0 +1,56 @@
+# myApp/variants.py
+"""
+Responsive variants of generated images.
+
+The gallery and chat used to show the original PNG (1-3 MB) in a
+bubble a few hundred pixels wide. Now each upload asks Cloudinary for eager
+derivatives: AVIF and WebP at WIDTHS, quality "auto", never upscaled. The
+API returns them as srcsets, and the page picks the smallest one that fits.
+
+Variant URLs are the upload URL with a transformation spliced in, e.g.
+
+  .../image/upload/v17/psi-vision/abc.png
+  .../image/upload/c_limit,q_auto,w_640/v17/psi-vision/abc.webp
+
+That is the same string Cloudinary gives the eager derivative, so the
+browser gets the pre-built file. For images uploaded before this change,
+Cloudinary builds the variant on first request and caches it.
+"""
+WIDTHS = (320, 640, 1024)
+FORMATS = ("avif", "webp")
+THUMB_WIDTH = 320
+MEDIUM_WIDTH = 640
+SIZES = "(max-width: 640px) 95vw, 640px"  # chat bubble / gallery card width
+
+# upload(..., eager=EAGER, eager_async=True): built in the background, the upload doesn't wait
+EAGER = [
+    {"width": w, "crop": "limit", "quality": "auto", "format": fmt}
+    for fmt in FORMATS
+    for w in WIDTHS
+]
+
+
+def variant_url(image_url, width, fmt):
+    """Cloudinary delivery URL for `image_url` at `width` (max) in `fmt`; None if it isn't a Cloudinary upload URL."""
+    head, sep, tail = (image_url or "").partition("/upload/")
+    if not sep:
+        return None
+    folder, _, name = tail.rpartition("/")
+    stem = name.rsplit(".", 1)[0]
+    path = f"{folder}/{stem}" if folder else stem
+    return f"{head}/upload/c_limit,q_auto,w_{width}/{path}.{fmt}"
+
+
+def build(image_url):
+    """{"thumb_url", "medium_url", "srcset": {fmt: "url 320w, ..."}, "sizes"} for an uploaded image, or {}."""
+    if not variant_url(image_url, THUMB_WIDTH, "webp"):
+        return {}
+    return {
+        "thumb_url": variant_url(image_url, THUMB_WIDTH, "webp"),
+        "medium_url": variant_url(image_url, MEDIUM_WIDTH, "webp"),
+        "srcset": {
+            fmt: ", ".join(f"{variant_url(image_url, w, fmt)} {w}w" for w in WIDTHS)
+            for fmt in FORMATS
+        },
+        "sizes": SIZES,
+    }
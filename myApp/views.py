@@ -1,24 +1,33 @@
-from django.contrib.auth import authenticate, login, logout
-from django.contrib.auth.decorators import login_required
-from django.shortcuts import render, redirect
-from django.http import HttpRequest, HttpResponse
-
-from django.contrib.auth import authenticate, login, get_user_model
-from django.db.models import Q
-
-import os
-import json
-from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
-from openai import OpenAI
-
 # myApp/views.py
+import asyncio
+import base64
+import hashlib
 import json
-from django.http import JsonResponse, HttpResponseBadRequest
-from django.views.decorators.http import require_POST
+import threading
+import traceback
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from .models import Profile
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.db.models import Q
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.utils.dateparse import parse_date
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
+from django.views.decorators.http import require_http_methods, require_POST
+
+from . import clients, exports, jobs, memory, metrics, quotas, resilience
+from .conditional import conditional, profile_version, visions_version
+from .models import Vision
+from .singleflight import SingleFlight
+from .utils.accounts import find_user_by_email
 
 def _to_bool(v):
     if isinstance(v, bool):
@@ -30,7 +39,7 @@ def _to_bool(v):
 @login_required
 @require_POST
 @csrf_exempt
-def save_onboarding(request):
+async def save_onboarding(request):
     """
     Saves onboarding info to the user's Profile and marks them as onboarded.
     Expects JSON body like:
@@ -54,7 +63,7 @@ def save_onboarding(request):
     style_keywords = (data.get("style_keywords") or "").strip()
     consent = _to_bool(data.get("consent_use_demographics"))
 
-    profile, _ = Profile.objects.get_or_create(user=request.user)
+    profile = await request.aprofile()
     if age_group is not None:
         profile.age_group = age_group
     if gender is not None:
@@ -64,7 +73,7 @@ def save_onboarding(request):
     profile.style_keywords = style_keywords
     profile.consent_use_demographics = consent
     profile.onboarded = True
-    profile.save()
+    await profile.asave()
 
     return JsonResponse({
         "ok": True,
@@ -79,10 +88,6 @@ def save_onboarding(request):
     }, status=200)
 
 
-# ✅ create a client once and reuse it
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-
 def login_view(request):
     if request.user.is_authenticated:
         return redirect("workshop")
@@ -93,16 +98,15 @@ def login_view(request):
         password = request.POST.get("password", "")
 
         user = None
-        # Try username first
-        user = authenticate(request, username=ident, password=password)
-        if not user:
-            # Try resolving email → username
-            User = get_user_model()
-            try:
-                u = User.objects.get(Q(email__iexact=ident))
-                user = authenticate(request, username=u.get_username(), password=password)
-            except User.DoesNotExist:
-                user = None
+        match = None
+        if "@" in ident:
+            # email first: one indexed lookup + one password hash
+            match = find_user_by_email(ident)
+            if match is not None:
+                user = authenticate(request, username=match.get_username(), password=password)
+        if not user and (match is None or match.get_username() != ident):
+            # usernames may contain "@" too
+            user = authenticate(request, username=ident, password=password)
 
         if user:
             login(request, user)
@@ -114,17 +118,10 @@ def login_view(request):
     return render(request, "login.html", {"error": error})
 
 
-# myApp/views.py
-# views.py
-from django.contrib.auth.decorators import login_required
-from django.views.decorators.csrf import ensure_csrf_cookie
-from .models import Profile
-
 @ensure_csrf_cookie               # ensures the csrftoken cookie exists for your chat POST
 @login_required
 def workshop_view(request):
-    profile, _ = Profile.objects.get_or_create(user=request.user)
-    should_onboard = not bool(profile.onboarded)
+    should_onboard = not getattr(request.profile, "onboarded", False)
     return render(request, "workshop.html", {"should_onboard": should_onboard})
 
 
@@ -134,18 +131,204 @@ def logout_view(request: HttpRequest) -> HttpResponse:
 
 
 
-import os
-import openai
-from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
-import json
+# OpenAI calls go through clients.aopenai(): the async client for the running
+# event loop, built on first use (not at import) so worker boot doesn't pay for
+# it. One event loop keeps many calls in flight instead of pinning a worker
+# thread per request.
+
+CHAT_MODEL = "gpt-4o-mini"
+CHAT_SYSTEM_PROMPT = "You are PSI Vision AI, helping students clarify their bigger picture with supportive and inspiring dialogue."
+
+
+def _sse(payload, event=None) -> str:
+    """Format one Server-Sent Event frame (JSON data, optional event name)."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(payload)}\n\n"
+
+
+# Identical chat requests in flight at once (duplicate clicks, a room typing the
+# same question) share one completion. Replies are parked briefly in the default
+# cache so a leader in another worker can pick them up after waiting on the lock;
+# that needs a cache all workers share, so with per-process LocMemCache the
+# coalescing stays within the process.
+chat_flight = SingleFlight("chat", cross_process=not isinstance(caches["default"], LocMemCache))
+CHAT_SHARE_TTL = 30
+
+
+def _chat_key(messages):
+    raw = json.dumps([CHAT_MODEL, messages], sort_keys=True)
+    return "chat:reply:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _chat_error(e):
+    """What the browser sees when a chat call fails: friendly for upstream trouble (myApp/resilience.py)."""
+    handled = resilience.friendly(e)
+    return handled[1] if handled else str(e)
+
+
+async def _chat_event_stream(messages, on_reply=None):
+    """
+    Yields SSE frames as tokens arrive from OpenAI:
+      data: {"delta": "..."}            one per content chunk
+      event: done  / data: {"reply": ...}   full text once the model finishes
+      event: error / data: {"error": ...}   if the upstream call fails mid-way
+    Callers coalesced onto another request's completion get it as one delta.
+    on_reply(reply) is awaited after the done frame (conversation bookkeeping).
+    """
+    key = _chat_key(messages)
+    fut, leader = chat_flight.begin(key)
+    if not leader:
+        try:
+            reply = await asyncio.wrap_future(fut)
+        except Exception as e:
+            yield _sse({"error": _chat_error(e)}, event="error")
+            return
+        yield _sse({"delta": reply})
+        yield _sse({"reply": reply}, event="done")
+        if on_reply:
+            await on_reply(reply)
+        return
+
+    lock = None
+    parts = []
+    try:
+        lock = await sync_to_async(chat_flight.lock, thread_sensitive=False)(key)
+        shared = await cache.aget(key) if lock else None
+        if shared is not None:
+            chat_flight.finish(key, fut, result=shared)
+            reply = shared
+            yield _sse({"delta": reply})
+        else:
+            with metrics.timer("openai_chat_stream"):  # whole stream, first token to last
+                # deadline/retries/breaker cover opening the stream; once tokens flow there's no retry
+                stream = await resilience.acall(
+                    resilience.OPENAI_CHAT,
+                    lambda timeout: clients.aopenai().chat.completions.create(
+                        model=CHAT_MODEL,
+                        messages=messages,
+                        max_tokens=300,
+                        stream=True,
+                        timeout=timeout,
+                    ),
+                    budget=resilience.conf("CHAT_BUDGET"),
+                    attempt_timeout=resilience.conf("CHAT_ATTEMPT_TIMEOUT"),
+                    record_success=False,  # the call isn't over until the stream is
+                )
+                ok = None
+                try:
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            parts.append(delta)
+                            yield _sse({"delta": delta})
+                    ok = True
+                except Exception as e:
+                    ok = not resilience.retryable(e)
+                    raise
+                finally:
+                    # one outcome per call; none if the client went away mid-stream
+                    if ok is None:
+                        resilience.OPENAI_CHAT.cancelled()
+                    else:
+                        resilience.OPENAI_CHAT.record(ok)
+            reply = "".join(parts).strip()
+            if lock:
+                await cache.aset(key, reply, CHAT_SHARE_TTL)
+            chat_flight.finish(key, fut, result=reply)
+    except Exception as e:
+        chat_flight.finish(key, fut, exc=e)
+        yield _sse({"error": _chat_error(e)}, event="error")
+        return
+    finally:
+        if not fut.done():  # client disconnected mid-stream; release the waiters
+            chat_flight.finish(key, fut, exc=RuntimeError("Request cancelled."))
+        if lock:
+            lock.release()
+    yield _sse({"reply": reply}, event="done")
+    if on_reply:
+        # after "done" so the summary call (every few turns) never delays the reply
+        await on_reply(reply)
+
+
+@login_required
+@require_POST
+async def chat_reset(request):
+    """Forget the signed-in user's conversation (summary and turns)."""
+    user = await request.auser()
+    await memory.areset(user)
+    return JsonResponse({"ok": True})
+
+
+async def _chat_complete(messages):
+    """Non-streaming reply, coalesced the same way as the stream."""
+    key = _chat_key(messages)
+
+    async def complete():
+        # Call OpenAI (gpt-4o-mini for speed/cost; adjust if needed)
+        with metrics.timer("openai_chat"):
+            response = await resilience.acall(
+                resilience.OPENAI_CHAT,
+                lambda timeout: clients.aopenai().chat.completions.create(
+                    model=CHAT_MODEL,
+                    messages=messages,
+                    max_tokens=300,
+                    timeout=timeout,
+                ),
+                budget=resilience.conf("CHAT_BUDGET"),
+                attempt_timeout=resilience.conf("CHAT_ATTEMPT_TIMEOUT"),
+                hedge_after=resilience.conf("CHAT_HEDGE_AFTER"),
+            )
+        reply = response.choices[0].message.content.strip()
+        if chat_flight.cross_process:
+            await cache.aset(key, reply, CHAT_SHARE_TTL)
+        return reply
+
+    reply, _ = await chat_flight.ado(key, complete, recheck=lambda: cache.aget(key))
+    return reply
+
+
+_background = set()  # the loop only keeps weak references to its tasks
+
+
+def _after_response(request, afn):
+    """
+    Run afn() without holding up the response. Under ASGI that's a task on the
+    worker's loop. Under WSGI the request's loop closes, cancelling its tasks,
+    as soon as the view returns, so afn gets a thread and a loop of its own.
+    """
+    if isinstance(request, ASGIRequest):
+        task = asyncio.get_running_loop().create_task(afn())
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+    else:
+        threading.Thread(target=_run_detached, args=(afn,), name="after-response", daemon=True).start()
+
+
+def _run_detached(afn):
+    async def main():
+        try:
+            await afn()
+        finally:
+            await sync_to_async(close_old_connections)()
+
+    asyncio.run(main())
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
 @csrf_exempt
 @require_POST
-def chat_ai(request):
+@quotas.limited("chat")
+async def chat_ai(request):
+    """
+    JSON reply by default; with ?stream=1 (or {"stream": true} in the body) the
+    reply is sent as text/event-stream so the first tokens reach the browser
+    as soon as the model emits them.
+
+    Signed-in users get server-side memory (myApp/memory.py): the client only
+    sends the new message and the server adds a token-budgeted context.
+    Rate limits and the daily token quota are in myApp/quotas.py.
+    """
     try:
         data = json.loads(request.body)
         user_message = data.get("message", "")
@@ -153,70 +336,70 @@ def chat_ai(request):
         if not user_message:
             return JsonResponse({"error": "No message provided"}, status=400)
 
-        # Call OpenAI (gpt-4o-mini for speed/cost; adjust if needed)
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are PSI Vision AI, helping students clarify their bigger picture with supportive and inspiring dialogue."},
+        user = await request.auser()
+        conversation = None
+        if user.is_authenticated:
+            denied = await quotas.acheck_daily(request, user, "tokens")
+            if denied is not None:
+                return denied
+            conversation = await memory.aget_conversation(user)
+            messages = await memory.abuild_context(conversation, CHAT_SYSTEM_PROMPT, user_message)
+        else:
+            messages = [
+                {"role": "system", "content": CHAT_SYSTEM_PROMPT},
                 {"role": "user", "content": user_message},
-            ],
-            max_tokens=300
-        )
-
-        ai_message = response.choices[0].message.content.strip()
+            ]
+
+        async def remember(reply, summarize=True):
+            """Charge the tokens and store the turn; then fold old turns into the summary (a second call)."""
+            if conversation is None or not reply:
+                return
+            spent = sum(memory.estimate_tokens(m["content"]) for m in messages) + memory.estimate_tokens(reply)
+            await quotas.arecord(user.pk, "tokens", spent)
+            await memory.arecord_turn(conversation, user_message, reply)
+            if summarize:
+                await summarize_conversation()
+            else:
+                _after_response(request, summarize_conversation)
+
+        async def summarize_conversation():
+            try:
+                await memory.amaybe_summarize(conversation, clients.aopenai(), CHAT_MODEL)
+            except Exception:
+                traceback.print_exc()  # summary retried next turn; never fail the chat for it
+
+        if _to_bool(request.GET.get("stream")) or _to_bool(data.get("stream")):
+            resp = StreamingHttpResponse(_chat_event_stream(messages, on_reply=remember), content_type="text/event-stream")
+            resp["Cache-Control"] = "no-cache"
+            resp["X-Accel-Buffering"] = "no"  # stop nginx/Railway proxies from buffering the stream
+            return resp
+
+        ai_message = await _chat_complete(messages)
+        await remember(ai_message, summarize=False)  # as the stream does after "done": the reply doesn't wait
         return JsonResponse({"reply": ai_message})
 
     except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
-
-
-import os, json, base64, time, uuid
-from django.http import JsonResponse, HttpResponseBadRequest
-from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
-from openai import OpenAI
-
-import cloudinary
-from cloudinary.uploader import upload as cloudinary_upload
+        # open breaker / deadline / upstream overload -> 503/504 with a friendly message
+        return resilience.error_response(e) or JsonResponse({"error": str(e)}, status=500)
 
-# --- Cloudinary config: supports CLOUDINARY_URL OR separate vars ---
-def _ensure_cloudinary_config():
-    cfg = cloudinary.config()
-    if cfg.cloud_name:
-        return
-    url = os.getenv("CLOUDINARY_URL")
-    if url:
-        cloudinary.config(cloudinary_url=url, secure=True)
-        return
-    # separate env vars path (your case)
-    cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME")
-    api_key = os.getenv("CLOUDINARY_API_KEY")
-    api_secret = os.getenv("CLOUDINARY_API_SECRET")
-    if not all([cloud_name, api_key, api_secret]):
-        raise RuntimeError(
-            "Cloudinary env missing. Provide CLOUDINARY_URL or "
-            "CLOUDINARY_CLOUD_NAME / CLOUDINARY_API_KEY / CLOUDINARY_API_SECRET."
-        )
-    cloudinary.config(
-        cloud_name=cloud_name,
-        api_key=api_key,
-        api_secret=api_secret,
-        secure=True,
-    )
-
-# --- OpenAI client from env ---
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    organization=os.getenv("OPENAI_ORG_ID"),
-    project=os.getenv("OPENAI_PROJECT_ID"),
-)
 
 ALLOWED_SIZES = {"1024x1024", "1024x1536", "1536x1024", "auto"}
 ALLOWED_BACKGROUNDS = {None, "transparent", "white"}
 
+@login_required
 @csrf_exempt
 @require_POST
-def generate_vision(request):
+@quotas.limited("vision")
+async def generate_vision(request):
+    """
+    Queues an image generation and answers 202 straight away with a job id.
+    The image_url arrives via GET status_url (vision_status) once a worker
+    has generated and uploaded it (see myApp/jobs.py).
+
+    Prompts already generated (same normalized prompt/size/background) are
+    answered 200 from the result cache unless the body has "regenerate": true.
+    Those don't count against the daily image quota (myApp/quotas.py).
+    """
     try:
         try:
             data = json.loads(request.body.decode("utf-8"))
@@ -236,74 +419,131 @@ def generate_vision(request):
         if background not in ALLOWED_BACKGROUNDS:
             return JsonResponse({"error": f"Invalid background. Allowed: {sorted(ALLOWED_BACKGROUNDS)}"}, status=400)
 
-        # Generate with OpenAI (b64 is common)
-        gen_kwargs = {"model": "gpt-image-1", "prompt": prompt, "size": size, "n": 1}
-        if background:
-            gen_kwargs["background"] = background  # "transparent"|"white"
-        resp = client.images.generate(**gen_kwargs)
-
-        item = resp.data[0]
-        url = getattr(item, "url", None)
-        b64 = getattr(item, "b64_json", None)
-        if not (url or b64):
-            return JsonResponse({"error": "No image content returned from model."}, status=502)
-
-        # Cloudinary upload (bytes or remote URL)
-        _ensure_cloudinary_config()
-        public_id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
-        upload_source = base64.b64decode(b64) if b64 else url
-
-        upload_result = cloudinary_upload(
-            upload_source,
-            folder="psi-vision",        # your folder
-            public_id=public_id,        # final path: psi-vision/public_id
-            resource_type="image",
-            overwrite=True,
-            invalidate=True,
-            format="png",               # force PNG (keeps transparency)
-        )
-
-        secure_url = upload_result.get("secure_url")
-        if not secure_url:
-            return JsonResponse({"error": "Cloudinary upload failed.", "details": upload_result}, status=502)
-
+        user = await request.auser()
+        regenerate = _to_bool(data.get("regenerate"))
+        if not regenerate:
+            vision = await sync_to_async(jobs.from_cache)(user, prompt, size, background)
+            if vision is not None:
+                return JsonResponse({"ok": True, "cached": True, **_vision_json(vision)}, status=200)
+
+        if resilience.OPENAI_IMAGE.is_open():  # don't queue work that would fail
+            return resilience.error_response(resilience.CircuitOpen("openai_image", resilience.OPENAI_IMAGE.retry_after()))
+        denied = await quotas.areserve(request, user, "images")
+        if denied is not None:
+            return denied
+        try:
+            vision, created = await sync_to_async(jobs.enqueue)(user, prompt, size, background, regenerate=regenerate)
+        except Exception:
+            quotas.release(user.pk, "images")
+            raise
+        if created:
+            await quotas.arecord(user.pk, "images", reserved=True)
+        else:
+            quotas.release(user.pk, "images")  # the same pending job as the first click: charged once
         return JsonResponse(
             {
-                "prompt": prompt,
-                "image_url": secure_url,  # <- your frontend already uses this
-                "size": size,
-                "background": background,
-                "public_id": upload_result.get("public_id"),
+                "job_id": vision.pk,
+                "status": vision.status,
+                "status_url": reverse("vision_status", args=[vision.pk]),
             },
-            status=200,
+            status=202,
         )
 
     except Exception as e:
-        import traceback, sys
         traceback.print_exc()
-        etype, _, _ = sys.exc_info()
-        return JsonResponse({"etype": getattr(etype, "__name__", "Exception"), "error": str(e)}, status=500)
+        return JsonResponse({"etype": type(e).__name__, "error": str(e)}, status=500)
+
+
+def _vision_json(vision):
+    meta = vision.meta or {}
+    return {
+        "job_id": vision.pk,
+        "status": vision.status,
+        "prompt": vision.prompt,
+        "image_url": meta.get("image_url"),  # full-size original; show the variants below instead
+        "width": meta.get("width"),
+        "height": meta.get("height"),
+        "size": meta.get("size"),
+        "background": meta.get("background"),
+        "public_id": str(vision.image) if vision.image else None,
+        "created_at": vision.created_at.isoformat(),
+        "error": vision.error or None,
+        **vision.image_variants(),  # thumb_url, medium_url, srcset {avif, webp}, sizes
+    }
 
 
-from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_http_methods
-from django.http import JsonResponse
-from django.views.decorators.csrf import ensure_csrf_cookie
-import json
+@login_required
+@require_http_methods(["GET"])
+async def vision_status(request, pk):
+    """Poll target for a queued generation; image_url is set once status is "done"."""
+    user = await request.auser()
+    vision = await Vision.objects.filter(pk=pk, user=user).afirst()
+    if vision is None:
+        return JsonResponse({"ok": False, "error": "Not found."}, status=404)
+    if jobs.looks_abandoned(vision):
+        jobs.nudge()  # e.g. its worker was restarted mid-job; the drain puts it back in the queue
+    return JsonResponse({"ok": True, **_vision_json(vision)})
+
+
+VISION_PAGE_SIZE = 24
+VISION_PAGE_MAX = 100
+
+
+def _encode_cursor(vision):
+    raw = f"{vision.created_at.isoformat()}|{vision.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    ts, pk = raw.rsplit("|", 1)
+    return datetime.fromisoformat(ts), int(pk)
 
-from .models import Profile
 
-@ensure_csrf_cookie
 @login_required
-def workshop_view(request):
-    # keep your existing logic, just ensure the CSRF cookie is set
-    should_onboard = not getattr(getattr(request.user, "profile", None), "onboarded", False)
-    return render(request, "workshop.html", {"should_onboard": should_onboard})
+@require_http_methods(["GET"])
+@conditional(visions_version)
+async def vision_list(request):
+    """
+    The user's finished visions, newest first.
+    Keyset-paginated on (created_at, id) so every page is one range scan of
+    the (user, created_at) index no matter how deep the client pages:
+      GET api/visions/?limit=24            -> {"results": [...], "next_cursor": "..."}
+      GET api/visions/?cursor=<next_cursor>
+    Revalidated requests get 304 until a Vision of theirs changes.
+    """
+    try:
+        limit = min(max(int(request.GET.get("limit") or VISION_PAGE_SIZE), 1), VISION_PAGE_MAX)
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Invalid limit."}, status=400)
+
+    user = await request.auser()
+    qs = Vision.objects.filter(user=user, status=Vision.DONE).order_by("-created_at", "-pk")
+
+    cursor = request.GET.get("cursor")
+    if cursor:
+        try:
+            ts, pk = _decode_cursor(cursor)
+        except (ValueError, UnicodeDecodeError):
+            return JsonResponse({"ok": False, "error": "Invalid cursor."}, status=400)
+        qs = qs.filter(Q(created_at__lt=ts) | Q(created_at=ts, pk__lt=pk))
+
+    page = [v async for v in qs[:limit + 1]]
+    has_more = len(page) > limit
+    page = page[:limit]
+    return JsonResponse({
+        "ok": True,
+        "results": [_vision_json(v) for v in page],
+        "next_cursor": _encode_cursor(page[-1]) if has_more else None,
+    })
+
 
 @login_required
 @require_http_methods(["GET"])
-def profile_get(request):
-    prof, _ = Profile.objects.get_or_create(user=request.user)
+@conditional(profile_version)
+async def profile_get(request):
+    # ETag/Last-Modified from Profile.updated_at; 304 never touches the DB
+    prof = await request.aprofile()
     return JsonResponse({
         "ok": True,
         "profile": {
@@ -318,13 +558,13 @@ def profile_get(request):
 
 @login_required
 @require_http_methods(["POST"])
-def profile_save(request):
+async def profile_save(request):
     try:
         data = json.loads(request.body or "{}")
     except json.JSONDecodeError:
         return JsonResponse({"ok": False, "error": "Invalid JSON."}, status=400)
 
-    prof, _ = Profile.objects.get_or_create(user=request.user)
+    prof = await request.aprofile()
 
     # Optional: validate against your allowed choices if you like
     prof.age_group = (data.get("age_group") or "").strip()
@@ -337,5 +577,47 @@ def profile_save(request):
     if "onboarded" in data:
         prof.onboarded = bool(data["onboarded"])
 
-    prof.save()
+    await prof.asave()
     return JsonResponse({"ok": True})
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+async def export_view(request):
+    """
+    Facilitator export, streamed (myApp/exports.py):
+      ?what=visions|profiles  &format=csv|jsonl|zip  &since=YYYY-MM-DD  &until=YYYY-MM-DD
+    zip has both tables plus the images (&images=0 to leave them out).
+    """
+    what = request.GET.get("what", "visions")
+    fmt = request.GET.get("format", "csv")
+    if what not in exports.KINDS or fmt not in exports.FORMATS:
+        return HttpResponseBadRequest("what must be visions or profiles; format must be csv, jsonl or zip.")
+    dates = {}
+    for key in ("since", "until"):
+        raw = request.GET.get(key)
+        try:
+            dates[key] = parse_date(raw) if raw else None
+        except ValueError:
+            dates[key] = None
+        if raw and dates[key] is None:
+            return HttpResponseBadRequest(f"{key} must be a date (YYYY-MM-DD).")
+
+    content_type, filename, chunks = exports.stream(
+        what, fmt, images=_to_bool(request.GET.get("images", "1")), **dates,
+    )
+    # each server gets the iterator it streams natively; the other kind it would collect into a list first
+    body = exports.astream(chunks) if isinstance(request, ASGIRequest) else chunks
+    resp = StreamingHttpResponse(body, content_type=content_type)
+    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    resp["Cache-Control"] = "no-store"
+    return resp
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Prometheus scrape target (myApp/metrics.py). Set METRICS_TOKEN to require a bearer token."""
+    token = metrics.conf("TOKEN")
+    if token and request.headers.get("Authorization", "") != f"Bearer {token}":
+        return HttpResponse("Unauthorized", status=401, content_type="text/plain")
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
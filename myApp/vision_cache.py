@@ -0,0 +1,80 @@
+# myApp/vision_cache.py
+"""
+Content-addressed cache of finished generations.
+
+key = sha256(normalized prompt, size, background) -> the image already
+uploaded to Cloudinary for that key. Two tiers:
+  1. the "visions" cache alias (LocMemCache: LRU eviction at MAX_ENTRIES, TTL expiry)
+  2. Vision.prompt_key (indexed), so a hit survives restarts and is shared by workers
+Entries older than VISION_CACHE["TTL"] are ignored in both tiers.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import Vision
+
+DEFAULTS = {
+    "ENABLED": True,
+    "ALIAS": "visions",
+    "TTL": 7 * 24 * 3600,
+}
+
+
+def conf(key):
+    return getattr(settings, "VISION_CACHE", {}).get(key, DEFAULTS[key])
+
+
+def normalize_prompt(prompt):
+    # "A  Lighthouse at dawn " and "a lighthouse at dawn" are the same vision
+    return " ".join((prompt or "").lower().split())
+
+
+def prompt_key(prompt, size, background):
+    raw = "\x1f".join([normalize_prompt(prompt), size or "", background or ""])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cache():
+    return caches[conf("ALIAS")]
+
+
+def entry(vision):
+    meta = vision.meta or {}
+    return {
+        "public_id": str(vision.image),
+        "image_url": meta.get("image_url"),
+        "width": meta.get("width"),
+        "height": meta.get("height"),
+        "bytes": meta.get("bytes"),
+        "variants": meta.get("variants"),
+    }
+
+
+def lookup(key):
+    """Cached upload for `key`, or None."""
+    if not (conf("ENABLED") and key):
+        return None
+    hit = _cache().get(f"vision:{key}")
+    if hit:
+        return hit
+    since = timezone.now() - timedelta(seconds=conf("TTL"))
+    vision = (
+        Vision.objects.filter(prompt_key=key, status=Vision.DONE, created_at__gte=since)
+        .exclude(image__isnull=True)
+        .order_by("-created_at")
+        .first()
+    )
+    if vision is None:
+        return None
+    hit = entry(vision)
+    _cache().set(f"vision:{key}", hit, conf("TTL"))
+    return hit
+
+
+def store(key, vision):
+    if conf("ENABLED") and key and vision.image:
+        _cache().set(f"vision:{key}", entry(vision), conf("TTL"))
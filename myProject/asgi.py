@@ -3,6 +3,11 @@ ASGI config for myProject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The chat/vision/profile views are async, so serve this (not wsgi.py) in
+production to get many in-flight OpenAI calls per worker, e.g.:
+
+    gunicorn myProject.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -12,5 +17,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myProject.settings')
+os.environ.setdefault("DJANGO_ASGI", "1")  # settings: no persistent DB connections per executor thread
 
 application = get_asgi_application()
+
+# Open the OpenAI/Cloudinary/Resend pools now, in the background, so this
+# worker's first requests don't pay for the TLS handshakes.
+from myApp import clients  # noqa: E402
+
+clients.warm_up()
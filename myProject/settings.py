@@ -5,6 +5,10 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 import os
+from importlib.util import find_spec
+
+import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -51,15 +55,18 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    "myApp.metrics.MetricsMiddleware",  # outermost: times the whole stack, feeds /metrics
     'django.middleware.security.SecurityMiddleware',
+    # async-capable WhiteNoise (see myApp/middleware.py); must sit right after SecurityMiddleware
+    "myApp.middleware.WhiteNoiseMiddleware",
+    "myApp.middleware.GZipMiddleware",  # dynamic HTML/JSON only; WhiteNoise serves static files precompressed
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    "myApp.middleware.ProfileMiddleware",  # lazy request.profile / request.aprofile()
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    "whitenoise.middleware.WhiteNoiseMiddleware",
-
 ]
 
 ROOT_URLCONF = 'myProject.urls'
@@ -86,13 +93,61 @@ WSGI_APPLICATION = 'myProject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# DATABASE_URL (Postgres on Railway) wins; without it, the local SQLite file.
+# Postgres keeps connections open for DB_CONN_MAX_AGE seconds and checks them
+# before reuse: 60 by default under WSGI, 0 under ASGI (asgi.py sets
+# DJANGO_ASGI), where each request's executor thread would hold its own
+# persistent connection. DB_POOL=true switches to psycopg 3's pool instead,
+# the way to reuse connections under ASGI (needs `pip install "psycopg[binary,pool]"`;
+# requirements.txt pins psycopg2).
+# SQLite runs in WAL mode so readers don't block the writer, waits instead
+# of failing on a busy lock, and takes the write lock at BEGIN (IMMEDIATE)
+# so two writers can't deadlock upgrading from read locks.
+# `manage.py bench_db_writes` compares the modes.
+DATABASE_URL = os.environ.get("DATABASE_URL")
+RUNNING_ASGI = os.environ.get("DJANGO_ASGI", "").lower() in ("1", "true", "yes")
+
+SQLITE_OPTIONS = {
+    "timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT", "20")),  # seconds
+    "transaction_mode": "IMMEDIATE",
+    "init_command": (
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"            # durable at checkpoints; safe with WAL
+        "PRAGMA mmap_size=134217728;"           # 128 MB of the file memory-mapped for reads
+        "PRAGMA cache_size=-20000;"             # ~20 MB page cache per connection
+        "PRAGMA temp_store=MEMORY;"
+    ),
 }
 
+if DATABASE_URL:
+    DATABASES = {
+        "default": dj_database_url.parse(
+            DATABASE_URL,
+            conn_max_age=int(os.environ.get("DB_CONN_MAX_AGE", "0" if RUNNING_ASGI else "60")),
+            conn_health_checks=True,
+        )
+    }
+    if os.environ.get("DB_POOL", "false").lower() in ("1", "true", "yes"):
+        if not (find_spec("psycopg") and find_spec("psycopg_pool")):
+            raise ImproperlyConfigured(
+                'DB_POOL=true needs psycopg 3 with its pool: pip install "psycopg[binary,pool]" '
+                "(psycopg2 has no connection pool option)."
+            )
+        DATABASES["default"]["CONN_MAX_AGE"] = 0  # the pool owns connection lifetime
+        DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+            "min_size": int(os.environ.get("DB_POOL_MIN", "2")),
+            "max_size": int(os.environ.get("DB_POOL_MAX", "10")),
+            "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': SQLITE_OPTIONS,
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -131,6 +186,15 @@ USE_TZ = True
 STATIC_URL = "/static/"      # not "static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Hashed + gzip/brotli-compressed static files (myApp/storage.py), served by
+# WhiteNoise with immutable cache headers. Rerun collectstatic after changing
+# anything under myApp/static/.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "myApp.storage.StaticFilesStorage"},
+}
+WHITENOISE_USE_FINDERS = True  # without collectstatic, still serve myApp/static (unhashed, short max-age)
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -142,10 +206,11 @@ LOGIN_REDIRECT_URL = "/workshop/"
 LOGOUT_REDIRECT_URL = "/login/"
 
 
+
 import os
 
 # If you still use Django's send_mail elsewhere, keep it from tripping in prod:
-DEBUG = os.environ.get("DEBUG", "False").lower() in ("1","true","yes")
+DEBUG = os.environ.get("DEBUG", "False").lower() in ("1", "true", "yes")
 
 # Not strictly required for Resend (we’ll call the HTTP API), but safe defaults:
 EMAIL_BACKEND = (
@@ -162,5 +227,165 @@ RESEND = {
     "FROM": os.environ.get("RESEND_FROM"),
     "REPLY_TO": os.environ.get("RESEND_REPLY_TO"),
     "BASE_URL": os.environ.get("RESEND_BASE_URL", "https://api.resend.com"),
+    # bulk sends (myApp/mailer.py); Resend's default limit is 2 requests/second
+    "RATE_PER_SEC": float(os.environ.get("RESEND_RATE_PER_SEC", "2")),
+    "CONCURRENCY": int(os.environ.get("RESEND_CONCURRENCY", "4")),
+    "BATCH_SIZE": int(os.environ.get("RESEND_BATCH_SIZE", "100")),  # 0/1 = one request per email
+    "MAX_RETRIES": int(os.environ.get("RESEND_MAX_RETRIES", "4")),
+    "TIMEOUT": float(os.environ.get("RESEND_TIMEOUT", "20")),
+}
+
+
+# Upstream HTTP clients (myApp/clients.py): pools, timeouts, warm-up.
+# HTTP/2 needs the `h2` package; without it the OpenAI clients stay on HTTP/1.1 keep-alive.
+UPSTREAM = {
+    "HTTP2": os.environ.get("UPSTREAM_HTTP2", "true").lower() in ("1", "true", "yes"),
+    "CONNECT_TIMEOUT": float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", "5")),
+    "OPENAI_TIMEOUT": float(os.environ.get("OPENAI_TIMEOUT", "120")),
+    "CLOUDINARY_TIMEOUT": float(os.environ.get("CLOUDINARY_TIMEOUT", "60")),
+    "ASYNC_MAX_CONNECTIONS": int(os.environ.get("OPENAI_ASYNC_MAX_CONNECTIONS", "100")),
+    "ASYNC_MAX_KEEPALIVE": int(os.environ.get("OPENAI_ASYNC_MAX_KEEPALIVE", "20")),
+    "KEEPALIVE_EXPIRY": float(os.environ.get("UPSTREAM_KEEPALIVE_EXPIRY", "60")),
+    "WARM_UP": os.environ.get("UPSTREAM_WARM_UP", "true").lower() in ("1", "true", "yes"),
+}
+
+# Image-generation job queue (myApp/jobs.py). CONCURRENCY is per process;
+# MAX_RUNNING caps jobs in flight across all workers to stay under OpenAI rate limits.
+# Set VISION_JOBS_IN_PROCESS=false when running `manage.py run_vision_workers` separately.
+VISION_JOBS = {
+    "CONCURRENCY": int(os.environ.get("VISION_JOBS_CONCURRENCY", "4")),
+    "MAX_RUNNING": int(os.environ.get("VISION_JOBS_MAX_RUNNING", "0")),
+    "IN_PROCESS": os.environ.get("VISION_JOBS_IN_PROCESS", "true").lower() in ("1", "true", "yes"),
+    "POLL_INTERVAL": float(os.environ.get("VISION_JOBS_POLL_INTERVAL", "1.0")),
+    "STALE_AFTER": int(os.environ.get("VISION_JOBS_STALE_AFTER", "300")),
+    "MAX_ATTEMPTS": int(os.environ.get("VISION_JOBS_MAX_ATTEMPTS", "2")),
+}
+
+# Result cache for identical image prompts (myApp/vision_cache.py).
+# "visions" is an LRU LocMemCache; hits also fall back to the indexed Vision.prompt_key.
+VISION_CACHE = {
+    "ENABLED": os.environ.get("VISION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"),
+    "ALIAS": "visions",
+    "TTL": int(os.environ.get("VISION_CACHE_TTL", str(7 * 24 * 3600))),
+}
+
+# Default cache tier: profiles, sessions, auth users, rate limits, memory summaries.
+# CACHE_BACKEND picks it:
+#   locmem - per process (default); fine for a single worker
+#   file   - CACHE_LOCATION directory, shared by the workers on one host
+#            (incr isn't atomic there, so rate limits are approximate)
+#   redis  - CACHE_LOCATION or REDIS_URL, any Redis-compatible server
+#            (Valkey, KeyDB, Upstash...); needs the `redis` package
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "locmem").lower()
+CACHE_TIMEOUT = int(os.environ.get("CACHE_TIMEOUT", "3600"))
+
+if CACHE_BACKEND == "redis":
+    DEFAULT_CACHE = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("CACHE_LOCATION") or os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/0"),
+        "KEY_PREFIX": "psi",
+    }
+elif CACHE_BACKEND == "file":
+    DEFAULT_CACHE = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("CACHE_LOCATION", str(BASE_DIR / ".cache")),
+        "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", "20000"))},
+    }
+else:
+    DEFAULT_CACHE = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "default",
+        "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", "20000"))},
+    }
+DEFAULT_CACHE["TIMEOUT"] = CACHE_TIMEOUT
+
+# With a shared cache (file/redis), sessions are read from the cache (and
+# written through to the DB) and the signed-in User is cached too
+# (myApp/backends.py), so an authenticated request costs no queries before the
+# view runs. ModelBackend stays listed so sessions created before the switch
+# remain valid. With per-process locmem, a logout or password change would only
+# reach the worker that handled it, so it's plain DB sessions and ModelBackend
+# (myApp/checks.py refuses the cached ones on locmem).
+if CACHE_BACKEND in ("file", "redis"):
+    SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+    AUTHENTICATION_BACKENDS = [
+        "myApp.backends.CachedModelBackend",
+        "django.contrib.auth.backends.ModelBackend",
+    ]
+else:
+    SESSION_ENGINE = "django.contrib.sessions.backends.db"
+    AUTHENTICATION_BACKENDS = ["django.contrib.auth.backends.ModelBackend"]
+
+CACHES = {
+    "default": DEFAULT_CACHE,
+    # {% cache ... using="fragments" %} in templates. Per process on purpose:
+    # a deploy restarts the workers, so changed templates are never served stale.
+    "fragments": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "template-fragments",
+        "TIMEOUT": 24 * 3600,
+    },
+    "visions": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "vision-results",
+        "TIMEOUT": VISION_CACHE["TTL"],
+        "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("VISION_CACHE_MAX_ENTRIES", "5000"))},
+    },
+}
+
+# Deadlines, retries, circuit breakers and hedging for OpenAI calls (myApp/resilience.py). Times in seconds.
+RESILIENCE = {
+    "CHAT_BUDGET": float(os.environ.get("CHAT_BUDGET", "25")),
+    "CHAT_ATTEMPT_TIMEOUT": float(os.environ.get("CHAT_ATTEMPT_TIMEOUT", "15")),
+    "CHAT_HEDGE_AFTER": float(os.environ.get("CHAT_HEDGE_AFTER", "0")),  # 0 = no hedged requests
+    "IMAGE_BUDGET": float(os.environ.get("IMAGE_BUDGET", "240")),
+    "IMAGE_ATTEMPT_TIMEOUT": float(os.environ.get("IMAGE_ATTEMPT_TIMEOUT", "150")),
+    "MAX_ATTEMPTS": int(os.environ.get("OPENAI_MAX_ATTEMPTS", "3")),
+    "BREAKER_FAILURE_RATE": float(os.environ.get("BREAKER_FAILURE_RATE", "0.5")),
+    "BREAKER_MIN_CALLS": int(os.environ.get("BREAKER_MIN_CALLS", "10")),
+    "BREAKER_WINDOW": float(os.environ.get("BREAKER_WINDOW", "30")),
+    "BREAKER_COOLDOWN": float(os.environ.get("BREAKER_COOLDOWN", "15")),
 }
 
+# Rate limits ("count/sec|min|hour|day", empty = off) and daily quotas for the AI endpoints (myApp/quotas.py).
+# Per-user daily limits can be changed on the user's Profile in the admin.
+QUOTAS = {
+    "ENABLED": os.environ.get("QUOTAS_ENABLED", "true").lower() in ("1", "true", "yes"),
+    "CHAT_PER_USER": os.environ.get("QUOTA_CHAT_PER_USER", "20/min"),
+    "CHAT_PER_IP": os.environ.get("QUOTA_CHAT_PER_IP", "10/min"),
+    "CHAT_GLOBAL": os.environ.get("QUOTA_CHAT_GLOBAL", "600/min"),
+    "VISION_PER_USER": os.environ.get("QUOTA_VISION_PER_USER", "5/min"),
+    "VISION_GLOBAL": os.environ.get("QUOTA_VISION_GLOBAL", "60/min"),
+    "DAILY_IMAGES": int(os.environ.get("QUOTA_DAILY_IMAGES", "30")),
+    "DAILY_TOKENS": int(os.environ.get("QUOTA_DAILY_TOKENS", "60000")),
+    "PROXY_COUNT": int(os.environ.get("QUOTA_PROXY_COUNT", "0")),
+}
+
+# Server-side chat memory (myApp/memory.py); token counts are local estimates.
+CHAT_MEMORY = {
+    "CONTEXT_TOKENS": int(os.environ.get("CHAT_CONTEXT_TOKENS", "1200")),
+    "SUMMARIZE_AT": int(os.environ.get("CHAT_SUMMARIZE_AT", "1600")),
+    "KEEP_RECENT": int(os.environ.get("CHAT_KEEP_RECENT", "600")),
+    "SUMMARY_TOKENS": int(os.environ.get("CHAT_SUMMARY_TOKENS", "250")),
+}
+
+# Facilitator exports (/export/, manage.py export_event; myApp/exports.py), streamed in chunks.
+EXPORTS = {
+    "CHUNK_SIZE": int(os.environ.get("EXPORT_CHUNK_SIZE", str(64 * 1024))),  # bytes per response chunk
+    "DB_CHUNK": int(os.environ.get("EXPORT_DB_CHUNK", "2000")),              # rows per database fetch
+    "IMAGE_CHUNK": int(os.environ.get("EXPORT_IMAGE_CHUNK", str(256 * 1024))),
+}
+
+# Worker boot budget: django.setup() + URLconf in a fresh process (myApp/startup.py).
+# Checked by `manage.py profile_startup` and the test suite.
+STARTUP = {
+    "TIME_BUDGET": float(os.environ.get("STARTUP_TIME_BUDGET", "2.0")),  # seconds
+    "MEMORY_BUDGET_MB": float(os.environ.get("STARTUP_MEMORY_BUDGET_MB", "60")),
+}
+
+# Request/upstream metrics (myApp/metrics.py), scraped from /metrics.
+METRICS = {
+    "ENABLED": os.environ.get("METRICS_ENABLED", "true").lower() in ("1", "true", "yes"),
+    "TOKEN": os.environ.get("METRICS_TOKEN", ""),
+    "SLOW_REQUEST_MS": int(os.environ.get("SLOW_REQUEST_MS", "2000")),
+}
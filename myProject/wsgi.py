@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myProject.settings')
 
 application = get_wsgi_application()
+
+# Open the OpenAI/Cloudinary/Resend pools now, in the background, so this
+# worker's first requests don't pay for the TLS handshakes.
+from myApp import clients  # noqa: E402
+
+clients.warm_up()